@@ -1,9 +1,34 @@
+import ast
+import asyncio
+import os
 import re
+import time
+import hashlib
+from itertools import islice
 from langchain_ollama import OllamaLLM
 from langchain_core.messages import HumanMessage
+from scheduler import FairQueue, SingleFlight
+from document_model import build_document
+from code_parser import parse_code, function_units, documented_units
+import metrics
 
-# Configuración del modelo Ollama
-MODEL_NAME = "llama3.2"
+# Ejemplos por tipo de bucle o condicional guardados en el análisis de flujo (el hint muestra dos)
+MAX_FLOW_DETAILS = 5
+# Caracteres revisados a cada lado de una coincidencia para obtener su línea
+MAX_DETAIL_SCAN = 200
+
+# Configuración del modelo Ollama (servidor y modelo)
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+MODEL_NAME = os.getenv("OLLAMA_MODEL", "llama3.2")
+
+# Cantidad de generaciones simultáneas que se envían a Ollama
+MODEL_CONCURRENCY = int(os.getenv("MODEL_CONCURRENCY", 1))
+
+# Cola equitativa compartida por todas las llamadas al modelo
+model_queue = FairQueue(concurrency=MODEL_CONCURRENCY)
+
+# Solicitudes idénticas simultáneas comparten una sola generación
+generation_flights = SingleFlight()
 
 # Patrones para detectar bucles, condicionales y excepciones
 CONTROL_FLOW_PATTERNS = {
@@ -29,26 +54,19 @@ CONTROL_FLOW_PATTERNS = {
     }
 }
 
-# Patrones de detección por lenguaje
+# Formato de documentación por lenguaje. Las funciones y su documentación
+# se obtienen con los parsers de code_parser
 LANGUAGE_PATTERNS = {
     'python': {
-        'function_pattern': r'def\s+(\w+)\s*\([^)]*\):',
-        'docstring_pattern': r'def\s+\w+\s*\([^)]*\):\s*"""',
         'doc_format': 'Python Docstring (Google Style)'
     },
     'javascript': {
-        'function_pattern': r'(?:function\s+(\w+)\s*\([^)]*\)|(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s*)?\([^)]*\)\s*=>)',
-        'docstring_pattern': r'/\*\*[\s\S]*?\*/\s*(?:function|const|let|var|async)',
         'doc_format': 'JSDoc'
     },
     'php': {
-        'function_pattern': r'function\s+(\w+)\s*\([^)]*\)',
-        'docstring_pattern': r'/\*\*[\s\S]*?\*/\s*(?:public|private|protected|function)',
         'doc_format': 'PHPDoc'
     },
     'go': {
-    'function_pattern': r'func\s+(?:\(\w+\s+\*?\w+\)\s+)?(\w+)\s*\([^)]*\)',
-    'docstring_pattern': r'//.*\n(?://.*\n)*func',
     'doc_format': 'GoDoc'
     }
 }
@@ -59,39 +77,37 @@ def extract_functions(code: str, language: str) -> list:
     """
     if language not in LANGUAGE_PATTERNS:
         return []
-    
-    pattern = LANGUAGE_PATTERNS[language]['function_pattern']
-    matches = re.findall(pattern, code)
-    
-    # Para JavaScript que puede tener tuplas, limpiamos
-    if isinstance(matches[0] if matches else None, tuple):
-        matches = [m[0] or m[1] for m in matches if m[0] or m[1]]
-    
-    return matches
+    return [unit['name'] for unit in function_units(parse_code(code, language))]
+
+def documented_names(code: str, language: str) -> set:
+    """
+    Nombres de las funciones que tienen documentación asociada (docstring en Python,
+    comentario inmediatamente anterior en los demás lenguajes).
+    """
+    if language not in LANGUAGE_PATTERNS:
+        return set()
+    return {unit['name'] for unit in documented_units(parse_code(code, language))}
 
 def check_documentation(code: str, function_name: str, language: str) -> bool:
     """
     Verifica si una función tiene documentación según el lenguaje.
     """
-    if language not in LANGUAGE_PATTERNS:
-        return False
-    
-    # Buscar la función y verificar si tiene documentación antes
-    if language == 'python':
-        pattern = rf'def\s+{function_name}\s*\([^)]*\):\s*"""'
-    elif language in ['javascript', 'php']:
-        # Buscar /** comentario */ antes de la función
-        pattern = rf'/\*\*[\s\S]*?\*/\s*.*{function_name}'
-    else:
-        return False
-    
-    return bool(re.search(pattern, code))
+    return function_name in documented_names(code, language)
+
+def _first_matches(pattern: str, code: str, limit: int = 5) -> list:
+    # Solo se usan las primeras coincidencias: no se recorre el resto del código
+    return [match.groups() for match in islice(re.finditer(pattern, code), limit)]
 
 def extract_code_structure(code: str, language: str) -> dict:
     """
     Extrae información detallada sobre la estructura del código.
     Incluye variables importantes, transformaciones de datos, etc.
     """
+    if language == 'python':
+        tree = parse_code(code, language)['tree']
+        if tree is not None:
+            return _python_structure(tree, code.split('\n'))
+    
     structure = {
         'assignments': [],
         'function_calls': [],
@@ -102,21 +118,21 @@ def extract_code_structure(code: str, language: str) -> dict:
     # Variables y asignaciones importantes
     if language == 'python':
         # Captura asignaciones significativas
-        assignments = re.findall(r'(\w+)\s*=\s*(.+?)(?=\n|;)', code)
-        structure['assignments'] = [f"{var}={val.strip()[:50]}" for var, val in assignments[:5]]
+        assignments = _first_matches(r'\b(\w+)\s*=\s*(.+?)(?=\n|;|$)', code)
+        structure['assignments'] = [f"{var}={val.strip()[:50]}" for var, val in assignments]
     elif language == 'javascript':
-        assignments = re.findall(r'(?:const|let|var)\s+(\w+)\s*=\s*(.+?)(?=;|\n)', code)
-        structure['assignments'] = [f"{var}={val.strip()[:50]}" for var, val in assignments[:5]]
+        assignments = _first_matches(r'\b(?:const|let|var)\s+(\w+)\s*=\s*(.+?)(?=;|\n|$)', code)
+        structure['assignments'] = [f"{var}={val.strip()[:50]}" for var, val in assignments]
     elif language == 'php':
-        assignments = re.findall(r'\$(\w+)\s*=\s*(.+?)(?=;)', code)
-        structure['assignments'] = [f"${var}={val.strip()[:50]}" for var, val in assignments[:5]]
+        assignments = _first_matches(r'\$(\w+)\s*=(?!>)\s*(.+?)(?=;|\n|$)', code)
+        structure['assignments'] = [f"${var}={val.strip()[:50]}" for var, val in assignments]
     elif language == 'go':
-        assignments = re.findall(r'(\w+)\s*:?=\s*(.+?)(?=\n)', code)
-        structure['assignments'] = [f"{var}={val.strip()[:50]}" for var, val in assignments[:5]]
+        assignments = _first_matches(r'\b(\w+)\s*:?=\s*(.+?)(?=\n|$)', code)
+        structure['assignments'] = [f"{var}={val.strip()[:50]}" for var, val in assignments]
     
     # Llamadas a funciones/métodos
     if language in ['python', 'javascript', 'php', 'go']:
-        function_calls = re.findall(r'\.?(\w+)\s*\(', code)
+        function_calls = re.findall(r'\b(\w+)\s*\(', code)
         structure['function_calls'] = list(set(function_calls))[:10]
     
     # Estructuras de datos (listas, diccionarios, etc.)
@@ -133,10 +149,26 @@ def extract_code_structure(code: str, language: str) -> dict:
     
     return structure
 
+def _match_line(code: str, match) -> str:
+    # Línea completa de la coincidencia (acotada, para no recorrer líneas minificadas enteras)
+    line_start = code.rfind('\n', max(0, match.start() - MAX_DETAIL_SCAN), match.start()) + 1
+    line_start = max(line_start, match.start() - MAX_DETAIL_SCAN)
+    line_end = code.find('\n', match.end(), match.end() + MAX_DETAIL_SCAN)
+    if line_end == -1:
+        line_end = min(len(code), match.end() + MAX_DETAIL_SCAN)
+    return code[line_start:line_end].strip()[:80]
+
 def analyze_control_flow(code: str, language: str) -> dict:
     """
     Analiza bucles, condicionales, excepciones y extrae detalles sobre qué hacen.
+    En Python se recorre el árbol del parser (el mismo de las estadísticas);
+    si el código no compila se usan los patrones como en los demás lenguajes.
     """
+    if language == 'python':
+        tree = parse_code(code, language)['tree']
+        if tree is not None:
+            return _python_control_flow(tree, code.split('\n'))
+    
     if language not in CONTROL_FLOW_PATTERNS:
         return {
             'loops': [], 'conditionals': [], 'exceptions': [], 
@@ -156,14 +188,10 @@ def analyze_control_flow(code: str, language: str) -> dict:
     loop_details = {}
     for match in loop_matches:
         loop_type = match.group(1)
-        # Extraer la línea completa del bucle
-        line_start = code.rfind('\n', 0, match.start()) + 1
-        line_end = code.find('\n', match.end())
-        loop_line = code[line_start:line_end].strip()
-        
         if loop_type not in loop_details:
             loop_details[loop_type] = []
-        loop_details[loop_type].append(loop_line[:80])
+        if len(loop_details[loop_type]) < MAX_FLOW_DETAILS:
+            loop_details[loop_type].append(_match_line(code, match))
         
         analysis['loops'].append(loop_type)
         analysis['has_control_flow'] = True
@@ -176,13 +204,10 @@ def analyze_control_flow(code: str, language: str) -> dict:
     conditional_details = {}
     for match in conditional_matches:
         cond_type = match.group(1)
-        line_start = code.rfind('\n', 0, match.start()) + 1
-        line_end = code.find('\n', match.end())
-        cond_line = code[line_start:line_end].strip()
-        
         if cond_type not in conditional_details:
             conditional_details[cond_type] = []
-        conditional_details[cond_type].append(cond_line[:80])
+        if len(conditional_details[cond_type]) < MAX_FLOW_DETAILS:
+            conditional_details[cond_type].append(_match_line(code, match))
         
         analysis['conditionals'].append(cond_type)
         analysis['has_control_flow'] = True
@@ -201,6 +226,103 @@ def analyze_control_flow(code: str, language: str) -> dict:
     
     return analysis
 
+# === PYTHON (AST) ===
+
+def _source_line(lines: list, lineno: int) -> str:
+    return lines[lineno - 1].strip()[:80] if 0 < lineno <= len(lines) else ''
+
+def _source_segment(lines: list, node) -> str:
+    """Primera línea del texto de un nodo (los desplazamientos de ast son en bytes UTF-8)."""
+    if not 0 < node.lineno <= len(lines):
+        return ''
+    line = lines[node.lineno - 1].encode('utf-8')
+    end = node.end_col_offset if node.end_lineno == node.lineno else len(line)
+    return line[node.col_offset:end].decode('utf-8', errors='replace').strip()
+
+def _keyword_line(lines: list, body: list, keyword: str) -> int:
+    """Línea del 'else:' o 'finally:' que precede a un bloque (ast no la guarda)."""
+    lineno = body[0].lineno
+    while lineno > 0 and not lines[lineno - 1].lstrip().startswith(keyword):
+        lineno -= 1
+    return lineno
+
+def _python_control_flow(tree, lines: list) -> dict:
+    """
+    Bucles (incluidas las comprensiones), condicionales y excepciones desde el árbol,
+    en orden de aparición. A diferencia de los patrones, no hay coincidencias dentro
+    de cadenas o comentarios y se distinguen elif, else, except y finally.
+    """
+    found = []  # (línea, columna, grupo, tipo)
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.For, ast.AsyncFor)):
+            found.append((node.lineno, node.col_offset, 'loops', 'for'))
+        elif isinstance(node, ast.While):
+            found.append((node.lineno, node.col_offset, 'loops', 'while'))
+        elif isinstance(node, (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
+            for generator in node.generators:
+                found.append((generator.target.lineno, generator.target.col_offset, 'loops', 'for'))
+        elif isinstance(node, ast.If):
+            is_elif = lines[node.lineno - 1].lstrip().startswith('elif') if node.lineno <= len(lines) else False
+            found.append((node.lineno, node.col_offset, 'conditionals', 'elif' if is_elif else 'if'))
+            # Un 'else' que contiene solo otro if puede ser un elif, que se registra al visitarlo
+            chained = len(node.orelse) == 1 and isinstance(node.orelse[0], ast.If) and \
+                lines[node.orelse[0].lineno - 1].lstrip().startswith('elif')
+            if node.orelse and not chained:
+                found.append((_keyword_line(lines, node.orelse, 'else'), 0, 'conditionals', 'else'))
+        elif isinstance(node, ast.Match):
+            found.append((node.lineno, node.col_offset, 'conditionals', 'match'))
+        elif isinstance(node, (ast.Try, getattr(ast, 'TryStar', ast.Try))):
+            found.append((node.lineno, node.col_offset, 'exceptions', 'try'))
+            for handler in node.handlers:
+                found.append((handler.lineno, handler.col_offset, 'exceptions', 'except'))
+            if node.finalbody:
+                found.append((_keyword_line(lines, node.finalbody, 'finally'), 0, 'exceptions', 'finally'))
+
+    details = {'loops': {}, 'conditionals': {}, 'exceptions': {}}
+    for lineno, _, group, kind in sorted(found):
+        entries = details[group].setdefault(kind, [])
+        if len(entries) < MAX_FLOW_DETAILS:
+            entries.append(_source_line(lines, lineno))
+
+    return {
+        'loops': list(details['loops']),
+        'conditionals': list(details['conditionals']),
+        'exceptions': list(details['exceptions']),
+        'loop_details': details['loops'],
+        'conditional_details': details['conditionals'],
+        'structure': _python_structure(tree, lines),
+        'has_control_flow': bool(found)
+    }
+
+def _python_structure(tree, lines: list) -> dict:
+    """Asignaciones, llamadas y estructuras de datos desde el árbol (ver extract_code_structure)."""
+    assignments = []
+    calls = []
+    data_structures = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Assign, ast.AnnAssign)) and node.value is not None:
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if isinstance(targets[0], ast.Name):
+                assignments.append((node.lineno, node.col_offset, targets[0].id, node.value))
+        elif isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Name):
+                calls.append((node.lineno, node.col_offset, node.func.id))
+            elif isinstance(node.func, ast.Attribute):
+                calls.append((node.lineno, node.col_offset, node.func.attr))
+        elif isinstance(node, (ast.Dict, ast.DictComp)):
+            data_structures.add('dict')
+        elif isinstance(node, (ast.List, ast.ListComp)):
+            data_structures.add('list')
+
+    assignments.sort(key=lambda item: item[:2])
+    calls.sort()
+    return {
+        'assignments': [f"{name}={_source_segment(lines, value)[:50]}" for _, _, name, value in assignments[:5]],
+        'function_calls': list(dict.fromkeys(name for _, _, name in calls))[:10],
+        'data_structures': [name for name in ('dict', 'list') if name in data_structures],
+        'transformations': []
+    }
+
 def get_control_flow_hint(control_flow: dict, language: str = 'python') -> str:
     """
     Crea un hint detallado sobre el flujo de control detectado.
@@ -423,70 +545,141 @@ Código documentado:
     
     return prompts.get(language, prompts['python'])
 
-def generate_documentation_suggestions(code: str, language: str = 'python') -> dict:
+def _generation_key(mode: str, code: str, language: str, feedback: str = None) -> tuple:
     """
-    Genera sugerencias de documentación usando Ollama.
-    Retorna un diccionario con el código documentado y estadísticas.
+    Clave que identifica una generación: mismo código, lenguaje, modelo y feedback.
     """
-    try:
-        # Inicializar el modelo
-        llm = OllamaLLM(model=MODEL_NAME)
-        
+    code_hash = hashlib.sha256(code.encode('utf-8')).hexdigest()
+    return (mode, code_hash, language, MODEL_NAME, feedback)
+
+async def _call_model(prompt: str, client_id: str, operation: str) -> str:
+    """
+    Envía el prompt a Ollama cuando la cola equitativa da el turno (el costo es
+    proporcional al tamaño del prompt) y registra la espera, la carga, el prefill,
+    la decodificación y los tokens que informa Ollama. Tanto la espera como la
+    llamada ocurren en el event loop, sin ocupar un hilo.
+    """
+    llm = OllamaLLM(model=MODEL_NAME, base_url=OLLAMA_BASE_URL)
+    waiting = time.perf_counter()
+    async with model_queue.slot(client_id, cost=len(prompt)):
+        metrics.record_stage('queue_wait', time.perf_counter() - waiting, operation=operation)
+        try:
+            with metrics.stage('model_call', operation=operation):
+                result = await llm.agenerate([prompt])
+        except Exception:
+            metrics.inc('code_doc_model_calls_total', operation=operation, result='error')
+            raise
+
+    metrics.inc('code_doc_model_calls_total', operation=operation, result='ok')
+    generation = result.generations[0][0]
+    _record_model_usage(generation.generation_info or {}, operation)
+    return generation.text
+
+def _record_model_usage(info: dict, operation: str):
+    # Ollama informa las duraciones en nanosegundos en el último fragmento de la respuesta
+    if not metrics.METRICS_ENABLED or not info:
+        return
+    for stage, field in (('model_load', 'load_duration'), ('model_prefill', 'prompt_eval_duration'),
+                         ('model_decode', 'eval_duration')):
+        if info.get(field):
+            metrics.record_stage(stage, info[field] / 1e9, operation=operation)
+
+    prompt_tokens = info.get('prompt_eval_count') or 0
+    output_tokens = info.get('eval_count') or 0
+    metrics.inc('code_doc_model_prompt_tokens_total', prompt_tokens, operation=operation)
+    metrics.inc('code_doc_model_output_tokens_total', output_tokens, operation=operation)
+    tokens_per_second = output_tokens / (info['eval_duration'] / 1e9) if info.get('eval_duration') else 0
+    if tokens_per_second:
+        metrics.observe('code_doc_model_tokens_per_second', tokens_per_second,
+                        buckets=metrics.TOKENS_PER_SECOND_BUCKETS, operation=operation)
+    metrics.annotate(prompt_tokens=prompt_tokens, output_tokens=output_tokens,
+                     tokens_per_second=round(tokens_per_second, 1))
+
+def strip_code_fence(response: str, language: str) -> str:
+    """Quita el bloque markdown (```lenguaje ... ```) que envuelve la respuesta del modelo."""
+    documented_code = response.strip()
+    
+    # Detectar y remover bloques de código markdown
+    code_block_patterns = [
+        (r'```python\s*\n(.*?)```', language == 'python'),
+        (r'```javascript\s*\n(.*?)```', language == 'javascript'),
+        (r'```php\s*\n(.*?)```', language == 'php'),
+        (r'```go\s*\n(.*?)```', language == 'go'),
+        (r'```\s*\n(.*?)```', True)
+    ]
+    
+    for pattern, should_apply in code_block_patterns:
+        if should_apply:
+            match = re.search(pattern, documented_code, re.DOTALL)
+            if match:
+                return match.group(1).strip()
+    return documented_code
+
+def documentation_statistics(code: str, documented_code: str, language: str) -> dict:
+    """Funciones del código original y cuántas quedaron documentadas."""
+    original_functions = extract_functions(code, language)
+    documented = documented_names(documented_code, language)
+    documented_functions = sum(1 for func in original_functions if func in documented)
+    
+    total_functions = len(original_functions)
+    doc_percentage = (documented_functions / total_functions * 100) if total_functions > 0 else 0
+    
+    return {
+        "total_functions": total_functions,
+        "documented_functions": documented_functions,
+        "documentation_percentage": round(doc_percentage, 1)
+    }
+
+def _documentation_prompt(code: str, language: str, operation: str, instructions: str = '') -> str:
+    """Prompt del lenguaje con instrucciones adicionales y el hint de flujo de control."""
+    with metrics.stage('prompt_build', operation=operation):
         # Analizar flujo de control
         control_flow = analyze_control_flow(code, language)
         
         # Obtener prompt según el lenguaje
-        prompt = get_documentation_prompt(language, code)
+        prompt = get_documentation_prompt(language, code) + instructions
         
         # Agregar hint sobre flujo de control
         hint = get_control_flow_hint(control_flow, language)
         if hint:
             prompt += hint
-        
-        # Generar respuesta
-        response = llm.invoke(prompt)
-        
-        # Limpiar la respuesta
-        documented_code = response.strip()
-        
-        # Detectar y remover bloques de código markdown
-        code_block_patterns = [
-            (r'```python\s*\n(.*?)```', language == 'python'),
-            (r'```javascript\s*\n(.*?)```', language == 'javascript'),
-            (r'```php\s*\n(.*?)```', language == 'php'),
-            (r'```go\s*\n(.*?)```', language == 'go'),
-            (r'```\s*\n(.*?)```', True)
-        ]
-        
-        for pattern, should_apply in code_block_patterns:
-            if should_apply:
-                match = re.search(pattern, documented_code, re.DOTALL)
-                if match:
-                    documented_code = match.group(1).strip()
-                    break
-        
-        # Extraer funciones del código original y documentado
-        original_functions = extract_functions(code, language)
-        documented_functions = sum(
-            1 for func in original_functions 
-            if check_documentation(documented_code, func, language)
-        )
-        
-        # Calcular porcentaje
-        total_functions = len(original_functions)
-        doc_percentage = (documented_functions / total_functions * 100) if total_functions > 0 else 0
-        
-        return {
-            "success": True,
-            "documented_code": documented_code,
-            "original_code": code,
-            "language": language,
-            "statistics": {
-                "total_functions": total_functions,
-                "documented_functions": documented_functions,
-                "documentation_percentage": round(doc_percentage, 1)
-            }
-        }
+    return prompt
+
+def _documentation_result(response: str, code: str, language: str, operation: str) -> dict:
+    """Código documentado sin el bloque markdown y sus estadísticas."""
+    # Limpiar la respuesta
+    with metrics.stage('fence_strip', operation=operation):
+        documented_code = strip_code_fence(response, language)
+    
+    # Extraer funciones del código original y calcular el porcentaje documentado
+    with metrics.stage('statistics', operation=operation):
+        statistics = documentation_statistics(code, documented_code, language)
+    
+    return {
+        "success": True,
+        "documented_code": documented_code,
+        "original_code": code,
+        "language": language,
+        "statistics": statistics
+    }
+
+async def generate_documentation_suggestions(code: str, language: str = 'python', client_id: str = 'anonymous') -> dict:
+    """
+    Genera sugerencias de documentación usando Ollama.
+    Retorna un diccionario con el código documentado y estadísticas.
+    La llamada al modelo espera su turno en la cola equitativa según client_id,
+    y las solicitudes idénticas en curso esperan en el event loop el mismo resultado.
+    """
+    metrics.inc('code_doc_generation_requests_total', operation='generate')
+    key = _generation_key('generate', code, language)
+    return await generation_flights.do(key, _generate_documentation_suggestions, code, language, client_id)
+
+async def _generate_documentation_suggestions(code: str, language: str, client_id: str) -> dict:
+    # El análisis del código corre en un hilo; la espera del modelo, en el event loop
+    try:
+        prompt = await asyncio.to_thread(_documentation_prompt, code, language, 'generate')
+        response = await _call_model(prompt, client_id, 'generate')
+        return await asyncio.to_thread(_documentation_result, response, code, language, 'generate')
         
     except Exception as e:
         return {
@@ -495,69 +688,22 @@ def generate_documentation_suggestions(code: str, language: str = 'python') -> d
             "message": f"Error al generar documentación para {language}. Verifica que Ollama esté corriendo."
         }
 
-def regenerate_documentation(code: str, language: str = 'python', feedback: str = None) -> dict:
+async def regenerate_documentation(code: str, language: str = 'python', feedback: str = None, client_id: str = 'anonymous') -> dict:
     """
     Regenera la documentación con feedback opcional del usuario.
     """
+    metrics.inc('code_doc_generation_requests_total', operation='regenerate')
+    key = _generation_key('regenerate', code, language, feedback)
+    return await generation_flights.do(key, _regenerate_documentation, code, language, feedback, client_id)
+
+async def _regenerate_documentation(code: str, language: str, feedback: str, client_id: str) -> dict:
     try:
-        llm = OllamaLLM(model=MODEL_NAME)
-        
         feedback_text = f"\n\nFeedback del usuario: {feedback}" if feedback else ""
+        instructions = f"\n\nGenera una NUEVA versión más detallada y clara.{feedback_text}"
         
-        # Analizar flujo de control
-        control_flow = analyze_control_flow(code, language)
-        
-        base_prompt = get_documentation_prompt(language, code)
-        
-        # Agregar hint sobre flujo de control
-        hint = get_control_flow_hint(control_flow, language)
-        
-        prompt = base_prompt + f"\n\nGenera una NUEVA versión más detallada y clara.{feedback_text}"
-        if hint:
-            prompt += hint
-        
-        response = llm.invoke(prompt)
-        
-        # Limpiar respuesta
-        documented_code = response.strip()
-        
-        # Detectar y remover bloques de código markdown
-        code_block_patterns = [
-            (r'```python\s*\n(.*?)```', language == 'python'),
-            (r'```javascript\s*\n(.*?)```', language == 'javascript'),
-            (r'```php\s*\n(.*?)```', language == 'php'),
-            (r'```go\s*\n(.*?)```', language == 'go'),
-            (r'```\s*\n(.*?)```', True)
-        ]
-        
-        for pattern, should_apply in code_block_patterns:
-            if should_apply:
-                match = re.search(pattern, documented_code, re.DOTALL)
-                if match:
-                    documented_code = match.group(1).strip()
-                    break
-        
-        # Calcular estadísticas
-        original_functions = extract_functions(code, language)
-        documented_functions = sum(
-            1 for func in original_functions 
-            if check_documentation(documented_code, func, language)
-        )
-        
-        total_functions = len(original_functions)
-        doc_percentage = (documented_functions / total_functions * 100) if total_functions > 0 else 0
-        
-        return {
-            "success": True,
-            "documented_code": documented_code,
-            "original_code": code,
-            "language": language,
-            "statistics": {
-                "total_functions": total_functions,
-                "documented_functions": documented_functions,
-                "documentation_percentage": round(doc_percentage, 1)
-            }
-        }
+        prompt = await asyncio.to_thread(_documentation_prompt, code, language, 'regenerate', instructions)
+        response = await _call_model(prompt, client_id, 'regenerate')
+        return await asyncio.to_thread(_documentation_result, response, code, language, 'regenerate')
         
     except Exception as e:
         return {
@@ -578,12 +724,23 @@ def generate_final_document(documented_code: str, filename: str, language: str =
     }
     
     lang_display = lang_names.get(language, language)
+    parsed = build_document(documented_code, filename, language)
+    
+    # Índice de funciones y clases con su primera línea de documentación
+    index = ''
+    if parsed['units']:
+        entries = []
+        for unit in parsed['units']:
+            name = f"{unit['parent']}.{unit['name']}" if unit['parent'] else unit['name']
+            summary = unit['docstring'].split('\n', 1)[0]
+            entries.append(f"- `{name}` (líneas {unit['start_line']}-{unit['end_line']})" + (f": {summary}" if summary else ''))
+        index = "## Índice\n\n" + '\n'.join(entries) + "\n\n"
     
     document = f"""# Documentación de Código - {filename}
 
 **Lenguaje:** {lang_display}
 
-## Código Documentado
+{index}## Código Documentado
 
 ```{language}
 {documented_code}
@@ -0,0 +1,86 @@
+"""
+Benchmark de exportación a PDF con archivos grandes.
+
+Replica modeloIA/tests/python_largo.py hasta alcanzar la cantidad de líneas
+pedida y mide tiempo, páginas, tamaño y pico de memoria de create_pdf_simple.
+Con --legacy también mide la maquetación anterior (un único Preformatted).
+
+Uso (desde backend/):
+    python benchmarks/bench_pdf.py --lines 10000 --legacy
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Preformatted
+
+from export_documents import create_pdf_simple
+
+SAMPLE_FILE = os.path.join(BACKEND_DIR, '..', 'modeloIA', 'tests', 'python_largo.py')
+
+def build_corpus(target_lines: int) -> str:
+    """Repite el archivo de ejemplo hasta tener target_lines líneas."""
+    with open(SAMPLE_FILE, 'r', encoding='utf-8') as f:
+        sample = f.read().split('\n')
+
+    lines = []
+    while len(lines) < target_lines:
+        lines.extend(sample)
+    return '\n'.join(lines[:target_lines])
+
+def render_legacy(code: str):
+    """Maquetación anterior: todo el código en un solo Preformatted."""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+    style = ParagraphStyle('Code', parent=getSampleStyleSheet()['Code'], fontSize=8, leftIndent=20, fontName='Courier')
+    doc.build([Preformatted(code, style)])
+    buffer.seek(0)
+    return buffer
+
+def measure(name: str, render, code: str) -> dict:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = render(code)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    data = result.read()
+    result.close()
+
+    return {
+        'renderer': name,
+        'seconds': round(elapsed, 3),
+        'pages': data.count(b'/Type /Page\n') or data.count(b'/Type /Page'),
+        'size_kb': round(len(data) / 1024, 1),
+        'peak_memory_mb': round(peak / (1024 * 1024), 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=10000, help='Líneas del archivo generado')
+    parser.add_argument('--legacy', action='store_true', help='Medir también la maquetación anterior')
+    args = parser.parse_args()
+
+    code = build_corpus(args.lines)
+    results = [measure('chunked', lambda c: create_pdf_simple(c, 'bench.py', 'bench.py'), code)]
+    if args.legacy:
+        results.append(measure('legacy', render_legacy, code))
+
+    print(f"Líneas: {args.lines}")
+    for result in results:
+        print(
+            f"  {result['renderer']:<8} {result['seconds']:>8.3f}s  {result['pages']:>5} páginas  "
+            f"{result['size_kb']:>9.1f} KB  pico {result['peak_memory_mb']:.1f} MB"
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+Servidor falso de Ollama para pruebas de carga.
+
+Implementa POST /api/generate (y /api/chat, GET /api/tags) con la misma forma de
+respuesta que Ollama: líneas NDJSON con {"response": token, "done": false} y un
+último mensaje {"done": true, ...} con los contadores de tokens.
+
+La respuesta devuelve el código del prompt (el bloque después de "Código a documentar:")
+con un docstring o comentario agregado en cada función, emitido a un ritmo fijo de tokens
+por segundo y tras una demora de "lectura" proporcional al largo del prompt.
+
+Uso (desde backend/):
+    python benchmarks/fake_ollama.py --port 11500 --tokens-per-second 200
+    OLLAMA_BASE_URL=http://127.0.0.1:11500 python -m uvicorn main:app
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Código incluido en los prompts de ai_model.get_documentation_prompt
+PROMPT_CODE_PATTERN = re.compile(r'Código a documentar:\n```(\w*)\n(.*)\n```', re.DOTALL)
+
+# Encabezados de funciones a los que se les agrega un comentario
+FUNCTION_PATTERN = re.compile(r'^(\s*)(?:async\s+)?(def|function|func|public|private|protected)\b')
+
+# Caracteres por token aproximados, para trocear la respuesta y estimar contadores
+CHARS_PER_TOKEN = 4
+
+def fake_documentation(prompt: str) -> str:
+    """Respuesta del modelo: el código del prompt documentado por función, en un bloque markdown."""
+    match = PROMPT_CODE_PATTERN.search(prompt)
+    if not match:
+        return 'Sin código para documentar.'
+
+    language, code = match.groups()
+    lines = []
+    for line in code.split('\n'):
+        header = FUNCTION_PATTERN.match(line)
+        if header and language == 'python':
+            # Docstring en la línea siguiente a la firma (si la firma cabe en una línea)
+            lines.append(line)
+            if line.rstrip().endswith(':'):
+                lines.append(f'{header.group(1)}    """Documentación generada por el servidor de prueba."""')
+            continue
+        if header:
+            lines.append(f"{header.group(1)}/** Documentación generada por el servidor de prueba. */")
+        lines.append(line)
+    return f"```{language}\n" + '\n'.join(lines) + "\n```"
+
+def split_tokens(text: str, chars_per_token: int = CHARS_PER_TOKEN) -> list:
+    return [text[i:i + chars_per_token] for i in range(0, len(text), chars_per_token)] or ['']
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._send_json(200, {'models': [{'name': self.server.model, 'model': self.server.model}]})
+        elif self.path == '/':
+            self._send_json(200, {'status': 'Ollama is running'})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path not in ('/api/generate', '/api/chat'):
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': 'invalid json'})
+            return
+
+        chat = self.path == '/api/chat'
+        if chat:
+            prompt = '\n'.join(message.get('content', '') for message in request.get('messages', []))
+        else:
+            prompt = request.get('prompt', '')
+
+        self.server.record_request()
+        if self.server.error_rate and self.server.should_fail():
+            self._send_json(500, {'error': 'fallo simulado'})
+            return
+
+        started = time.perf_counter()
+        # Lectura del prompt antes del primer token
+        time.sleep(len(prompt) / CHARS_PER_TOKEN / self.server.prompt_tokens_per_second)
+        prompt_seconds = time.perf_counter() - started
+
+        tokens = split_tokens(fake_documentation(prompt))
+        stream = request.get('stream', True)
+        if stream:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+
+        interval = 1.0 / self.server.tokens_per_second
+        next_token = time.perf_counter()
+        for token in tokens:
+            next_token += interval
+            delay = next_token - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if stream:
+                self._write_chunk(self._message(token, chat, done=False))
+
+        final = self._message('' if stream else ''.join(tokens), chat, done=True)
+        final.update({
+            'done_reason': 'stop',
+            'total_duration': int((time.perf_counter() - started) * 1e9),
+            'load_duration': 0,
+            'prompt_eval_count': len(prompt) // CHARS_PER_TOKEN,
+            'prompt_eval_duration': int(prompt_seconds * 1e9),
+            'eval_count': len(tokens),
+            'eval_duration': int((time.perf_counter() - started - prompt_seconds) * 1e9)
+        })
+        if stream:
+            self._write_chunk(final)
+            self.wfile.write(b'0\r\n\r\n')
+        else:
+            self._send_json(200, final)
+
+    def _message(self, token: str, chat: bool, done: bool) -> dict:
+        message = {
+            'model': self.server.model,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'done': done
+        }
+        if chat:
+            message['message'] = {'role': 'assistant', 'content': token}
+        else:
+            message['response'] = token
+        return message
+
+    def _write_chunk(self, payload: dict):
+        data = json.dumps(payload).encode('utf-8') + b'\n'
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b'\r\n')
+        self.wfile.flush()
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """Servidor HTTP con hilos; cada solicitud simula una generación independiente."""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, tokens_per_second: float = 100.0,
+                 prompt_tokens_per_second: float = 2000.0, error_rate: float = 0.0,
+                 model: str = 'llama3.2', verbose: bool = False):
+        super().__init__((host, port), FakeOllamaHandler)
+        self.tokens_per_second = tokens_per_second
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.error_rate = error_rate
+        self.model = model
+        self.verbose = verbose
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def should_fail(self) -> bool:
+        # Falla de forma determinista una de cada 1/error_rate solicitudes
+        with self._lock:
+            return int(self.requests * self.error_rate) != int((self.requests - 1) * self.error_rate)
+
+    def start_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name='fake-ollama', daemon=True)
+        thread.start()
+        return thread
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11500)
+    parser.add_argument('--tokens-per-second', type=float, default=100.0, help='Ritmo de emisión de tokens por generación')
+    parser.add_argument('--prompt-tokens-per-second', type=float, default=2000.0, help='Ritmo de lectura del prompt')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fracción de generaciones que responden 500')
+    parser.add_argument('--model', default='llama3.2')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, args.tokens_per_second,
+                              args.prompt_tokens_per_second, args.error_rate, args.model, args.verbose)
+    print(f"Ollama falso escuchando en {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+"""
+Prueba de carga del backend completo contra un servidor falso de Ollama.
+
+Levanta la aplicación real (uvicorn main:app) en un directorio temporal, con su
+propia base SQLite y caché de exportación, apuntando a benchmarks/fake_ollama.py.
+Cada usuario virtual se registra, inicia sesión y repite escenarios elegidos según
+la mezcla configurada hasta que termina la prueba:
+
+    full     analyze-code -> generate -> regenerate (según --regenerate-ratio) -> accept -> export
+    analyze  analyze-code
+    export   export con el código enviado directamente (sin pasar por el modelo)
+
+Al final informa por endpoint: solicitudes, errores, tasa de error, latencias
+p50/p95/p99 y throughput. Con --output guarda el informe en JSON.
+
+Uso (desde backend/):
+    python benchmarks/load_test.py --users 20 --duration 60 --mix full=6,analyze=3,export=1
+    python benchmarks/load_test.py --base-url http://localhost:8000 --users 5 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fake_ollama import FakeOllamaServer
+
+SAMPLES_DIR = os.path.join(BACKEND_DIR, '..', 'modeloIA', 'tests')
+DEFAULT_SAMPLES = ['test-medio.py', 'test-medio.js', 'test-medio.php']
+
+SCENARIOS = ('full', 'analyze', 'export')
+EXPORT_FORMATS = ('docx', 'pdf', 'markdown')
+
+# Orden de los endpoints en el informe
+ENDPOINTS = ('register', 'login', 'analyze', 'generate', 'regenerate', 'accept', 'export')
+
+def parse_mix(text: str) -> dict:
+    """'full=6,analyze=3,export=1' -> {'full': 6.0, 'analyze': 3.0, 'export': 1.0}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Escenario desconocido: {name}. Use: {', '.join(SCENARIOS)}")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Peso inválido para {name}: {weight}")
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError("La mezcla necesita al menos un escenario con peso positivo")
+    return mix
+
+def load_samples(names: list) -> list:
+    samples = []
+    for name in names:
+        path = name if os.path.isabs(name) or os.path.exists(name) else os.path.join(SAMPLES_DIR, name)
+        with open(path, 'r', encoding='utf-8') as f:
+            samples.append((os.path.basename(path), f.read()))
+    return samples
+
+def percentile(values: list, fraction: float) -> float:
+    """Percentil por rango más cercano sobre una lista ordenada."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+class Recorder:
+    """Latencias y códigos de estado por endpoint."""
+
+    def __init__(self):
+        self.samples = {}
+        self.statuses = {}
+
+    def record(self, endpoint: str, seconds: float, status):
+        self.samples.setdefault(endpoint, []).append((seconds, isinstance(status, int) and status < 400))
+        counts = self.statuses.setdefault(endpoint, {})
+        counts[str(status)] = counts.get(str(status), 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        names = [name for name in ENDPOINTS if name in self.samples]
+        names += sorted(set(self.samples) - set(ENDPOINTS))
+        for name in names:
+            samples = self.samples[name]
+            latencies = sorted(seconds for seconds, _ in samples)
+            errors = sum(1 for _, ok in samples if not ok)
+            endpoints[name] = {
+                'requests': len(samples),
+                'errors': errors,
+                'error_rate': round(errors / len(samples), 4),
+                'throughput_rps': round(len(samples) / elapsed, 3) if elapsed else 0,
+                'mean_s': round(sum(latencies) / len(latencies), 4),
+                'p50_s': round(percentile(latencies, 0.50), 4),
+                'p95_s': round(percentile(latencies, 0.95), 4),
+                'p99_s': round(percentile(latencies, 0.99), 4),
+                'max_s': round(latencies[-1], 4),
+                'statuses': self.statuses[name]
+            }
+        return endpoints
+
+class VirtualUser:
+    """Un usuario que recorre los escenarios con su propio token y sesiones de documento."""
+
+    def __init__(self, index: int, client: httpx.AsyncClient, recorder: Recorder, args, samples: list, run_id: str):
+        self.index = index
+        self.client = client
+        self.recorder = recorder
+        self.args = args
+        self.samples = samples
+        self.run_id = run_id
+        self.random = random.Random(args.seed + index)
+        self.headers = {}
+        self.iteration = 0
+
+    async def call(self, endpoint: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            response = None
+            status = type(e).__name__
+        self.recorder.record(endpoint, time.perf_counter() - start, status)
+        return response if response is not None and response.status_code < 400 else None
+
+    async def think(self):
+        if self.args.think_time:
+            await asyncio.sleep(self.random.uniform(0, 2 * self.args.think_time))
+
+    async def authenticate(self) -> bool:
+        username = f"carga_{self.run_id}_{self.index}"
+        password = 'carga-password'
+        await self.call('register', 'POST', '/api/register', json={
+            'username': username, 'email': f"{username}@example.com", 'password': password
+        })
+        response = await self.call('login', 'POST', '/api/login', json={
+            'username_or_email': username, 'password': password
+        })
+        if response is None:
+            return False
+        self.headers = {'Authorization': f"Bearer {response.json()['access_token']}"}
+        return True
+
+    def next_sample(self) -> tuple:
+        filename, code = self.random.choice(self.samples)
+        self.iteration += 1
+        if self.args.unique_code:
+            # Evita que las cachés y la deduplicación de generaciones respondan sin trabajar
+            marker = '#' if filename.endswith('.py') else '//'
+            code = f"{code.rstrip()}\n{marker} carga {self.run_id} usuario {self.index} iteración {self.iteration}\n"
+        return filename, code
+
+    async def analyze(self, filename: str, code: str):
+        response = await self.call('analyze', 'POST', '/api/analyze-code', files={
+            'file': (filename, code.encode('utf-8'), 'text/plain')
+        })
+        return response.json() if response is not None else None
+
+    async def export(self, payload: dict):
+        payload = dict(payload, format=self.random.choice(self.args.formats))
+        await self.call('export', 'POST', '/api/export', json=payload)
+
+    async def scenario_analyze(self):
+        await self.analyze(*self.next_sample())
+
+    async def scenario_export(self):
+        filename, code = self.next_sample()
+        await self.export({'documented_code': code, 'filename': filename})
+
+    async def scenario_full(self):
+        filename, code = self.next_sample()
+        analysis = await self.analyze(filename, code)
+        if analysis is None:
+            return
+        language = analysis['language']
+        session = {'session_id': analysis['session_id']}
+        await self.think()
+
+        if await self.call('generate', 'POST', '/api/generate-documentation',
+                           json=dict(session, filename=filename, language=language)) is None:
+            return
+        await self.think()
+
+        if self.random.random() < self.args.regenerate_ratio:
+            await self.call('regenerate', 'POST', '/api/regenerate-documentation',
+                            json=dict(session, language=language, feedback='Más detalle en los bucles'))
+            await self.think()
+
+        await self.call('accept', 'POST', '/api/accept-documentation',
+                        json=dict(session, filename=filename, language=language))
+        await self.think()
+        await self.export(dict(session, filename=filename, language=language))
+
+    async def run(self, deadline: float, mix: dict):
+        await asyncio.sleep(self.args.ramp_up * self.index / max(1, self.args.users))
+        if not await self.authenticate():
+            return
+
+        names = [name for name, weight in mix.items() if weight > 0]
+        weights = [mix[name] for name in names]
+        iterations = 0
+        while time.monotonic() < deadline and (not self.args.iterations or iterations < self.args.iterations):
+            scenario = self.random.choices(names, weights)[0]
+            await getattr(self, f"scenario_{scenario}")()
+            iterations += 1
+            await self.think()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_app(ollama_url: str, workdir: str, args) -> tuple:
+    """Inicia uvicorn con la app real en workdir (base SQLite y caché propias)."""
+    port = free_port()
+    env = dict(
+        os.environ,
+        OLLAMA_BASE_URL=ollama_url,
+        MODEL_CONCURRENCY=str(args.model_concurrency),
+        GENERATION_RATE_BURST=str(args.rate_burst),
+        GENERATION_RATE_PER_MINUTE=str(args.rate_per_minute),
+        EXPORT_CACHE_DIR=os.path.join(workdir, 'export_cache')
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--app-dir', BACKEND_DIR,
+         '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=workdir, env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"La aplicación terminó al iniciar (código {process.returncode})")
+        try:
+            if httpx.get(base_url + '/', timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+
+    process.terminate()
+    raise RuntimeError("La aplicación no respondió a tiempo")
+
+def stop_app(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+async def run_load(base_url: str, args, mix: dict, samples: list) -> tuple:
+    recorder = Recorder()
+    run_id = datetime.now().strftime('%H%M%S') + str(random.Random(args.seed).randint(100, 999))
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        users = [VirtualUser(i, client, recorder, args, samples, run_id) for i in range(args.users)]
+        start = time.monotonic()
+        deadline = start + args.ramp_up + args.duration
+        await asyncio.gather(*(user.run(deadline, mix) for user in users))
+        elapsed = time.monotonic() - start
+
+    return recorder, elapsed
+
+def print_report(endpoints: dict, elapsed: float):
+    print(f"\nDuración: {elapsed:.1f}s")
+    print(f"{'endpoint':<12} {'solic.':>7} {'errores':>8} {'tasa':>7} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, data in endpoints.items():
+        print(f"{name:<12} {data['requests']:>7} {data['errors']:>8} {data['error_rate']:>7.1%} "
+              f"{data['throughput_rps']:>8.2f} {data['p50_s']:>8.3f}s {data['p95_s']:>8.3f}s {data['p99_s']:>8.3f}s")
+        failed = {status: count for status, count in data['statuses'].items() if not status.startswith(('1', '2', '3'))}
+        if failed:
+            print(f"{'':<12} fallos: {failed}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', help='Probar un backend ya levantado en lugar de iniciar uno')
+    parser.add_argument('--users', type=int, default=10, help='Usuarios virtuales concurrentes')
+    parser.add_argument('--duration', type=float, default=60.0, help='Segundos de carga después del ramp-up')
+    parser.add_argument('--ramp-up', type=float, default=5.0, help='Segundos para incorporar a todos los usuarios')
+    parser.add_argument('--iterations', type=int, default=0, help='Escenarios máximos por usuario (0 = sin límite)')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('full=6,analyze=3,export=1'),
+                        help='Pesos de los escenarios, p. ej. full=6,analyze=3,export=1')
+    parser.add_argument('--regenerate-ratio', type=float, default=0.3, help='Fracción de escenarios full que regeneran')
+    parser.add_argument('--formats', nargs='+', default=list(EXPORT_FORMATS), choices=list(EXPORT_FORMATS))
+    parser.add_argument('--samples', nargs='+', default=DEFAULT_SAMPLES, help='Archivos de código a subir')
+    parser.add_argument('--unique-code', action='store_true', help='Variar el código en cada iteración para esquivar cachés')
+    parser.add_argument('--think-time', type=float, default=0.5, help='Pausa media entre pasos, en segundos')
+    parser.add_argument('--timeout', type=float, default=300.0, help='Timeout por solicitud, en segundos')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--tokens-per-second', type=float, default=200.0, help='Ritmo de tokens del Ollama falso')
+    parser.add_argument('--prompt-tokens-per-second', type=float, default=4000.0, help='Ritmo de lectura del prompt del Ollama falso')
+    parser.add_argument('--ollama-error-rate', type=float, default=0.0, help='Fracción de generaciones que fallan en el Ollama falso')
+    parser.add_argument('--model-concurrency', type=int, default=1, help='MODEL_CONCURRENCY de la app iniciada')
+    parser.add_argument('--rate-burst', type=float, default=1000000, help='GENERATION_RATE_BURST de la app iniciada')
+    parser.add_argument('--rate-per-minute', type=float, default=1000000, help='GENERATION_RATE_PER_MINUTE de la app iniciada')
+    parser.add_argument('--startup-timeout', type=float, default=30.0)
+    parser.add_argument('--output', help='Archivo JSON del informe')
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    ollama = None
+    process = None
+
+    with tempfile.TemporaryDirectory(prefix='load_test_') as workdir:
+        try:
+            base_url = args.base_url
+            if not base_url:
+                ollama = FakeOllamaServer(tokens_per_second=args.tokens_per_second,
+                                          prompt_tokens_per_second=args.prompt_tokens_per_second,
+                                          error_rate=args.ollama_error_rate)
+                ollama.start_background()
+                process, base_url = start_app(ollama.url, workdir, args)
+
+            print(f"Carga contra {base_url}: {args.users} usuarios, {args.duration:.0f}s, mezcla {args.mix}")
+            recorder, elapsed = asyncio.run(run_load(base_url, args, args.mix, samples))
+        finally:
+            if process is not None:
+                stop_app(process)
+            if ollama is not None:
+                ollama.shutdown()
+                ollama.server_close()
+
+    endpoints = recorder.report(elapsed)
+    print_report(endpoints, elapsed)
+
+    if args.output:
+        report = {
+            'meta': {
+                'date': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'base_url': args.base_url or 'local',
+                'users': args.users,
+                'duration_s': args.duration,
+                'ramp_up_s': args.ramp_up,
+                'mix': args.mix,
+                'regenerate_ratio': args.regenerate_ratio,
+                'unique_code': args.unique_code,
+                'tokens_per_second': None if args.base_url else args.tokens_per_second,
+                'model_concurrency': None if args.base_url else args.model_concurrency,
+                'elapsed_s': round(elapsed, 3)
+            },
+            'endpoints': endpoints,
+            'ollama_requests': ollama.requests if ollama is not None else None
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nInforme guardado en {args.output}")
+
+if __name__ == '__main__':
+    main()
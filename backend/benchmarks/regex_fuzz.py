@@ -0,0 +1,203 @@
+"""
+Corpus adversarial para el análisis estático de código subido por usuarios.
+
+Genera entradas diseñadas para provocar retroceso catastrófico en expresiones
+regulares (paréntesis sin cerrar, comentarios /** sin cerrar, identificadores y
+líneas enormes, modificadores repetidos), expresiones Python válidas pero muy
+anidadas (que agotan la pila de ast.parse) y mutaciones aleatorias de los ejemplos
+de modeloIA/tests/, y mide el peor caso de:
+
+    analyze_code, extract_functions + documentation_statistics,
+    analyze_control_flow y build_document.
+
+Cada medición debe terminar por debajo de --max-seconds; si alguna lo supera el
+script sale con código 1. El resultado se puede guardar en JSON con --output.
+
+Uso (desde backend/):
+    python benchmarks/regex_fuzz.py --sizes 10000 100000 1000000
+    python benchmarks/regex_fuzz.py --mutations 50 --seed 7 --output fuzz.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from code_analysis import analyze_code
+from ai_model import analyze_control_flow, extract_functions, documentation_statistics
+from document_model import build_document
+
+SAMPLES_DIR = os.path.join(BACKEND_DIR, '..', 'modeloIA', 'tests')
+
+SAMPLE_FILES = {
+    'python': 'python_largo.py',
+    'javascript': 'JS-largo.js',
+    'php': 'test-largo.php'
+}
+
+EXTENSIONS = {'python': '.py', 'javascript': '.js', 'php': '.php', 'go': '.go', 'java': '.java'}
+
+# Entradas patológicas: (nombre, unidad que se repite hasta el tamaño pedido, lenguajes)
+ALL_LANGUAGES = tuple(EXTENSIONS)
+ADVERSARIAL_UNITS = [
+    ('unclosed_call', 'a(', ALL_LANGUAGES),
+    ('unclosed_def', 'def a(', ('python',)),
+    ('unclosed_function', 'function a(', ('javascript', 'php')),
+    ('unclosed_func', 'func a(', ('go',)),
+    ('unclosed_arrow', 'const a = (', ('javascript',)),
+    ('unclosed_doc_block', '/**', ALL_LANGUAGES),
+    ('doc_blocks_without_code', '/** a */\n', ('javascript', 'php', 'java')),
+    ('repeated_modifiers', 'public ', ('java', 'php')),
+    ('repeated_types', 'public a a ', ('java',)),
+    ('line_comments', '// a\n', ('go', 'javascript', 'php')),
+    ('docstring_quotes', '"""', ('python',)),
+    ('assignments', 'a = a = ', ALL_LANGUAGES),
+    ('php_assignments', '$a = $a = ', ('php',)),
+    ('control_flow', 'for (if (while (', ALL_LANGUAGES),
+    ('whitespace', ' \t', ALL_LANGUAGES),
+    ('blank_lines', '\n', ALL_LANGUAGES),
+    ('long_identifier', 'a', ALL_LANGUAGES)
+]
+
+# Expresiones Python válidas pero muy anidadas, que agotan la pila de ast.parse:
+# (nombre, unidad que se repite, final que completa la expresión)
+DEEP_PYTHON_UNITS = [
+    ('deep_attribute', 'a.', 'a'),
+    ('deep_binop', 'a+', 'a'),
+    ('deep_unary', '-', 'a'),
+    ('deep_lambda', 'lambda: ', '0')
+]
+
+# Fragmentos que las mutaciones insertan en posiciones aleatorias
+MUTATION_FRAGMENTS = ['(', ')', '{', '}', '/**', '*/', '"""', '//', '\n', ' ' * 64, 'def ', 'function ', 'func ', 'public ']
+
+def repeat_to_size(unit: str, size: int) -> str:
+    return (unit * (size // len(unit) + 1))[:size]
+
+def nest_to_size(unit: str, end: str, size: int) -> str:
+    """Asignación 'x = <unidad repetida><final>' de aproximadamente 'size' caracteres."""
+    return 'x = ' + unit * max(1, (size - len(end) - 4) // len(unit)) + end + '\n'
+
+def load_sample(language: str) -> str:
+    name = SAMPLE_FILES.get(language)
+    if name is None:
+        return ''
+    with open(os.path.join(SAMPLES_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+def mutate(code: str, size: int, rng: random.Random) -> str:
+    """Ejemplo repetido hasta 'size' con fragmentos insertados y tramos eliminados al azar."""
+    text = repeat_to_size(code, size)
+    pieces = []
+    position = 0
+    while position < len(text):
+        step = rng.randint(1, 400)
+        pieces.append(text[position:position + step])
+        position += step
+        if rng.random() < 0.3:
+            pieces.append(rng.choice(MUTATION_FRAGMENTS))
+        elif rng.random() < 0.1:
+            position += rng.randint(1, 40)
+    return ''.join(pieces)[:size]
+
+def build_cases(languages: list, sizes: list, mutations: int, seed: int):
+    rng = random.Random(seed)
+    for language in languages:
+        for size in sizes:
+            for name, unit, targets in ADVERSARIAL_UNITS:
+                if language in targets:
+                    yield language, size, name, repeat_to_size(unit, size)
+            if language == 'python':
+                for name, unit, end in DEEP_PYTHON_UNITS:
+                    yield language, size, name, nest_to_size(unit, end, size)
+            sample = load_sample(language)
+            if sample:
+                for index in range(mutations):
+                    yield language, size, f'mutation_{index}', mutate(sample, size, rng)
+
+def run_case(language: str, code: str) -> tuple:
+    """Segundos de cada operación sobre el caso y si el análisis quedó parcial."""
+    filename = 'fuzz' + EXTENSIONS[language]
+    timings = {}
+
+    start = time.perf_counter()
+    analysis = analyze_code(code, language)
+    timings['analyze_code'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    extract_functions(code, language)
+    documentation_statistics(code, code, language)
+    timings['documentation_statistics'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    analyze_control_flow(code, language)
+    timings['analyze_control_flow'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    build_document(code, filename, language)
+    timings['build_document'] = time.perf_counter() - start
+
+    return timings, analysis.get('partial', False)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--languages', nargs='+', default=list(EXTENSIONS), choices=list(EXTENSIONS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000, 1000000], help='Tamaño de cada entrada en caracteres')
+    parser.add_argument('--mutations', type=int, default=10, help='Mutaciones aleatorias por lenguaje y tamaño')
+    parser.add_argument('--seed', type=int, default=1, help='Semilla de las mutaciones (reproducibles)')
+    parser.add_argument('--max-seconds', type=float, default=5.0, help='Tiempo máximo aceptado por operación')
+    parser.add_argument('--output', help='Archivo JSON de resultados')
+    args = parser.parse_args()
+
+    results = []
+    for language, size, name, code in build_cases(args.languages, args.sizes, args.mutations, args.seed):
+        timings, partial = run_case(language, code)
+        worst = max(timings, key=timings.get)
+        results.append({
+            'language': language,
+            'size': size,
+            'case': name,
+            'seconds': {operation: round(seconds, 6) for operation, seconds in timings.items()},
+            'worst_operation': worst,
+            'worst_seconds': round(timings[worst], 6),
+            'ms_per_kb': round(timings[worst] * 1000 / max(1, size / 1024), 4),
+            'partial_analysis': partial
+        })
+        if not name.startswith('mutation_') or timings[worst] > args.max_seconds:
+            marker = '  EXCEDE' if timings[worst] > args.max_seconds else ''
+            print(f"  {language:<10} {size:>8} {name:<24} {worst:<26} {timings[worst]:>8.4f}s{marker}")
+
+    failures = [r for r in results if r['worst_seconds'] > args.max_seconds]
+    slowest = sorted(results, key=lambda r: r['ms_per_kb'], reverse=True)[:5]
+    print("\nPeores casos (ms por KB):")
+    for r in slowest:
+        print(f"  {r['language']:<10} {r['size']:>8} {r['case']:<24} {r['worst_operation']:<26} {r['ms_per_kb']:.4f}")
+
+    if args.output:
+        report = {
+            'meta': {
+                'date': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'seed': args.seed,
+                'max_seconds': args.max_seconds
+            },
+            'results': results,
+            'failures': failures
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.output}")
+
+    if failures:
+        print(f"\n{len(failures)} caso(s) superaron {args.max_seconds}s")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+"""
+Suite de benchmarks del análisis, la construcción de prompts y la exportación.
+
+Genera corpus reproducibles de cada lenguaje soportado a partir de los ejemplos de
+modeloIA/tests/ (Go y Java usan una plantilla propia), con nombres de funciones
+distintos en cada copia, y mide:
+
+    analyze_code, analyze_control_flow, get_control_flow_hint, extract_functions,
+    check_documentation, build_document y la exportación a cada formato.
+
+El resultado se guarda en JSON; con --compare se contrasta contra una corrida
+anterior y se marcan las regresiones.
+
+Uso (desde backend/):
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 --output bench.json
+    python benchmarks/run_benchmarks.py --compare bench.json --fail-on-regression
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from code_analysis import analyze_code
+from ai_model import analyze_control_flow, get_control_flow_hint, extract_functions, check_documentation
+from document_model import build_document
+from code_parser import parse_cache
+from export_worker import render_export, EXPORT_FORMATS
+
+SAMPLES_DIR = os.path.join(BACKEND_DIR, '..', 'modeloIA', 'tests')
+
+# Archivos de ejemplo por lenguaje
+SAMPLE_FILES = {
+    'python': ['python_largo.py', 'test-medio.py'],
+    'javascript': ['JS-largo.js', 'test-medio.js'],
+    'php': ['test-largo.php', 'test-medio.php', 'test-bucle.php']
+}
+
+EXTENSIONS = {'python': '.py', 'javascript': '.js', 'php': '.php', 'go': '.go', 'java': '.java'}
+
+GO_TEMPLATE = '''// Inventario mantiene el stock por producto.
+type Inventario struct {
+\titems map[string]int
+}
+
+// NuevoInventario crea un inventario vacío.
+func NuevoInventario() *Inventario {
+\treturn &Inventario{items: map[string]int{}}
+}
+
+// Agregar suma unidades al producto indicado.
+func (i *Inventario) Agregar(nombre string, cantidad int) error {
+\tif cantidad <= 0 {
+\t\treturn fmt.Errorf("cantidad inválida: %d", cantidad)
+\t}
+\ti.items[nombre] += cantidad
+\treturn nil
+}
+
+func (i *Inventario) Total() int {
+\ttotal := 0
+\tfor _, cantidad := range i.items {
+\t\ttotal += cantidad
+\t}
+\treturn total
+}
+
+func procesarPedidos(pedidos []string, inv *Inventario) []string {
+\tfallidos := []string{}
+\tdefer func() {
+\t\tif r := recover(); r != nil {
+\t\t\tfmt.Println("recuperado", r)
+\t\t}
+\t}()
+\tfor _, pedido := range pedidos {
+\t\tswitch {
+\t\tcase inv.items[pedido] > 0:
+\t\t\tinv.items[pedido]--
+\t\tdefault:
+\t\t\tfallidos = append(fallidos, pedido)
+\t\t}
+\t}
+\treturn fallidos
+}
+'''
+
+JAVA_TEMPLATE = '''/**
+ * Cuenta bancaria con saldo y movimientos.
+ */
+public class Cuenta {
+    private double saldo;
+    private List<String> movimientos = new ArrayList<>();
+
+    /**
+     * Deposita un monto positivo.
+     */
+    public void depositar(double monto) {
+        if (monto <= 0) {
+            throw new IllegalArgumentException("Monto inválido");
+        }
+        saldo += monto;
+        movimientos.add("deposito:" + monto);
+    }
+
+    public boolean retirar(double monto) {
+        try {
+            if (monto > saldo) {
+                return false;
+            }
+            saldo -= monto;
+            return true;
+        } finally {
+            movimientos.add("retiro:" + monto);
+        }
+    }
+
+    public static double totalSaldos(List<Cuenta> cuentas) {
+        double total = 0;
+        for (Cuenta cuenta : cuentas) {
+            total += cuenta.saldo;
+        }
+        return total;
+    }
+}
+'''
+
+TEMPLATES = {'go': GO_TEMPLATE, 'java': JAVA_TEMPLATE}
+
+# Nombres que no se renombran entre copias (constructores y métodos especiales)
+KEEP_NAMES = {'constructor', '__init__', '__str__', '__construct', 'main'}
+
+def load_sample(language: str) -> str:
+    if language in TEMPLATES:
+        return TEMPLATES[language]
+    parts = []
+    for name in SAMPLE_FILES[language]:
+        with open(os.path.join(SAMPLES_DIR, name), 'r', encoding='utf-8') as f:
+            parts.append(f.read().rstrip('\n'))
+    return '\n\n'.join(parts)
+
+def build_corpus(language: str, target_lines: int) -> str:
+    """
+    Repite el ejemplo del lenguaje hasta target_lines líneas. Cada copia renombra
+    sus funciones y clases (nombre_N) para que no haya definiciones duplicadas.
+    """
+    sample = load_sample(language)
+    names = {
+        unit['name'] for unit in build_document(sample, 'sample' + EXTENSIONS[language], language)['units']
+    } - KEEP_NAMES
+    pattern = re.compile(r'\b(' + '|'.join(sorted(map(re.escape, names), key=len, reverse=True)) + r')\b') if names else None
+
+    lines = []
+    copy = 0
+    while len(lines) < target_lines:
+        text = pattern.sub(lambda m: f"{m.group(1)}_{copy}", sample) if pattern and copy else sample
+        lines.extend(text.split('\n'))
+        lines.append('')
+        copy += 1
+    return '\n'.join(lines[:target_lines])
+
+def measure(fn, repeat: int, max_seconds: float) -> list:
+    """Ejecuta fn hasta 'repeat' veces; deja de repetir si una corrida supera max_seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+        if times[-1] > max_seconds:
+            break
+    return times
+
+def summarize(language: str, lines: int, benchmark: str, times: list, calls: int = 1) -> dict:
+    return {
+        'language': language,
+        'lines': lines,
+        'benchmark': benchmark,
+        'calls': calls,
+        'runs': len(times),
+        'min_s': round(min(times), 6),
+        'median_s': round(statistics.median(times), 6),
+        'mean_s': round(statistics.mean(times), 6)
+    }
+
+def cold(fn):
+    """Envuelve fn para que cada corrida empiece con la caché de parsers vacía."""
+    def run():
+        parse_cache.clear()
+        return fn()
+    return run
+
+def run_corpus(language: str, lines: int, args, export_dir: str) -> list:
+    code = build_corpus(language, lines)
+    filename = 'bench' + EXTENSIONS[language]
+    results = []
+
+    def bench(name, fn, repeat=args.repeat, calls=1):
+        times = measure(fn, repeat, args.max_seconds)
+        result = summarize(language, lines, name, times, calls)
+        results.append(result)
+        print(f"  {language:<10} {lines:>7} {name:<24} mediana {result['median_s']:>10.4f}s  ({result['runs']} corridas)")
+
+    # Las mediciones parten sin el código en la caché de parsers (costo de la primera solicitud)
+    bench('analyze_code', cold(lambda: analyze_code(code, language)))
+    control_flow = analyze_control_flow(code, language)
+    bench('analyze_control_flow', cold(lambda: analyze_control_flow(code, language)))
+    bench('get_control_flow_hint', lambda: get_control_flow_hint(control_flow, language))
+    functions = extract_functions(code, language)
+    bench('extract_functions', cold(lambda: extract_functions(code, language)))
+
+    checked = functions[:args.check_functions]
+    if checked:
+        bench('check_documentation', cold(lambda: [check_documentation(code, name, language) for name in checked]),
+              calls=len(checked))
+
+    bench('build_document', lambda: build_document(code, filename, language))
+
+    if not args.skip_exports:
+        document = build_document(code, filename, language)
+        for export_format in args.formats:
+            def export():
+                path = render_export(export_format, document, directory=export_dir)[0]
+                os.remove(path)
+            bench(f'export_{export_format}', export, repeat=args.export_repeat)
+
+    return results
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+def compare(results: list, baseline_path: str, threshold: float, noise_floor: float) -> list:
+    """
+    Retorna las mediciones más lentas que la base por encima del umbral.
+    Las que duran menos de noise_floor segundos se muestran pero no cuentan como regresión.
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {
+            (r['language'], r['lines'], r['benchmark']): r for r in json.load(f)['results']
+        }
+
+    regressions = []
+    print(f"\nComparación contra {baseline_path} (umbral x{threshold}):")
+    for result in results:
+        previous = baseline.get((result['language'], result['lines'], result['benchmark']))
+        if previous is None or previous['median_s'] == 0:
+            continue
+        ratio = result['median_s'] / previous['median_s']
+        regressed = ratio > threshold and result['median_s'] >= noise_floor
+        marker = '  REGRESIÓN' if regressed else ''
+        print(f"  {result['language']:<10} {result['lines']:>7} {result['benchmark']:<24} x{ratio:.2f}{marker}")
+        if regressed:
+            regressions.append(dict(result, baseline_median_s=previous['median_s'], ratio=round(ratio, 3)))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--languages', nargs='+', default=list(EXTENSIONS), choices=list(EXTENSIONS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000], help='Líneas de cada corpus')
+    parser.add_argument('--formats', nargs='+', default=list(EXPORT_FORMATS), choices=list(EXPORT_FORMATS))
+    parser.add_argument('--repeat', type=int, default=5, help='Corridas por benchmark de análisis')
+    parser.add_argument('--export-repeat', type=int, default=1, help='Corridas por formato de exportación')
+    parser.add_argument('--max-seconds', type=float, default=30.0, help='No repetir un benchmark si una corrida tarda más')
+    parser.add_argument('--check-functions', type=int, default=20, help='Funciones verificadas con check_documentation')
+    parser.add_argument('--skip-exports', action='store_true')
+    parser.add_argument('--output', help='Archivo JSON de resultados')
+    parser.add_argument('--compare', help='JSON de una corrida anterior para detectar regresiones')
+    parser.add_argument('--threshold', type=float, default=1.10, help='Cociente a partir del cual hay regresión')
+    parser.add_argument('--noise-floor', type=float, default=0.005, help='Segundos por debajo de los cuales se ignora una regresión')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Salir con código 1 si hay regresiones')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='bench_export_') as export_dir:
+        for lines in args.sizes:
+            for language in args.languages:
+                results.extend(run_corpus(language, lines, args, export_dir))
+
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'export_repeat': args.export_repeat
+        },
+        'results': results
+    }
+
+    regressions = compare(results, args.compare, args.threshold, args.noise_floor) if args.compare else []
+    if args.compare:
+        report['regressions'] = regressions
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.output}")
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
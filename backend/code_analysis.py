@@ -0,0 +1,61 @@
+import os
+
+from code_parser import parse_code, function_units, class_units, documented_units
+from regex_guard import AnalysisBudget
+
+# Segundos máximos de análisis por archivo; al agotarse se responde un análisis parcial
+ANALYSIS_TIME_BUDGET = float(os.getenv("ANALYSIS_TIME_BUDGET", 2))
+
+# Lenguajes soportados y sus extensiones. Las funciones, clases y su documentación
+# se obtienen con los parsers de code_parser
+LANGUAGE_PATTERNS = {
+    'python': {'extensions': ['.py']},
+    'javascript': {'extensions': ['.js', '.jsx', '.ts', '.tsx']},
+    'java': {'extensions': ['.java']},
+    'php': {'extensions': ['.php']},
+    'go': {'extensions': ['.go']}
+}
+
+def detect_language(filename: str) -> str:
+    """Detectar lenguaje por extensión"""
+    ext = os.path.splitext(filename)[1].lower()
+    for lang, data in LANGUAGE_PATTERNS.items():
+        if ext in data['extensions']:
+            return lang
+    return 'unknown'
+
+def analyze_code(code: str, language: str, time_budget: float = None) -> dict:
+    """
+    Analizar código y calcular estadísticas.
+    Si el análisis supera time_budget segundos (ANALYSIS_TIME_BUDGET por defecto)
+    se detiene y retorna lo contado hasta ese punto con 'partial': True.
+    """
+    if language not in LANGUAGE_PATTERNS:
+        return {
+            'language': language,
+            'total_lines': len(code.split('\n')),
+            'functions_count': 0,
+            'classes_count': 0,
+            'documented_functions': 0,
+            'documentation_percentage': 0,
+            'partial': False
+        }
+
+    budget = AnalysisBudget(ANALYSIS_TIME_BUDGET if time_budget is None else time_budget)
+    parsed = parse_code(code, language, budget)
+    functions_count = len(function_units(parsed))
+    documented_functions = len(documented_units(parsed))
+
+    documentation_percentage = 0
+    if functions_count > 0:
+        documentation_percentage = round((documented_functions / functions_count) * 100, 1)
+
+    return {
+        'language': language,
+        'total_lines': parsed['total_lines'],
+        'functions_count': functions_count,
+        'classes_count': len(class_units(parsed)),
+        'documented_functions': documented_functions,
+        'documentation_percentage': documentation_percentage,
+        'partial': parsed['partial']
+    }
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import metrics
+from document_model import extract_units, parse_python
+
+# Árboles de análisis guardados en memoria (por contenido y lenguaje). Un árbol de ast ocupa
+# unas 40 veces el código fuente, por eso además del número de entradas se acota la suma
+# de los tamaños del código analizado
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", 256))
+PARSE_CACHE_MAX_MB = float(os.getenv("PARSE_CACHE_MAX_MB", 2))
+
+# Tipos de unidad que cuentan como funciones en las estadísticas
+FUNCTION_KINDS = ('function', 'method')
+
+def _python_parser(code: str, language: str, budget=None) -> tuple:
+    """
+    Un solo ast.parse por contenido: el árbol se guarda junto a las unidades y lo
+    reutilizan el análisis de flujo de control y la estructura del código (ai_model).
+    """
+    return parse_python(code, code.split('\n'), budget)
+
+def _builtin_parser(code: str, language: str, budget=None) -> tuple:
+    """Recorrido léxico de document_model para los lenguajes con llaves."""
+    return extract_units(code, code.split('\n'), language, budget), None
+
+# Parser por lenguaje: parser(code, language, budget) -> (unidades, árbol o None). Las unidades
+# tienen el formato de document_model (name, kind, parent, signature, docstring, start_line,
+# body_start, end_line); el árbol es el del parser, para quien sepa recorrerlo
+PARSERS = {
+    'python': _python_parser,
+    'javascript': _builtin_parser,
+    'java': _builtin_parser,
+    'php': _builtin_parser,
+    'go': _builtin_parser
+}
+
+def register_parser(language: str, parser):
+    """Reemplaza o agrega el parser de un lenguaje (por ejemplo, uno basado en una gramática externa)."""
+    PARSERS[language] = parser
+    parse_cache.clear()
+
+def content_hash(code: str, language: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(language.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(code.encode('utf-8'))
+    return digest.hexdigest()
+
+class ParseCache:
+    """
+    Caché LRU acotada de hash de contenido -> código analizado, por número de entradas
+    y por bytes del código fuente de cada una (el árbol crece con el código).
+    Las entradas se comparten entre solicitudes: quien las recibe no debe modificarlas.
+    """
+
+    def __init__(self, max_size: int = 256, max_bytes: int = 2 * 1024 * 1024):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (parsed, bytes)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, parsed: dict, size: int):
+        # Un código más grande que toda la caché no se guarda: desalojaría todo lo demás
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries[key][1]
+            self._entries[key] = (parsed, size)
+            self._entries.move_to_end(key)
+            self._total_bytes += size
+
+            # Desalojar los menos usados recientemente
+            while len(self._entries) > self.max_size or self._total_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+parse_cache = ParseCache(PARSE_CACHE_SIZE, max_bytes=int(PARSE_CACHE_MAX_MB * 1024 * 1024))
+
+def parse_code(code: str, language: str, budget=None) -> dict:
+    """
+    Analiza el código con el parser del lenguaje y retorna
+    {'language', 'hash', 'total_lines', 'units', 'tree', 'partial'}.
+    El mismo contenido se analiza una sola vez: el análisis del archivo, las
+    estadísticas de la documentación generada y las regeneraciones lo reutilizan.
+    Un análisis cortado por el presupuesto ('partial': True) no se guarda.
+    """
+    key = content_hash(code, language)
+    parsed = parse_cache.get(key)
+    metrics.inc('code_doc_cache_requests_total', cache='parse', result='hit' if parsed is not None else 'miss')
+    if parsed is not None:
+        return parsed
+
+    parser = PARSERS.get(language)
+    with metrics.stage('parse', language=language):
+        units, tree = parser(code, language, budget) if parser else ([], None)
+
+    parsed = {
+        'language': language,
+        'hash': key,
+        'total_lines': code.count('\n') + 1,
+        'units': units,
+        'tree': tree,
+        'partial': bool(budget is not None and budget.exhausted)
+    }
+    if not parsed['partial']:
+        parse_cache.put(key, parsed, len(code.encode('utf-8')))
+    return parsed
+
+def function_units(parsed: dict) -> list:
+    return [unit for unit in parsed['units'] if unit['kind'] in FUNCTION_KINDS]
+
+def class_units(parsed: dict) -> list:
+    return [unit for unit in parsed['units'] if unit['kind'] == 'class']
+
+def documented_units(parsed: dict) -> list:
+    """Funciones y métodos con un comentario de documentación asociado."""
+    return [unit for unit in function_units(parsed) if unit['docstring']]
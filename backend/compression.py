@@ -0,0 +1,232 @@
+import json
+import zlib
+
+# Brotli es opcional: sin el paquete se negocia solo gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Tipos de contenido que vale la pena comprimir (DOCX, PDF y ZIP ya vienen comprimidos)
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml')
+
+class RequestTooLarge(Exception):
+    """El cuerpo descomprimido supera el límite permitido."""
+
+def decompress_body(body: bytes, encoding: str, max_size: int) -> bytes:
+    """
+    Descomprime el cuerpo de una solicitud (gzip, deflate o br) sin superar max_size bytes.
+    Lanza ValueError si la codificación no está soportada o los datos son inválidos
+    o están incompletos (un cuerpo cortado no se entrega a medias).
+    """
+    if encoding in ('gzip', 'x-gzip'):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        decompressor = zlib.decompressobj()
+    elif encoding == 'br' and brotli is not None:
+        return _brotli_decompress(body, max_size)
+    else:
+        raise ValueError(f"Codificación no soportada: {encoding}")
+
+    try:
+        # max_length corta la descompresión apenas se pasa del límite
+        result = decompressor.decompress(body, max_size + 1)
+    except zlib.error as e:
+        raise ValueError(f"Cuerpo comprimido inválido: {e}")
+    if len(result) > max_size:
+        raise RequestTooLarge()
+    if not decompressor.eof:
+        raise ValueError("Cuerpo comprimido incompleto")
+    return result
+
+def _brotli_decompress(body: bytes, max_size: int, chunk_size: int = 1024) -> bytes:
+    # brotli no acepta un límite de salida: se alimenta en bloques pequeños y se corta al pasarse
+    decompressor = brotli.Decompressor()
+    parts = []
+    total = 0
+    try:
+        for start in range(0, len(body), chunk_size):
+            part = decompressor.process(body[start:start + chunk_size])
+            total += len(part)
+            if total > max_size:
+                raise RequestTooLarge()
+            parts.append(part)
+    except brotli.error as e:
+        raise ValueError(f"Cuerpo comprimido inválido: {e}")
+    if not decompressor.is_finished():
+        raise ValueError("Cuerpo comprimido incompleto")
+    return b''.join(parts)
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin-1')
+    return ''
+
+async def _send_error(send, status: int, message: str):
+    body = json.dumps({'detail': message}).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+class RequestDecompressionMiddleware:
+    """
+    Acepta cuerpos de solicitud con Content-Encoding gzip, deflate o br y
+    los entrega descomprimidos a los endpoints.
+    """
+
+    def __init__(self, app, max_size: int = 50 * 1024 * 1024):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        encoding = _header(scope, b'content-encoding').strip().lower() if scope['type'] == 'http' else ''
+        if not encoding or encoding == 'identity':
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            more_body = message.get('more_body', False)
+
+        try:
+            body = decompress_body(b''.join(chunks), encoding, self.max_size)
+        except RequestTooLarge:
+            await _send_error(send, 413, 'El contenido descomprimido es demasiado grande')
+            return
+        except ValueError as e:
+            await _send_error(send, 415 if 'soportada' in str(e) else 400, str(e))
+            return
+
+        headers = [
+            (key, value) for key, value in scope['headers']
+            if key not in (b'content-encoding', b'content-length')
+        ]
+        headers.append((b'content-length', str(len(body)).encode()))
+        # Se modifica el scope recibido, no una copia: los middlewares externos (métricas)
+        # leen de él la ruta que Starlette resuelve más adentro
+        scope['headers'] = headers
+        delivered = False
+
+        async def receive_body():
+            nonlocal delivered
+            if delivered:
+                return await receive()
+            delivered = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        await self.app(scope, receive_body, send)
+
+class ResponseCompressionMiddleware:
+    """
+    Comprime las respuestas de texto y JSON con brotli o gzip según Accept-Encoding.
+    Las respuestas pequeñas y los formatos ya comprimidos se envían tal cual.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _choose_encoding(self, scope) -> str:
+        """La codificación con mayor q de Accept-Encoding (br ante un empate); q=0 la rechaza."""
+        weights = {}
+        for part in _header(scope, b'accept-encoding').lower().split(','):
+            name, _, params = part.partition(';')
+            weight = 1.0
+            for param in params.split(';'):
+                key, _, value = param.partition('=')
+                if key.strip() == 'q':
+                    try:
+                        weight = float(value)
+                    except ValueError:
+                        weight = 0.0
+            weights[name.strip()] = weight
+
+        chosen, best = '', 0.0
+        for encoding in (('br', 'gzip') if brotli is not None else ('gzip',)):
+            weight = weights.get(encoding, weights.get('*', 0.0))
+            if weight > best:
+                chosen, best = encoding, weight
+        return chosen
+
+    async def __call__(self, scope, receive, send):
+        encoding = self._choose_encoding(scope) if scope['type'] == 'http' else ''
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+
+        def compress(data: bytes, final: bool) -> bytes:
+            if encoding == 'br':
+                out = compressor.process(data)
+                return out + compressor.finish() if final else out + compressor.flush()
+            out = compressor.compress(data)
+            return out + compressor.flush() if final else out
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor
+
+            if message['type'] == 'http.response.start':
+                headers = {key.lower(): value for key, value in message.get('headers', [])}
+                content_type = headers.get(b'content-type', b'').decode('latin-1')
+                if b'content-encoding' in headers or not content_type.startswith(COMPRESSIBLE_TYPES):
+                    start_message = False
+                    await send(message)
+                else:
+                    # Se decide con el primer bloque del cuerpo
+                    start_message = message
+                return
+
+            if message['type'] != 'http.response.body' or not start_message:
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    await send(start_message)
+                    start_message = False
+                    await send(message)
+                    return
+
+                if encoding == 'br':
+                    compressor = brotli.Compressor(quality=self.brotli_quality)
+                else:
+                    compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+                headers = [
+                    (key, value) for key, value in start_message.get('headers', [])
+                    if key.lower() not in (b'content-length', b'vary')
+                ]
+                headers.append((b'content-encoding', encoding.encode()))
+                # Un Vary que ya traía la respuesta se conserva, sumando Accept-Encoding
+                vary = [
+                    value.decode('latin-1').strip() for key, value in start_message.get('headers', [])
+                    if key.lower() == b'vary'
+                ]
+                if not any(item.strip().lower() in ('accept-encoding', '*') for value in vary for item in value.split(',')):
+                    vary.append('Accept-Encoding')
+                headers.append((b'vary', ', '.join(vary).encode('latin-1')))
+                await send(dict(start_message, headers=headers))
+
+            await send({
+                'type': 'http.response.body',
+                'body': compress(body, not more_body),
+                'more_body': more_body
+            })
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,312 @@
+import ast
+import os
+import re
+from datetime import datetime
+
+# Lenguaje por extensión, para documentos que llegan sin lenguaje explícito
+LANGUAGE_BY_EXTENSION = {
+    '.py': 'python',
+    '.js': 'javascript',
+    '.jsx': 'javascript',
+    '.ts': 'javascript',
+    '.tsx': 'javascript',
+    '.java': 'java',
+    '.php': 'php',
+    '.go': 'go'
+}
+
+# Encabezados de funciones y clases para los lenguajes con llaves.
+# Cada patrón se aplica a una sola línea y retorna (tipo, nombre).
+UNIT_PATTERNS = {
+    'javascript': [
+        ('class', re.compile(r'^\s*(?:export\s+)?(?:default\s+)?class\s+(\w+)')),
+        ('function', re.compile(r'^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*(\w+)\s*\(')),
+        ('function', re.compile(r'^\s*(?:export\s+)?(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>|\w+\s*=>)')),
+        ('method', re.compile(r'^\s*(?:static\s+|async\s+|get\s+|set\s+)*(\w+)\s*\([^)]*\)\s*\{'))
+    ],
+    'java': [
+        ('class', re.compile(r'^\s*(?:(?:public|private|protected|static|final|abstract)\s+)*(?:class|interface|enum|record)\s+(\w+)')),
+        # Modificador inicial y luego tokens separados por espacios (tipo, genéricos, más modificadores):
+        # los tokens no incluyen espacios, así que una línea sin '(' se descarta en tiempo lineal
+        ('method', re.compile(r'^\s*(?:public|private|protected|static|final|abstract|synchronized|native|default)\s+(?:[\w<>\[\],.?]+\s+)+?(\w+)\s*\('))
+    ],
+    'php': [
+        ('class', re.compile(r'^\s*(?:(?:abstract|final)\s+)?(?:class|interface|trait)\s+(\w+)')),
+        ('function', re.compile(r'^\s*(?:(?:public|private|protected|static|abstract|final)\s+)*function\s+&?(\w+)\s*\('))
+    ],
+    'go': [
+        ('class', re.compile(r'^type\s+(\w+)\s+(?:struct|interface)\b')),
+        ('method', re.compile(r'^func\s+\([^)]*\)\s*(\w+)\s*[\[(]')),
+        ('function', re.compile(r'^func\s+(\w+)\s*[\[(]'))
+    ]
+}
+
+# Cada cuántas líneas los recorridos revisan el presupuesto de tiempo
+BUDGET_CHECK_LINES = 256
+
+# Palabras que el patrón de métodos de JavaScript confundiría con un nombre
+CONTROL_KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'function', 'return', 'with'}
+
+def build_document(documented_code: str, filename: str, language: str = None) -> dict:
+    """
+    Construye la representación intermedia de un documento a exportar.
+    Se arma una sola vez y la consumen todos los renderizadores (DOCX, PDF, Markdown).
+    """
+    if not language:
+        extension = os.path.splitext(filename)[1].lower()
+        language = LANGUAGE_BY_EXTENSION.get(extension, 'python')
+
+    # Importación diferida: code_parser usa los recorridos de este módulo
+    from code_parser import parse_code
+
+    return {
+        'filename': filename,
+        'language': language,
+        'code': documented_code,
+        'lines': documented_code.split('\n'),
+        # El análisis del código se comparte (por contenido) con el resto de la aplicación
+        'units': parse_code(documented_code, language)['units'],
+        'generated_at': datetime.now().strftime("%d/%m/%Y %H:%M")
+    }
+
+def _make_unit(name: str, kind: str, signature: str, docstring: str,
+               start_line: int, body_start: int, end_line: int, parent: str = None) -> dict:
+    # Las líneas son 1-indexadas e inclusivas; el cuerpo va de body_start a end_line
+    return {
+        'name': name,
+        'kind': kind,
+        'parent': parent,
+        'signature': signature,
+        'docstring': docstring,
+        'start_line': start_line,
+        'body_start': body_start,
+        'end_line': end_line
+    }
+
+def unit_body(document: dict, unit: dict) -> str:
+    """Retorna el cuerpo de una unidad a partir de su rango de líneas."""
+    return '\n'.join(document['lines'][unit['body_start'] - 1:unit['end_line']])
+
+def extract_units(code: str, lines: list, language: str, budget=None) -> list:
+    """
+    Extrae las funciones, métodos y clases del código, en orden de aparición.
+    Con un presupuesto (regex_guard.AnalysisBudget) los recorridos por línea se
+    detienen al agotarse y retornan las unidades encontradas hasta ese punto.
+    No usa caché: para eso está code_parser.parse_code.
+    """
+    if language == 'python':
+        return parse_python(code, lines, budget)[0]
+    if language in UNIT_PATTERNS:
+        return _brace_units(lines, language, budget)
+    return []
+
+# === PYTHON ===
+
+def parse_python(code: str, lines: list, budget=None) -> tuple:
+    """(unidades, árbol) del código; sin árbol si no compila, con las unidades por indentación."""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        # Código válido pero muy anidado (p. ej. 'a.a.a…' o '- - -…') agota la pila del compilador
+        return indented_units(lines, budget), None
+    return python_units(tree, lines), tree
+
+def _nested_bodies(node):
+    # Bloques de sentencias de una sentencia compuesta (if, for, while, try, with, match)
+    for field in ('body', 'orelse', 'finalbody'):
+        yield getattr(node, field, [])
+    for clause in getattr(node, 'handlers', []) + getattr(node, 'cases', []):
+        yield clause.body
+
+def python_units(tree, lines: list) -> list:
+    """
+    Funciones, métodos y clases del árbol, incluidas las definidas dentro de otra función
+    o de un bloque (if, try, ...). Como en los lenguajes con llaves, 'parent' es solo la
+    clase que contiene directamente a la unidad.
+    """
+    units = []
+
+    def visit(body, parent=None):
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                if isinstance(node, ast.ClassDef):
+                    kind = 'class'
+                else:
+                    kind = 'method' if parent else 'function'
+                body_start = node.body[0].lineno if node.body else node.end_lineno
+                header = lines[node.lineno - 1:max(node.lineno, body_start - 1)]
+                signature = ' '.join(line.strip() for line in header)
+                units.append(_make_unit(
+                    node.name, kind, signature, ast.get_docstring(node) or '',
+                    node.lineno, body_start, node.end_lineno, parent
+                ))
+                visit(node.body, node.name if isinstance(node, ast.ClassDef) else None)
+            elif isinstance(node, ast.stmt):
+                for nested in _nested_bodies(node):
+                    visit(nested, parent)
+
+    visit(tree.body)
+    return units
+
+def indented_units(lines: list, budget=None) -> list:
+    """Respaldo por indentación para código Python que no compila."""
+    header = re.compile(r'^(\s*)(?:async\s+)?(def|class)\s+(\w+)')
+    units = []
+    open_units = []
+    # Unidad recién abierta cuyo docstring puede estar en la próxima línea con texto
+    awaiting_docstring = None
+
+    for number, line in enumerate(lines, 1):
+        if budget is not None and number % BUDGET_CHECK_LINES == 0 and budget.expired():
+            break
+        if not line.strip():
+            continue
+        if awaiting_docstring is not None:
+            stripped = line.strip()
+            if stripped.startswith(('"""', "'''")):
+                awaiting_docstring['docstring'] = stripped.strip('"\'').strip()
+            awaiting_docstring = None
+        indent = len(line) - len(line.lstrip())
+        while open_units and indent <= open_units[-1][0]:
+            open_units.pop()
+
+        match = header.match(line)
+        if match:
+            parent = next((u['name'] for _, u in reversed(open_units) if u['kind'] == 'class'), None)
+            kind = 'class' if match.group(2) == 'class' else ('method' if parent else 'function')
+            unit = _make_unit(match.group(3), kind, line.strip(), '', number, number + 1, number, parent)
+            units.append(unit)
+            open_units.append((indent, unit))
+            awaiting_docstring = unit
+
+        for _, unit in open_units:
+            unit['end_line'] = number
+
+    return units
+
+# === LENGUAJES CON LLAVES ===
+
+def _match_unit(line: str, language: str):
+    for kind, pattern in UNIT_PATTERNS[language]:
+        match = pattern.match(line)
+        if match and match.group(1) not in CONTROL_KEYWORDS:
+            return kind, match.group(1)
+    return None
+
+def _leading_comment(lines: list, index: int) -> str:
+    """Bloque de comentarios inmediatamente anterior a la línea 'index' (0-indexada)."""
+    position = index - 1
+    # Anotaciones y decoradores entre el comentario y la declaración
+    while position >= 0 and lines[position].strip().startswith('@'):
+        position -= 1
+    if position < 0:
+        return ''
+
+    stripped = lines[position].strip()
+    collected = []
+    if stripped.endswith('*/'):
+        while position >= 0:
+            collected.append(lines[position].strip())
+            if lines[position].strip().startswith('/*'):
+                break
+            position -= 1
+        text = [re.sub(r'^/\*\*?|\*/$|^\*\s?', '', line).strip() for line in reversed(collected)]
+    else:
+        while position >= 0 and lines[position].strip().startswith(('//', '#')):
+            collected.append(lines[position].strip())
+            position -= 1
+        text = [re.sub(r'^(//+|#)\s?', '', line) for line in reversed(collected)]
+
+    return '\n'.join(text).strip()
+
+def _brace_units(lines: list, language: str, budget=None) -> list:
+    """
+    Detecta las unidades por línea y calcula su rango con un único recorrido
+    que cuenta llaves fuera de cadenas y comentarios.
+    """
+    units = []
+    pending = []  # (unidad, profundidad en la que debe abrir su llave)
+    stack = []    # (unidad, profundidad exterior a su llave)
+    depth = 0
+    parens = 0
+    in_block_comment = False
+
+    for number, line in enumerate(lines, 1):
+        if budget is not None and number % BUDGET_CHECK_LINES == 0 and budget.expired():
+            break
+        stripped = line.strip()
+        # Un encabezado ya cerrado solo puede abrir su llave en la línea siguiente (estilo Allman)
+        if pending and parens == 0 and stripped and not stripped.startswith(('{', 'throws', '//', '/*', '*')):
+            for unit, _ in pending:
+                _close_bodiless(unit, unit['end_line'])
+            pending = []
+
+        if not in_block_comment:
+            found = _match_unit(line, language)
+            if found:
+                kind, name = found
+                parent = stack[-1][0]['name'] if stack and stack[-1][0]['kind'] == 'class' else None
+                if kind == 'method' and parent is None and language == 'javascript':
+                    found = None
+                else:
+                    if kind == 'function' and parent:
+                        kind = 'method'
+                    unit = _make_unit(
+                        # La firma termina en la primera llave: un método de una línea no arrastra su cuerpo
+                        name, kind, line.strip().split('{', 1)[0].strip(),
+                        _leading_comment(lines, number - 1), number, number + 1, number, parent
+                    )
+                    units.append(unit)
+                    pending.append((unit, depth))
+
+        quote = None
+        position = 0
+        while position < len(line):
+            char = line[position]
+            if in_block_comment:
+                if line.startswith('*/', position):
+                    in_block_comment = False
+                    position += 1
+            elif quote:
+                if char == '\\':
+                    position += 1
+                elif char == quote:
+                    quote = None
+            elif line.startswith('/*', position):
+                in_block_comment = True
+                position += 1
+            elif line.startswith('//', position) or (char == '#' and language == 'php'):
+                break
+            elif char in '"\'`':
+                quote = char
+            elif char == '(':
+                parens += 1
+            elif char == ')':
+                parens = max(0, parens - 1)
+            elif char == '{':
+                if pending and pending[-1][1] == depth:
+                    unit, _ = pending.pop()
+                    unit['body_start'] = number if position < len(line.rstrip()) - 1 else number + 1
+                    stack.append((unit, depth))
+                depth += 1
+            elif char == '}':
+                depth = max(0, depth - 1)
+                if stack and stack[-1][1] == depth:
+                    stack.pop()[0]['end_line'] = number
+            elif char == ';' and pending and pending[-1][1] == depth:
+                # Declaración sin cuerpo (métodos abstractos, interfaces)
+                _close_bodiless(pending.pop()[0], number)
+            position += 1
+
+    # Unidades sin cerrar llegan hasta el final del archivo
+    for unit, _ in stack:
+        unit['end_line'] = len(lines)
+    for unit, _ in pending:
+        _close_bodiless(unit, unit['end_line'])
+
+    return units
+
+def _close_bodiless(unit: dict, end_line: int):
+    # Sin llave no hay cuerpo: el rango termina en la declaración y body_start no lo supera
+    unit['end_line'] = end_line
+    unit['body_start'] = end_line
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+class ExportCache:
+    """
+    Caché en disco de documentos exportados, con desalojo LRU por tamaño total.
+    Cada artefacto es un archivo '<clave><extensión>' dentro de 'directory'.
+    get y put fijan la entrada que retornan: no se desaloja (ni se borra su archivo)
+    hasta que quien la recibió llama a release, por ejemplo al terminar de enviarla.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._pins = {}  # clave -> solicitudes que están usando su archivo
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(documented_code: str, filename: str, export_format: str, template_version: int) -> str:
+        """Clave del artefacto: contenido, nombre mostrado en el documento, formato y versión de plantilla."""
+        digest = hashlib.sha256()
+        for part in (documented_code, filename, export_format, str(template_version)):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def load(self):
+        """Reconstruye el índice desde los archivos existentes, del menos al más reciente."""
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            key = name.split('.', 1)[0]
+            if not os.path.isfile(path):
+                continue
+            # Temporal de un renderizado interrumpido por un reinicio
+            if name.startswith('export_'):
+                os.remove(path)
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_mtime, key, path, stat.st_size))
+
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            for _, key, path, size in sorted(files):
+                self._entries[key] = (path, size)
+                self._total_bytes += size
+            self._evict()
+
+    def get(self, key: str):
+        """Retorna la ruta del artefacto, fijada hasta release(key), o None si no está en caché."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                try:
+                    # El orden LRU sobrevive reinicios a través de la fecha de modificación
+                    os.utime(entry[0])
+                except FileNotFoundError:
+                    # Borrado por fuera de la caché: cuenta como ausente
+                    self._drop(key)
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self._pins[key] = self._pins.get(key, 0) + 1
+            return entry[0]
+
+    def put(self, key: str, extension: str, rendered_path: str) -> str:
+        """Mueve un archivo recién renderizado (dentro de 'directory') a la caché y lo fija hasta release(key)."""
+        path = os.path.join(self.directory, key + extension)
+        os.replace(rendered_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries[key][1]
+            self._entries[key] = (path, size)
+            self._entries.move_to_end(key)
+            self._total_bytes += size
+            self._pins[key] = self._pins.get(key, 0) + 1
+            self._evict()
+
+        return path
+
+    def release(self, key: str):
+        """Libera una ruta retornada por get o put; las entradas sin uso vuelven a poder desalojarse."""
+        with self._lock:
+            remaining = self._pins.get(key, 0) - 1
+            if remaining > 0:
+                self._pins[key] = remaining
+            else:
+                self._pins.pop(key, None)
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _drop(self, key: str):
+        path, size = self._entries.pop(key)
+        self._total_bytes -= size
+        return path
+
+    def _evict(self):
+        # Las entradas fijadas se saltan: la caché puede pasarse del límite mientras se envían
+        if self._total_bytes <= self.max_bytes:
+            return
+        for key in [key for key in self._entries if key not in self._pins]:
+            if self._total_bytes <= self.max_bytes:
+                break
+            path = self._drop(key)
+            if os.path.exists(path):
+                os.remove(path)
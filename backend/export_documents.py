@@ -1,7 +1,12 @@
 from docx import Document
 from docx.shared import Pt, RGBColor, Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
 from io import BytesIO
+from itertools import groupby
+from tempfile import SpooledTemporaryFile
 import markdown
 from datetime import datetime
 from reportlab.lib.pagesizes import letter, A4
@@ -10,10 +15,69 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Preformatted
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from reportlab.pdfgen import canvas
+from xml.sax.saxutils import escape
+from document_model import build_document
+import metrics
 
-def create_docx(documented_code: str, filename: str, original_filename: str) -> BytesIO:
+# Versión de las plantillas de exportación: cambiarla invalida los documentos en caché
+EXPORT_TEMPLATE_VERSION = 6
+
+# Tamaño máximo en memoria de un PDF antes de pasarlo a un archivo temporal en disco
+PDF_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+def split_code_into_pages(lines: list, lines_per_page: int):
     """
-    Genera un documento DOCX con el código documentado.
+    Divide las líneas de código en bloques de a lo sumo una página.
+    """
+    for start in range(0, len(lines), lines_per_page):
+        yield '\n'.join(lines[start:start + lines_per_page])
+
+# === SECCIONES POR FUNCIÓN ===
+
+UNIT_KIND_LABELS = {
+    'function': 'Función',
+    'method': 'Método',
+    'class': 'Clase'
+}
+
+def unit_title(unit: dict) -> str:
+    """Nombre de la unidad para índices y encabezados, con su clase si es un método."""
+    name = f"{unit['parent']}.{unit['name']}" if unit['parent'] else unit['name']
+    return f"{UNIT_KIND_LABELS[unit['kind']]} {name}"
+
+def unit_lines_label(unit: dict) -> str:
+    return f"líneas {unit['start_line']}-{unit['end_line']}"
+
+# === PLANTILLA DOCX ===
+
+# Líneas de código por párrafo al llenar la plantilla
+DOCX_LINES_PER_PARAGRAPH = 200
+
+# Marcadores de la portada que se reemplazan en cada exportación
+DOCX_FILENAME_MARKER = '{archivo}'
+DOCX_DATE_MARKER = '{fecha}'
+
+# Colores del resaltado por línea
+DOCX_COMMENT_COLOR = RGBColor(0, 128, 0)
+DOCX_CODE_COLOR = RGBColor(30, 30, 30)
+
+# Elementos que CT_PPr admite después de <w:shd>; el esquema exige este orden dentro de <w:pPr>
+PPR_SUCCESSORS_OF_SHD = (
+    'w:tabs', 'w:suppressAutoHyphens', 'w:kinsoku', 'w:wordWrap', 'w:overflowPunct',
+    'w:topLinePunct', 'w:autoSpaceDE', 'w:autoSpaceDN', 'w:bidi', 'w:adjustRightInd',
+    'w:snapToGrid', 'w:spacing', 'w:ind', 'w:contextualSpacing', 'w:mirrorIndents',
+    'w:suppressOverlap', 'w:jc', 'w:textDirection', 'w:textAlignment', 'w:textboxTightWrap',
+    'w:outlineLvl', 'w:divId', 'w:cnfStyle', 'w:rPr', 'w:sectPr', 'w:pPrChange'
+)
+
+# (plantilla serializada, posición en doc.paragraphs de los párrafos que completa render_docx)
+_docx_template = None
+
+def _build_docx_template() -> tuple:
+    """
+    Construye una sola vez el documento base: estilos, portada, encabezado y pie.
+    Retorna la plantilla serializada y la posición de los párrafos que render_docx
+    completa (nombre y fecha de la portada) o usa de ancla (encabezado y fin del código).
     """
     doc = Document()
     
@@ -23,6 +87,18 @@ def create_docx(documented_code: str, filename: str, original_filename: str) ->
     font.name = 'Consolas'
     font.size = Pt(10)
     
+    # Estilo de párrafo para los bloques de código, con fondo gris claro
+    code_style = doc.styles.add_style('Code Block', WD_STYLE_TYPE.PARAGRAPH)
+    code_style.base_style = style
+    code_style.font.name = 'Consolas'
+    code_style.font.size = Pt(9)
+    code_style.paragraph_format.space_after = Pt(0)
+    shading = OxmlElement('w:shd')
+    shading.set(qn('w:val'), 'clear')
+    shading.set(qn('w:color'), 'auto')
+    shading.set(qn('w:fill'), 'F2F2F2')
+    code_style.element.get_or_add_pPr().insert_element_before(shading, *PPR_SUCCESSORS_OF_SHD)
+    
     # === PORTADA ===
     title = doc.add_heading('Documentación de Código', 0)
     title.alignment = WD_ALIGN_PARAGRAPH.CENTER
@@ -33,14 +109,14 @@ def create_docx(documented_code: str, filename: str, original_filename: str) ->
     doc.add_paragraph()
     info_para = doc.add_paragraph()
     info_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    info_run = info_para.add_run(f'Archivo: {original_filename}')
+    info_run = info_para.add_run(f'Archivo: {DOCX_FILENAME_MARKER}')
     info_run.font.size = Pt(14)
     info_run.bold = True
     
     # Fecha de generación
     date_para = doc.add_paragraph()
     date_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    date_run = date_para.add_run(f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M")}')
+    date_run = date_para.add_run(f'Generado: {DOCX_DATE_MARKER}')
     date_run.font.size = Pt(10)
     date_run.font.color.rgb = RGBColor(128, 128, 128)
     
@@ -51,16 +127,8 @@ def create_docx(documented_code: str, filename: str, original_filename: str) ->
     heading_run = heading.runs[0]
     heading_run.font.color.rgb = RGBColor(234, 88, 12)  # Naranja
     
-    # Agregar el código en un bloque
-    code_para = doc.add_paragraph()
-    code_run = code_para.add_run(documented_code)
-    code_run.font.name = 'Consolas'
-    code_run.font.size = Pt(9)
-    
-    # Establecer fondo gris claro para el código
-    shading_elm = code_para._element.get_or_add_pPr()
-    
-    doc.add_page_break()
+    # El código se inserta antes de este salto de página
+    code_end = doc.add_page_break()
     
     # === FOOTER ===
     footer_para = doc.add_paragraph()
@@ -73,19 +141,173 @@ def create_docx(documented_code: str, filename: str, original_filename: str) ->
     footer_run.font.size = Pt(8)
     footer_run.font.color.rgb = RGBColor(128, 128, 128)
     
+    # La plantilla se guarda serializada: de cada párrafo se conserva su posición
+    paragraph_elements = [paragraph._p for paragraph in doc.paragraphs]
+    anchors = {
+        name: paragraph_elements.index(paragraph._p)
+        for name, paragraph in (('filename', info_para), ('date', date_para), ('code_heading', heading), ('code_end', code_end))
+    }
+    
+    template_stream = BytesIO()
+    doc.save(template_stream)
+    return template_stream.getvalue(), anchors
+
+def _docx_template_parts() -> tuple:
+    global _docx_template
+    if _docx_template is None:
+        _docx_template = _build_docx_template()
+    return _docx_template
+
+def get_docx_template() -> bytes:
+    """
+    Retorna la plantilla DOCX serializada, construyéndola la primera vez.
+    """
+    return _docx_template_parts()[0]
+
+def classify_code_lines(lines: list, filename: str) -> list:
+    """
+    Marca cada línea como 'comment' o 'code' en una sola pasada.
+    Reconoce comentarios de línea y bloques (docstrings de Python o /* */).
+    """
+    is_python = filename.lower().endswith('.py')
+    line_markers = ('#',) if is_python else ('//', '#')
+    kinds = []
+    block_end = None
+    
+    for line in lines:
+        stripped = line.strip()
+        
+        if block_end is not None:
+            kinds.append('comment')
+            if block_end in stripped:
+                block_end = None
+            continue
+        
+        if is_python and stripped[:3] in ('"""', "'''"):
+            delimiter = stripped[:3]
+            kinds.append('comment')
+            if stripped.count(delimiter) == 1:
+                block_end = delimiter
+        elif not is_python and stripped.startswith('/*'):
+            kinds.append('comment')
+            if '*/' not in stripped:
+                block_end = '*/'
+        elif stripped.startswith(line_markers):
+            kinds.append('comment')
+        else:
+            kinds.append('code')
+    
+    return kinds
+
+def _add_code_paragraph(anchor, lines: list, kinds: list = None):
+    """
+    Inserta un párrafo de código antes de 'anchor'. Sin resaltado es un único run;
+    con resaltado, un run por grupo de líneas consecutivas del mismo tipo.
+    """
+    if kinds is None:
+        return anchor.insert_paragraph_before('\n'.join(lines), style='Code Block')
+    
+    paragraph = anchor.insert_paragraph_before(style='Code Block')
+    position = 0
+    for kind, group in groupby(kinds):
+        count = len(list(group))
+        text = '\n'.join(lines[position:position + count])
+        position += count
+        if position < len(lines):
+            text += '\n'
+        run = paragraph.add_run(text)
+        run.font.color.rgb = DOCX_COMMENT_COLOR if kind == 'comment' else DOCX_CODE_COLOR
+        run.italic = kind == 'comment'
+    return paragraph
+
+def _insert_styled_paragraph(anchor, text: str, style_id: str):
+    """
+    Inserta un párrafo antes de 'anchor' asignando el estilo por id. Asignarlo por
+    nombre hace que python-docx recorra todos los estilos en cada párrafo.
+    """
+    paragraph = anchor.insert_paragraph_before(text)
+    paragraph._p.get_or_add_pPr().style = style_id
+    return paragraph
+
+def create_docx(documented_code: str, filename: str, original_filename: str, highlight: bool = False) -> BytesIO:
+    """
+    Genera un documento DOCX con el código documentado.
+    """
+    return render_docx(build_document(documented_code, original_filename), highlight)
+
+def render_docx(document: dict, highlight: bool = False) -> BytesIO:
+    """
+    Genera el DOCX de un documento ya construido a partir de la plantilla precargada.
+    Con highlight=True los comentarios y docstrings se resaltan por línea.
+    """
+    with metrics.stage('docx_template'):
+        template, anchors = _docx_template_parts()
+        doc = Document(BytesIO(template))
+    
+    # Los párrafos de la plantilla se toman antes de insertar: después cambian de posición
+    paragraphs = doc.paragraphs
+    code_heading = paragraphs[anchors['code_heading']]
+    anchor = paragraphs[anchors['code_end']]
+    
+    # Completar la portada
+    for name, marker, value in (('filename', DOCX_FILENAME_MARKER, document['filename']),
+                                ('date', DOCX_DATE_MARKER, document['generated_at'])):
+        for run in paragraphs[anchors[name]].runs:
+            run.text = run.text.replace(marker, value)
+    
+    units = document['units']
+    style_ids = {name: doc.styles[name].style_id for name in ('Heading 1', 'Heading 2', 'List Bullet', 'Code Block')}
+    
+    # Índice de funciones y clases antes del encabezado del código
+    if units:
+        with metrics.stage('docx_units'):
+            _insert_styled_paragraph(code_heading, 'Índice', style_ids['Heading 1'])
+            for unit in units:
+                entry = _insert_styled_paragraph(code_heading, None, style_ids['List Bullet'])
+                entry.add_run(unit_title(unit)).bold = True
+                entry.add_run(f"  ({unit_lines_label(unit)})")
+    
+    # Agregar el código en bloques de párrafos antes del salto de página final
+    lines = document['lines']
+    with metrics.stage('docx_code'):
+        kinds = classify_code_lines(lines, document['filename']) if highlight else None
+        
+        for start in range(0, len(lines), DOCX_LINES_PER_PARAGRAPH):
+            end = start + DOCX_LINES_PER_PARAGRAPH
+            _add_code_paragraph(anchor, lines[start:end], kinds[start:end] if kinds else None)
+    
+    # Una sección por unidad: firma, ubicación y documentación
+    if units:
+        with metrics.stage('docx_units'):
+            _insert_styled_paragraph(anchor, 'Funciones y clases', style_ids['Heading 1'])
+            for unit in units:
+                _insert_styled_paragraph(anchor, unit_title(unit), style_ids['Heading 2'])
+                _insert_styled_paragraph(anchor, unit['signature'], style_ids['Code Block'])
+                anchor.insert_paragraph_before(unit_lines_label(unit).capitalize())
+                anchor.insert_paragraph_before(unit['docstring'] or 'Sin documentación.')
+    
     # Guardar en BytesIO
-    file_stream = BytesIO()
-    doc.save(file_stream)
-    file_stream.seek(0)
+    with metrics.stage('docx_save'):
+        file_stream = BytesIO()
+        doc.save(file_stream)
+        file_stream.seek(0)
     
     return file_stream
 
-def create_pdf_simple(documented_code: str, filename: str, original_filename: str) -> BytesIO:
+def create_pdf_simple(documented_code: str, filename: str, original_filename: str, output=None):
     """
     Genera un PDF usando reportlab.
     """
+    return render_pdf(build_document(documented_code, original_filename), output)
+
+def render_pdf(document: dict, output=None):
+    """
+    Genera el PDF de un documento ya construido.
+    El código se divide en un bloque por página y el resultado se escribe en
+    un archivo temporal que pasa a disco al superar PDF_SPOOL_MAX_MEMORY.
+    """
     try:
-        buffer = BytesIO()
+        buffer = output if output is not None else SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_MEMORY)
         doc = SimpleDocTemplate(buffer, pagesize=A4, 
                               rightMargin=72, leftMargin=72,
                               topMargin=72, bottomMargin=18)
@@ -121,7 +343,7 @@ def create_pdf_simple(documented_code: str, filename: str, original_filename: st
             fontSize=8,
             leftIndent=20,
             fontName='Courier',
-            spaceAfter=12
+            spaceAfter=0
         )
         
         # Contenido del PDF
@@ -132,21 +354,42 @@ def create_pdf_simple(documented_code: str, filename: str, original_filename: st
         story.append(Spacer(1, 12))
         
         # Información del archivo
-        story.append(Paragraph(f"<b>Archivo:</b> {original_filename}", subtitle_style))
-        story.append(Paragraph(f"<b>Generado:</b> {datetime.now().strftime('%d/%m/%Y %H:%M')}", subtitle_style))
+        story.append(Paragraph(f"<b>Archivo:</b> {document['filename']}", subtitle_style))
+        story.append(Paragraph(f"<b>Generado:</b> {document['generated_at']}", subtitle_style))
         story.append(Spacer(1, 30))
         
+        units = document['units']
+        
+        # Índice de funciones y clases
+        if units:
+            story.append(Paragraph("<b>Índice</b>", styles['Heading2']))
+            for unit in units:
+                story.append(Paragraph(
+                    f"<b>{escape(unit_title(unit))}</b> ({unit_lines_label(unit)})", styles['Normal']
+                ))
+            story.append(Spacer(1, 20))
+        
         # Sección de código
         story.append(Paragraph("<b>Código Documentado</b>", styles['Heading2']))
         story.append(Spacer(1, 12))
         
-        # Agregar código en bloques (para evitar problemas con código muy largo)
-        code_lines = documented_code.split('\n')
-        code_text = '<br/>'.join([line.replace('<', '&lt;').replace('>', '&gt;') for line in code_lines])
+        # Un Preformatted por página: reportlab no tiene que partir un único bloque gigante
+        # en cada salto de página, lo que hace la maquetación lineal en el tamaño del archivo
+        lines_per_page = max(1, int((doc.height - 12) // code_style.leading))
+        for page_code in split_code_into_pages(document['lines'], lines_per_page):
+            story.append(Preformatted(page_code, code_style))
+        story.append(Spacer(1, 42))
         
-        # Usar Preformatted para el código
-        story.append(Preformatted(documented_code, code_style))
-        story.append(Spacer(1, 30))
+        # Una sección por unidad: firma, ubicación y documentación
+        if units:
+            story.append(Paragraph("<b>Funciones y clases</b>", styles['Heading2']))
+            for unit in units:
+                story.append(Paragraph(escape(unit_title(unit)), styles['Heading3']))
+                story.append(Preformatted(unit['signature'], code_style))
+                story.append(Paragraph(unit_lines_label(unit).capitalize(), styles['Normal']))
+                docstring = escape(unit['docstring']).replace('\n', '<br/>') or 'Sin documentación.'
+                story.append(Paragraph(docstring, styles['Normal']))
+                story.append(Spacer(1, 8))
         
         # Footer
         footer_style = ParagraphStyle(
@@ -165,8 +408,9 @@ def create_pdf_simple(documented_code: str, filename: str, original_filename: st
             footer_style
         ))
         
-        # Construir PDF
-        doc.build(story)
+        # Construir PDF (maquetación y escritura)
+        with metrics.stage('pdf_build'):
+            doc.build(story)
         buffer.seek(0)
         
         return buffer
@@ -179,22 +423,53 @@ def create_markdown_document(documented_code: str, filename: str, original_filen
     """
     Genera un documento Markdown formateado.
     """
+    return render_markdown(build_document(documented_code, original_filename))
+
+def render_markdown(document: dict) -> str:
+    """
+    Genera el Markdown de un documento ya construido.
+    """
+    with metrics.stage('markdown_render'):
+        return _render_markdown(document)
+
+def _render_markdown(document: dict) -> str:
+    units = document['units']
+    index = ''
+    sections = ''
+    
+    if units:
+        entries = [
+            f"- [{unit_title(unit)}](#unidad-{position}) ({unit_lines_label(unit)})"
+            for position, unit in enumerate(units, 1)
+        ]
+        index = "## Índice\n\n" + '\n'.join(entries) + "\n\n---\n\n"
+        
+        parts = ["## Funciones y clases\n"]
+        for position, unit in enumerate(units, 1):
+            parts.append(
+                f'<a id="unidad-{position}"></a>\n\n### {unit_title(unit)}\n\n'
+                f"```{document['language']}\n{unit['signature']}\n```\n\n"
+                f"*{unit_lines_label(unit).capitalize()}*\n\n"
+                f"{unit['docstring'] or 'Sin documentación.'}\n"
+            )
+        sections = '\n'.join(parts) + "\n---\n\n"
+    
     markdown_content = f"""# Documentación de Código
 
-**Archivo:** {original_filename}  
-**Generado:** {datetime.now().strftime("%d/%m/%Y %H:%M")}
+**Archivo:** {document['filename']}  
+**Generado:** {document['generated_at']}
 
 ---
 
-## Código Documentado
+{index}## Código Documentado
 
-```python
-{documented_code}
+```{document['language']}
+{document['code']}
 ```
 
 ---
 
-*Documentación generada automáticamente por Code Doc Generator*  
+{sections}*Documentación generada automáticamente por Code Doc Generator*  
 *Universidad Mayor Real y Pontificia de San Francisco Xavier de Chuquisaca*  
 *Proyecto de Taller de Especialidad - SHC131*
 """
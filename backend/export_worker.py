@@ -0,0 +1,167 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from export_documents import (
+    render_docx, render_pdf, render_markdown, get_docx_template, EXPORT_TEMPLATE_VERSION
+)
+import metrics
+
+EXPORT_FORMATS = {
+    'docx': ('.docx', "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    'pdf': ('.pdf', "application/pdf"),
+    'markdown': ('.md', "text/markdown")
+}
+
+class ExportQueueFull(Exception):
+    """La cola de exportaciones alcanzó su límite."""
+
+class ExportCancelled(Exception):
+    """El cliente se desconectó antes de que terminara la exportación."""
+
+def preload_templates():
+    """Construye las plantillas al iniciar cada proceso del pool, no en la primera exportación."""
+    get_docx_template()
+
+def render_export(export_format: str, document: dict, directory: str = None, highlight: bool = False) -> tuple:
+    """
+    Genera el documento (ver document_model.build_document) en un archivo temporal
+    dentro de 'directory' (se ejecuta en un proceso del pool).
+    Retorna la ruta del archivo, los segundos de renderizado y la duración de cada
+    etapa (se registran en el proceso principal, ver ExportPool.run).
+    """
+    start = time.perf_counter()
+    extension = EXPORT_FORMATS[export_format][0]
+    fd, path = tempfile.mkstemp(prefix='export_', suffix=extension, dir=directory)
+
+    try:
+        with metrics.capture_stages() as trace, os.fdopen(fd, 'wb') as output:
+            if export_format == 'docx':
+                output.write(render_docx(document, highlight=highlight).getvalue())
+            elif export_format == 'pdf':
+                render_pdf(document, output=output)
+            else:
+                output.write(render_markdown(document).encode('utf-8'))
+    except Exception:
+        os.remove(path)
+        raise
+
+    return path, time.perf_counter() - start, trace['stages']
+
+def _remove_result_file(future):
+    # Resultado de una exportación que ya nadie va a descargar
+    if not future.cancelled() and future.exception() is None:
+        path = future.result()[0]
+        if os.path.exists(path):
+            os.remove(path)
+
+class ExportMetrics:
+    """Latencias y contadores de exportación por formato."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._formats = {}
+
+    def record(self, export_format: str, outcome: str, total_seconds: float = 0.0, render_seconds: float = 0.0):
+        with self._lock:
+            data = self._formats.setdefault(export_format, {
+                'completed': 0, 'failed': 0, 'cancelled': 0, 'rejected': 0,
+                'total_seconds': 0.0, 'render_seconds': 0.0, 'max_seconds': 0.0
+            })
+            data[outcome] += 1
+            if outcome == 'completed':
+                data['total_seconds'] += total_seconds
+                data['render_seconds'] += render_seconds
+                data['max_seconds'] = max(data['max_seconds'], total_seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            result = {}
+            for export_format, data in self._formats.items():
+                completed = data['completed']
+                result[export_format] = {
+                    'completed': completed,
+                    'failed': data['failed'],
+                    'cancelled': data['cancelled'],
+                    'rejected': data['rejected'],
+                    'avg_seconds': round(data['total_seconds'] / completed, 4) if completed else 0,
+                    'avg_render_seconds': round(data['render_seconds'] / completed, 4) if completed else 0,
+                    'avg_queue_seconds': round((data['total_seconds'] - data['render_seconds']) / completed, 4) if completed else 0,
+                    'max_seconds': round(data['max_seconds'], 4)
+                }
+            return result
+
+class ExportPool:
+    """
+    Ejecuta las exportaciones (CPU intensivas) en un pool de procesos, fuera
+    del event loop, con un máximo de trabajos pendientes.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 8, poll_interval: float = 0.25):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.metrics = ExportMetrics()
+        self._executor = None
+        self._pending = 0
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=preload_templates)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def pending(self) -> int:
+        """Exportaciones en curso o en cola (solo se modifica desde el event loop)."""
+        return self._pending
+
+    async def run(self, export_format: str, document: dict,
+                  is_disconnected=None, directory: str = None, highlight: bool = False) -> str:
+        """
+        Encola la exportación y espera su resultado. Retorna la ruta del archivo generado.
+        Si is_disconnected (corutina) indica que el cliente se fue, cancela el trabajo.
+        """
+        if self._pending >= self.max_pending:
+            self.metrics.record(export_format, 'rejected')
+            raise ExportQueueFull()
+
+        self.start()
+        self._pending += 1
+        start = time.perf_counter()
+        future = self._executor.submit(
+            render_export, export_format, document, directory, highlight
+        )
+        waiter = asyncio.wrap_future(future)
+
+        try:
+            while not waiter.done():
+                await asyncio.wait({waiter}, timeout=self.poll_interval)
+                if not waiter.done() and is_disconnected is not None and await is_disconnected():
+                    # Cancela el trabajo si sigue en cola; si ya empezó, el archivo se
+                    # descarta cuando termine
+                    future.add_done_callback(_remove_result_file)
+                    waiter.cancel()
+                    self.metrics.record(export_format, 'cancelled')
+                    raise ExportCancelled()
+
+            try:
+                path, render_seconds, stages = waiter.result()
+            except Exception:
+                self.metrics.record(export_format, 'failed')
+                raise
+
+            total_seconds = time.perf_counter() - start
+            self.metrics.record(export_format, 'completed', total_seconds, render_seconds)
+            metrics.record_stage('export_queue_wait', total_seconds - render_seconds, format=export_format)
+            metrics.record_stage('export_render', render_seconds, format=export_format)
+            for name, seconds in stages.items():
+                metrics.record_stage(name, seconds, format=export_format)
+            return path
+        finally:
+            self._pending -= 1
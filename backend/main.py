@@ -1,8 +1,10 @@
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import FileResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr
-from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy import create_engine, Column, Integer, String, Text, func, inspect, text, or_
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from passlib.context import CryptContext
@@ -14,9 +16,28 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import secrets
-import re
-from ai_model import generate_documentation_suggestions, regenerate_documentation, generate_final_document
-from export_documents import create_docx, create_pdf_simple, create_markdown_document
+import math
+import json
+import asyncio
+import tempfile
+import zipfile
+from starlette.background import BackgroundTask
+from ai_model import (
+    generate_documentation_suggestions, regenerate_documentation, generate_final_document,
+    model_queue, generation_flights
+)
+from export_worker import ExportPool, ExportQueueFull, ExportCancelled, EXPORT_FORMATS, EXPORT_TEMPLATE_VERSION, render_export
+from export_cache import ExportCache
+from document_model import build_document
+from code_analysis import detect_language, analyze_code
+from code_parser import parse_cache
+from token_cache import TokenCache, RevocationList
+from scheduler import RateLimiter
+from n8n_client import N8NClient, N8NError
+from compression import RequestDecompressionMiddleware, ResponseCompressionMiddleware
+import metrics
+from metrics import MetricsMiddleware
+from profiler import ProfilingMiddleware, ProfileStore, is_profiling
 
 # Cargar variables de entorno
 load_dotenv()
@@ -26,6 +47,11 @@ SECRET_KEY = os.getenv("SECRET_KEY", "tu_clave_secreta_super_segura_cambiala")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 RESET_TOKEN_EXPIRE_MINUTES = 30
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 1024))
+
+# Límite de generaciones con IA por usuario/IP (ráfaga y recarga por minuto)
+GENERATION_RATE_BURST = float(os.getenv("GENERATION_RATE_BURST", 3))
+GENERATION_RATE_PER_MINUTE = float(os.getenv("GENERATION_RATE_PER_MINUTE", 6))
 
 # Configuración de Email
 SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
@@ -34,6 +60,39 @@ SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
 
+# Configuración de n8n
+N8N_WEBHOOK_URL = os.getenv("N8N_WEBHOOK_URL", "http://localhost:5678/webhook-test/export-document")
+N8N_TIMEOUT = float(os.getenv("N8N_TIMEOUT", 10))
+N8N_MAX_RETRIES = int(os.getenv("N8N_MAX_RETRIES", 3))
+N8N_OUTBOX_RETRY_SECONDS = 30
+# Intentos de entrega de un payload en segundo plano antes de marcarlo como fallido
+N8N_OUTBOX_MAX_ATTEMPTS = int(os.getenv("N8N_OUTBOX_MAX_ATTEMPTS", 10))
+
+# Exportación: procesos del pool y máximo de exportaciones en espera
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", 2))
+EXPORT_MAX_PENDING = int(os.getenv("EXPORT_MAX_PENDING", 8))
+
+# Caché en disco de documentos exportados
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", "./export_cache")
+EXPORT_CACHE_MAX_MB = int(os.getenv("EXPORT_CACHE_MAX_MB", 256))
+
+# Transporte: tamaño máximo de un cuerpo descomprimido y mínimo para comprimir respuestas
+MAX_REQUEST_MB = int(os.getenv("MAX_REQUEST_MB", 50))
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+
+# Sesiones de documento: el código queda en el servidor entre pasos durante este tiempo
+DOCUMENT_SESSION_TTL_MINUTES = int(os.getenv("DOCUMENT_SESSION_TTL_MINUTES", 120))
+DOCUMENT_SESSION_PURGE_SECONDS = 300
+
+# Métricas: si METRICS_TOKEN está definido, /metrics exige "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Perfiles por solicitud (X-Profile: 1 o ?profile=1 con token de admin): directorio, retención e intervalo de muestreo
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_MAX_COUNT = int(os.getenv("PROFILE_MAX_COUNT", 20))
+PROFILE_RETENTION_HOURS = float(os.getenv("PROFILE_RETENTION_HOURS", 24))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+
 # Base de datos SQLite
 SQLALCHEMY_DATABASE_URL = "sqlite:///./code_doc_gen.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
@@ -51,23 +110,78 @@ class User(Base):
     reset_token = Column(String, nullable=True)
     reset_token_expires = Column(String, nullable=True)
 
+# Tokens JWT revocados (logout) hasta que expiran
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    
+    jti = Column(String, primary_key=True)
+    expires_at = Column(Integer)
+
+# Payloads de n8n pendientes de entrega (modo en segundo plano)
+class PendingWebhook(Base):
+    __tablename__ = "pending_webhooks"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    payload = Column(Text)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(Integer, default=0, index=True)
+    last_error = Column(String, nullable=True)
+    idempotency_key = Column(String, nullable=True)  # el mismo en cada intento de entrega
+    failed_at = Column(Integer, nullable=True, index=True)  # no se reintenta más; queda para revisión
+
+# Código original y documentado de un archivo, compartido por los pasos del flujo
+class DocumentSession(Base):
+    __tablename__ = "document_sessions"
+    
+    id = Column(String, primary_key=True)
+    filename = Column(String)
+    language = Column(String)
+    original_code = Column(Text)
+    documented_code = Column(Text, nullable=True)
+    statistics = Column(Text, nullable=True)
+    expires_at = Column(Integer, index=True)
+    owner = Column(String, nullable=True)  # usuario del token que la creó; None si fue anónima
+
 # Crear tablas
 Base.metadata.create_all(bind=engine)
 
+# Columnas agregadas después de que las tablas existían: create_all no las crea
+for table, column, column_type in (
+    ('document_sessions', 'owner', 'VARCHAR'),
+    ('pending_webhooks', 'idempotency_key', 'VARCHAR'),
+    ('pending_webhooks', 'failed_at', 'INTEGER')
+):
+    if column not in {existing['name'] for existing in inspect(engine).get_columns(table)}:
+        with engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+
 # Configuración de encriptación
 pwd_context = CryptContext(schemes=["pbkdf2_sha256", "bcrypt"], deprecated="auto")
 
+# Verificación de tokens: claims ya validados y tokens revocados
+bearer_scheme = HTTPBearer(auto_error=False)
+token_cache = TokenCache(max_size=TOKEN_CACHE_SIZE)
+revoked_tokens = RevocationList()
+
 # FastAPI app
 app = FastAPI(title="Code Documentation Generator API")
 
-# CORS para desarrollo
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000", "http://localhost:5173"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@app.on_event("startup")
+def load_revoked_tokens():
+    """Cargar en memoria los tokens revocados que aún no expiraron"""
+    db = SessionLocal()
+    try:
+        now = int(datetime.utcnow().timestamp())
+        db.query(RevokedToken).filter(RevokedToken.expires_at <= now).delete()
+        db.commit()
+        revoked_tokens.load((row.jti, row.expires_at) for row in db.query(RevokedToken).all())
+    finally:
+        db.close()
+
+# Compresión gzip/brotli de solicitudes y respuestas
+app.add_middleware(ResponseCompressionMiddleware, minimum_size=COMPRESSION_MIN_BYTES)
+app.add_middleware(RequestDecompressionMiddleware, max_size=MAX_REQUEST_MB * 1024 * 1024)
+metrics.configure_logging()
 
 # Schemas Pydantic
 class UserCreate(BaseModel):
@@ -102,26 +216,50 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class UserPage(BaseModel):
+    users: list[UserResponse]
+    next_cursor: int | None = None  # id del último usuario de la página, None si no hay más
+    total_estimate: int
+
+# En los pasos siguientes a la subida, el código puede enviarse completo o
+# tomarse de la sesión de documento que creó el servidor (session_id)
 class DocumentationRequest(BaseModel):
-    code: str
+    code: str = None
+    session_id: str = None
     filename: str
     language: str = 'python'  # Agregar lenguaje
 
 class RegenerateRequest(BaseModel):
-    code: str
+    code: str = None
+    session_id: str = None
     language: str = 'python'  # Agregar lenguaje
     feedback: str = None
 
 class AcceptDocumentationRequest(BaseModel):
-    documented_code: str
+    documented_code: str = None
+    session_id: str = None
     filename: str
     language: str = 'python'  # Agregar lenguaje
 
-class ExportRequest(BaseModel):
+class SessionUpdateRequest(BaseModel):
     documented_code: str
+
+class ExportRequest(BaseModel):
+    documented_code: str = None
+    session_id: str = None
     filename: str
     format: str  # 'docx', 'pdf', 'markdown'
     user_email: str = None # Email del usuario
+    highlight: bool = False  # Resaltar comentarios y docstrings (solo DOCX)
+    language: str = None  # Si no se indica, se deduce de la extensión
+
+class BundleExportRequest(BaseModel):
+    documented_code: str = None
+    session_id: str = None
+    filename: str
+    formats: list[str] = ['markdown', 'docx', 'pdf']
+    language: str = None
+    highlight: bool = False
 
 # Dependencias
 def get_db():
@@ -141,13 +279,69 @@ def get_password_hash(password):
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(16)})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 def create_reset_token():
     return secrets.token_urlsafe(32)
 
+def get_token_claims(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> dict:
+    """Verificar el token Bearer y retornar sus claims"""
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="No autenticado", headers={"WWW-Authenticate": "Bearer"})
+    
+    token = credentials.credentials
+    
+    # Un token ya verificado solo cuesta una búsqueda en la caché
+    claims = token_cache.get(token)
+    metrics.inc('code_doc_cache_requests_total', cache='token', result='hit' if claims is not None else 'miss')
+    if claims is None:
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=401, detail="Token inválido o expirado", headers={"WWW-Authenticate": "Bearer"})
+        token_cache.put(token, claims)
+    
+    if claims.get("jti") in revoked_tokens:
+        raise HTTPException(status_code=401, detail="Token revocado", headers={"WWW-Authenticate": "Bearer"})
+    
+    return claims
+
+def require_admin(claims: dict = Depends(get_token_claims)) -> dict:
+    """Permitir el acceso solo a tokens emitidos por el login de administrador"""
+    if claims.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Se requieren permisos de administrador")
+    return claims
+
+def is_admin_token(token: str) -> bool:
+    """True si el token es un token de administrador válido y no revocado"""
+    if not token:
+        return False
+    try:
+        claims = get_token_claims(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+    except HTTPException:
+        return False
+    return claims.get("role") == "admin"
+
+# Perfilado opcional de cualquier solicitud por un administrador
+profile_store = ProfileStore(PROFILE_DIR, max_count=PROFILE_MAX_COUNT, max_age_seconds=PROFILE_RETENTION_HOURS * 3600)
+app.add_middleware(
+    ProfilingMiddleware, store=profile_store, authorize=is_admin_token, interval=PROFILE_INTERVAL_MS / 1000
+)
+
+# Latencia por ruta y etapas de cada solicitud (mide también la compresión y el perfilado)
+app.add_middleware(MetricsMiddleware)
+
+# CORS para desarrollo (el más externo: también los 403, 413 y preflights llevan sus encabezados)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["http://localhost:3000", "http://localhost:5173"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
 def send_email(to_email: str, subject: str, body: str):
     """Enviar email usando Gmail SMTP"""
     try:
@@ -219,6 +413,17 @@ def login(credentials: UserLogin, db: Session = Depends(get_db)):
         "username": user.username
     }
 
+@app.post("/api/logout")
+def logout(claims: dict = Depends(get_token_claims), db: Session = Depends(get_db)):
+    """Revocar el token actual hasta su expiración"""
+    jti = claims.get("jti")
+    if jti:
+        db.merge(RevokedToken(jti=jti, expires_at=int(claims["exp"])))
+        db.commit()
+        revoked_tokens.add(jti, claims["exp"])
+    
+    return {"message": "Sesión cerrada"}
+
 @app.post("/api/password-reset-request")
 def password_reset_request(request: PasswordResetRequest, db: Session = Depends(get_db)):
     """Solicitar recuperación de contraseña"""
@@ -328,13 +533,46 @@ def admin_login(credentials: AdminLogin):
         "username": "admin"
     }
 
-@app.get("/api/admin/users", response_model=list[UserResponse])
-def get_all_users(db: Session = Depends(get_db)):
-    """Obtener todos los usuarios (solo admin)"""
-    users = db.query(User).all()
-    return users
+ADMIN_USERS_PAGE_SIZE = 50
+ADMIN_USERS_MAX_PAGE_SIZE = 200
+
+def prefix_filter(column, prefix: str):
+    """Filtro por prefijo como rango, para que SQLite use el índice de la columna"""
+    return (column >= prefix) & (column < prefix + '\U0010ffff')
+
+@app.get("/api/admin/users", response_model=UserPage, dependencies=[Depends(require_admin)])
+def get_all_users(
+    after_id: int = 0,
+    limit: int = ADMIN_USERS_PAGE_SIZE,
+    search: str = None,
+    db: Session = Depends(get_db)
+):
+    """Listar usuarios paginados por cursor (solo admin)"""
+    limit = max(1, min(limit, ADMIN_USERS_MAX_PAGE_SIZE))
+    
+    # Solo las columnas que se muestran, nunca hashed_password
+    query = db.query(User.id, User.username, User.email)
+    
+    if search:
+        query = query.filter(
+            prefix_filter(User.username, search) | prefix_filter(User.email, search)
+        )
+    
+    # Pedimos una fila extra para saber si existe una página siguiente
+    rows = query.filter(User.id > after_id).order_by(User.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    # MAX(id) se resuelve con la clave primaria, sin recorrer la tabla como COUNT(*)
+    total_estimate = db.query(func.max(User.id)).scalar() or 0
+    
+    return {
+        "users": [row._asdict() for row in rows],
+        "next_cursor": rows[-1].id if has_more else None,
+        "total_estimate": total_estimate
+    }
 
-@app.delete("/api/admin/users/{user_id}")
+@app.delete("/api/admin/users/{user_id}", dependencies=[Depends(require_admin)])
 def delete_user(user_id: int, db: Session = Depends(get_db)):
     """Eliminar un usuario por ID (solo admin)"""
     user = db.query(User).filter(User.id == user_id).first()
@@ -348,101 +586,152 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
     
     return {"message": f"Usuario '{username}' eliminado exitosamente"}
 
-# === ANÁLISIS DE CÓDIGO ===
-
-LANGUAGE_PATTERNS = {
-    'python': {
-        'extensions': ['.py'],
-        'function_pattern': r'def\s+\w+\s*\([^)]*\)\s*:',
-        'class_pattern': r'class\s+\w+\s*[\(:]',
-        'docstring_pattern': r'("""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\')',
-        'comment_pattern': r'#.*$'
-    },
-    'javascript': {
-        'extensions': ['.js', '.jsx', '.ts', '.tsx'],
-        'function_pattern': r'(function\s+\w+\s*\([^)]*\)|(?:const|let|var)\s+\w+\s*=\s*(?:async\s*)?\([^)]*\)\s*=>|\w+\s*\([^)]*\)\s*{)',
-        'class_pattern': r'class\s+\w+\s*{',
-        'docstring_pattern': r'/\*\*[\s\S]*?\*/',
-        'comment_pattern': r'//.*$|/\*[\s\S]*?\*/'
-    },
-    'java': {
-        'extensions': ['.java'],
-        'function_pattern': r'(?:public|private|protected)?\s*(?:static\s+)?[\w<>\[\]]+\s+\w+\s*\([^)]*\)\s*{',
-        'class_pattern': r'(?:public|private)?\s*class\s+\w+',
-        'docstring_pattern': r'/\*\*[\s\S]*?\*/',
-        'comment_pattern': r'//.*$|/\*[\s\S]*?\*/'
-    },
-    'php': {
-        'extensions': ['.php'],
-        'function_pattern': r'function\s+\w+\s*\([^)]*\)\s*{',
-        'class_pattern': r'class\s+\w+\s*{',
-        'docstring_pattern': r'/\*\*[\s\S]*?\*/',
-        'comment_pattern': r'//.*$|/\*[\s\S]*?\*/'
-    },
-     'go': {
-        'extensions': ['.go'],
-        'function_pattern': r'func\s+(?:\(\w+\s+\*?\w+\)\s+)?\w+\s*\([^)]*\)',
-        'class_pattern': r'type\s+\w+\s+struct',
-        'docstring_pattern': r'//.*\n(?://.*\n)*func',
-        'comment_pattern': r'//.*$|/\*[\s\S]*?\*/'
-    }
-}
-
-def detect_language(filename: str) -> str:
-    """Detectar lenguaje por extensión"""
-    ext = os.path.splitext(filename)[1].lower()
-    for lang, data in LANGUAGE_PATTERNS.items():
-        if ext in data['extensions']:
-            return lang
-    return 'unknown'
-
-def analyze_code(code: str, language: str) -> dict:
-    """Analizar código y calcular estadísticas"""
-    if language not in LANGUAGE_PATTERNS:
+# === SESIONES DE DOCUMENTO ===
+
+def session_expiration() -> int:
+    return int(datetime.utcnow().timestamp()) + DOCUMENT_SESSION_TTL_MINUTES * 60
+
+def get_session_owner(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> str:
+    """Usuario del token, si trae uno válido; sin token las sesiones son anónimas"""
+    if credentials is None:
+        return None
+    try:
+        return get_token_claims(credentials).get('sub')
+    except HTTPException:
+        return None
+
+def owned_by(owner: str):
+    """
+    Filtro de acceso: una sesión con dueño solo la ve ese usuario; una anónima,
+    quien tenga su id. Para los demás la sesión no existe (404).
+    """
+    return or_(DocumentSession.owner.is_(None), DocumentSession.owner == owner)
+
+def create_document_session(filename: str, language: str, original_code: str, owner: str = None) -> str:
+    """Guardar el código subido y retornar el id de la nueva sesión"""
+    db = SessionLocal()
+    try:
+        session_id = secrets.token_urlsafe(24)
+        db.add(DocumentSession(
+            id=session_id, filename=filename, language=language,
+            original_code=original_code, expires_at=session_expiration(), owner=owner
+        ))
+        db.commit()
+        return session_id
+    finally:
+        db.close()
+
+def load_document_session(session_id: str, owner: str = None) -> dict:
+    """Leer una sesión vigente y extender su vencimiento; None si no existe, expiró o es de otro usuario"""
+    db = SessionLocal()
+    try:
+        now = int(datetime.utcnow().timestamp())
+        session = db.query(DocumentSession).filter(
+            DocumentSession.id == session_id, DocumentSession.expires_at > now, owned_by(owner)
+        ).first()
+        if session is None:
+            return None
+        
+        session.expires_at = session_expiration()
+        db.commit()
         return {
-            'language': language,
-            'total_lines': len(code.split('\n')),
-            'functions_count': 0,
-            'classes_count': 0,
-            'documented_functions': 0,
-            'documentation_percentage': 0
+            "session_id": session.id,
+            "filename": session.filename,
+            "language": session.language,
+            "original_code": session.original_code,
+            "documented_code": session.documented_code,
+            "statistics": json.loads(session.statistics) if session.statistics else None,
+            "expires_at": session.expires_at
         }
+    finally:
+        db.close()
+
+def save_documented_code(session_id: str, documented_code: str, statistics: dict = None, owner: str = None) -> bool:
+    """Guardar el resultado de una generación (o una edición) en la sesión"""
+    db = SessionLocal()
+    try:
+        values = {"documented_code": documented_code, "expires_at": session_expiration()}
+        if statistics is not None:
+            values["statistics"] = json.dumps(statistics)
+        now = int(datetime.utcnow().timestamp())
+        updated = db.query(DocumentSession).filter(
+            DocumentSession.id == session_id, DocumentSession.expires_at > now, owned_by(owner)
+        ).update(values, synchronize_session=False)
+        db.commit()
+        return updated > 0
+    finally:
+        db.close()
+
+def purge_expired_sessions() -> int:
+    db = SessionLocal()
+    try:
+        now = int(datetime.utcnow().timestamp())
+        deleted = db.query(DocumentSession).filter(DocumentSession.expires_at <= now).delete()
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+async def require_document_session(session_id: str, owner: str = None) -> dict:
+    session = await run_in_threadpool(load_document_session, session_id, owner)
+    if session is None:
+        raise HTTPException(status_code=404, detail="La sesión expiró o no existe. Vuelve a enviar el código")
+    return session
+
+async def resolve_code(content: str, session_id: str, field: str, owner: str = None) -> str:
+    """Retorna el código enviado en la solicitud o, si no viene, el guardado en la sesión"""
+    if content is not None:
+        return content
+    if not session_id:
+        raise HTTPException(status_code=400, detail="Se requiere el código o un session_id")
     
-    patterns = LANGUAGE_PATTERNS[language]
-    lines = code.split('\n')
-    total_lines = len(lines)
-    
-    functions = re.findall(patterns['function_pattern'], code, re.MULTILINE)
-    functions_count = len(functions)
-    
-    classes = re.findall(patterns['class_pattern'], code, re.MULTILINE)
-    classes_count = len(classes)
-    
-    documented_functions = 0
-    
-    if functions_count > 0:
-        code_lines = code.split('\n')
-        for i, line in enumerate(code_lines):
-            if re.search(patterns['function_pattern'], line):
-                search_range = '\n'.join(code_lines[i:min(i+5, len(code_lines))])
-                if re.search(patterns['docstring_pattern'], search_range, re.MULTILINE):
-                    documented_functions += 1
-    
-    documentation_percentage = 0
-    if functions_count > 0:
-        documentation_percentage = round((documented_functions / functions_count) * 100, 1)
-    
-    return {
-        'language': language,
-        'total_lines': total_lines,
-        'functions_count': functions_count,
-        'classes_count': classes_count,
-        'documented_functions': documented_functions,
-        'documentation_percentage': documentation_percentage
-    }
+    with metrics.stage('session_load'):
+        session = await require_document_session(session_id, owner)
+    if session[field] is None:
+        raise HTTPException(status_code=409, detail="La sesión todavía no tiene código documentado")
+    return session[field]
+
+async def purge_sessions_periodically():
+    while True:
+        try:
+            await run_in_threadpool(purge_expired_sessions)
+        except Exception as e:
+            print(f"Error eliminando sesiones vencidas: {e}")
+        await asyncio.sleep(DOCUMENT_SESSION_PURGE_SECONDS)
+
+session_purge_task = None
+
+@app.on_event("startup")
+async def start_session_purge():
+    global session_purge_task
+    session_purge_task = asyncio.create_task(purge_sessions_periodically())
+
+@app.on_event("shutdown")
+async def stop_session_purge():
+    if session_purge_task is not None:
+        session_purge_task.cancel()
+
+@app.get("/api/sessions/{session_id}")
+async def get_document_session(session_id: str, owner: str = Depends(get_session_owner)):
+    """Recuperar el código original y documentado de una sesión"""
+    return await require_document_session(session_id, owner)
+
+@app.put("/api/sessions/{session_id}")
+async def update_document_session(session_id: str, request: SessionUpdateRequest, owner: str = Depends(get_session_owner)):
+    """Guardar el código documentado editado por el usuario"""
+    if not await run_in_threadpool(save_documented_code, session_id, request.documented_code, None, owner):
+        raise HTTPException(status_code=404, detail="La sesión expiró o no existe. Vuelve a enviar el código")
+    return {"success": True, "session_id": session_id}
+
+@app.delete("/api/sessions/{session_id}")
+def delete_document_session(session_id: str, db: Session = Depends(get_db), owner: str = Depends(get_session_owner)):
+    """Eliminar una sesión antes de que expire"""
+    db.query(DocumentSession).filter(DocumentSession.id == session_id, owned_by(owner)).delete(synchronize_session=False)
+    db.commit()
+    return {"success": True}
 
 @app.post("/api/analyze-code")
-async def analyze_code_file(file: UploadFile = File(...)):
+async def analyze_code_file(file: UploadFile = File(...), owner: str = Depends(get_session_owner)):
     """Analizar archivo de código subido"""
     try:
         content = await file.read()
@@ -456,8 +745,14 @@ async def analyze_code_file(file: UploadFile = File(...)):
                 detail="Tipo de archivo no soportado. Soportamos: Python, JavaScript, PHP, Go"
             )
         
-        analysis = analyze_code(code, language)
+        # En un hilo: el análisis está acotado por ANALYSIS_TIME_BUDGET pero no debe bloquear el event loop
+        with metrics.stage('analyze'):
+            analysis = await run_in_threadpool(analyze_code, code, language)
+        if analysis['partial']:
+            metrics.annotate(analysis_partial=True)
         analysis['filename'] = file.filename
+        with metrics.stage('session_create'):
+            analysis['session_id'] = await run_in_threadpool(create_document_session, file.filename, language, code, owner)
         
         return analysis
         
@@ -468,51 +763,98 @@ async def analyze_code_file(file: UploadFile = File(...)):
 
 # === ENDPOINTS DE IA ===
 
+generation_limiter = RateLimiter(capacity=GENERATION_RATE_BURST, per_minute=GENERATION_RATE_PER_MINUTE)
+
+def get_client_id(request: Request, credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> str:
+    """Identificar al cliente por su usuario si trae un token válido, si no por su IP"""
+    if credentials is not None:
+        try:
+            claims = get_token_claims(credentials)
+            return f"user:{claims.get('sub')}"
+        except HTTPException:
+            pass
+    
+    host = request.client.host if request.client else "unknown"
+    return f"ip:{host}"
+
+def limit_generation_rate(client_id: str = Depends(get_client_id)) -> str:
+    """Rechazar con 429 a los clientes que superaron su cuota de generaciones"""
+    retry_after = generation_limiter.check(client_id)
+    if retry_after > 0:
+        seconds = math.ceil(retry_after)
+        raise HTTPException(
+            status_code=429,
+            detail=f"Demasiadas solicitudes de generación. Intenta de nuevo en {seconds} segundos",
+            headers={"Retry-After": str(seconds)}
+        )
+    return client_id
+
 @app.post("/api/generate-documentation")
-async def generate_documentation(request: DocumentationRequest):
+async def generate_documentation(request: DocumentationRequest, client_id: str = Depends(limit_generation_rate),
+                                 owner: str = Depends(get_session_owner)):
     """Generar documentación usando el modelo de IA"""
+    code = await resolve_code(request.code, request.session_id, "original_code", owner)
+    session_id = request.session_id
+    if request.code is not None or session_id is None:
+        with metrics.stage('session_create'):
+            session_id = await run_in_threadpool(create_document_session, request.filename, request.language, code, owner)
+    
     try:
-        result = generate_documentation_suggestions(request.code, request.language)
+        # La espera en la cola y la llamada al modelo ocurren en el event loop, sin ocupar hilos
+        result = await generate_documentation_suggestions(code, request.language, client_id)
         
         if not result["success"]:
             raise HTTPException(status_code=500, detail=result.get("message", "Error al generar documentación"))
         
+        with metrics.stage('session_save'):
+            await run_in_threadpool(save_documented_code, session_id, result["documented_code"], result["statistics"], owner)
+        
         return {
             "success": True,
             "documented_code": result["documented_code"],
             "original_code": result["original_code"],
             "language": result.get("language", request.language),
             "statistics": result["statistics"],
-            "filename": request.filename
+            "filename": request.filename,
+            "session_id": session_id
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @app.post("/api/regenerate-documentation")
-async def regenerate_doc(request: RegenerateRequest):
+async def regenerate_doc(request: RegenerateRequest, client_id: str = Depends(limit_generation_rate),
+                        owner: str = Depends(get_session_owner)):
     """Regenerar documentación con feedback"""
+    code = await resolve_code(request.code, request.session_id, "original_code", owner)
     try:
-        result = regenerate_documentation(request.code, request.language, request.feedback)
+        result = await regenerate_documentation(code, request.language, request.feedback, client_id)
         
         if not result["success"]:
             raise HTTPException(status_code=500, detail=result.get("message", "Error al regenerar"))
         
+        if request.session_id:
+            with metrics.stage('session_save'):
+                await run_in_threadpool(save_documented_code, request.session_id, result["documented_code"], result["statistics"], owner)
+        
         return {
             "success": True,
             "documented_code": result["documented_code"],
             "language": result.get("language", request.language),
-            "statistics": result["statistics"]
+            "statistics": result["statistics"],
+            "session_id": request.session_id
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @app.post("/api/accept-documentation")
-async def accept_doc(request: AcceptDocumentationRequest):
+async def accept_doc(request: AcceptDocumentationRequest, owner: str = Depends(get_session_owner)):
     """Aceptar documentación y generar documento final"""
+    documented_code = await resolve_code(request.documented_code, request.session_id, "documented_code", owner)
     try:
-        final_doc = generate_final_document(request.documented_code, request.filename, request.language)
+        with metrics.stage('final_document'):
+            final_doc = generate_final_document(documented_code, request.filename, request.language)
         
         return {
             "success": True,
@@ -524,66 +866,353 @@ async def accept_doc(request: AcceptDocumentationRequest):
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @app.post("/api/export-n8n")
-async def export_with_n8n(request: ExportRequest):
-    """Exportar documento usando n8n"""
+async def export_with_n8n(request: ExportRequest, background: bool = False, owner: str = Depends(get_session_owner)):
+    """Exportar documento usando n8n (background=true lo encola y responde de inmediato)"""
+    payload = {
+        "documented_code": await resolve_code(request.documented_code, request.session_id, "documented_code", owner),
+        "filename": request.filename,
+        "format": request.format,
+        "user_email": request.user_email
+    }
+    
+    if background:
+        await run_in_threadpool(enqueue_webhook, payload)
+        n8n_outbox_event.set()
+        return {"success": True, "queued": True, "message": "Documento encolado para envío a n8n"}
+    
     try:
-        import requests
-        
-        # URL del webhook de n8n (la que copiaste)
-        n8n_webhook_url = "http://localhost:5678/webhook-test/export-document"
-        
-        # Enviar datos a n8n
-        payload = {
-            "documented_code": request.documented_code,
-            "filename": request.filename,
-            "format": request.format,
-            "user_email": request.user_email  # Agregaremos esto
-        }
+        await n8n_client.send(payload, idempotency_key=secrets.token_hex(16))
+    except N8NError as e:
+        raise HTTPException(status_code=502, detail=f"Error al comunicarse con n8n: {e}")
+    
+    return {"success": True, "message": "Documento enviado a n8n para procesamiento"}
+
+# === ENTREGA A N8N EN SEGUNDO PLANO ===
+
+n8n_client = N8NClient(N8N_WEBHOOK_URL, timeout=N8N_TIMEOUT, max_retries=N8N_MAX_RETRIES)
+n8n_outbox_event = asyncio.Event()
+n8n_outbox_task = None
+
+def enqueue_webhook(payload: dict):
+    """Guardar el payload en la base de datos para entregarlo aunque el servidor se reinicie"""
+    db = SessionLocal()
+    try:
+        db.add(PendingWebhook(payload=json.dumps(payload), next_attempt_at=0, idempotency_key=secrets.token_hex(16)))
+        db.commit()
+    finally:
+        db.close()
+
+def fetch_due_webhooks(limit: int = 10) -> list:
+    db = SessionLocal()
+    try:
+        now = int(datetime.utcnow().timestamp())
+        rows = db.query(
+            PendingWebhook.id, PendingWebhook.payload, PendingWebhook.attempts, PendingWebhook.idempotency_key
+        ).filter(
+            PendingWebhook.next_attempt_at <= now, PendingWebhook.failed_at.is_(None)
+        ).order_by(PendingWebhook.id).limit(limit).all()
+        return [row._asdict() for row in rows]
+    finally:
+        db.close()
+
+def finish_webhook(webhook_id: int, error: str = None, attempts: int = 0, retryable: bool = True):
+    """
+    Eliminar un payload entregado o reprogramarlo con backoff si falló. Si el error no
+    tiene arreglo o se agotaron los intentos, queda marcado como fallido (failed_at)
+    en la tabla para revisarlo, y el outbox no lo vuelve a enviar.
+    """
+    db = SessionLocal()
+    try:
+        now = int(datetime.utcnow().timestamp())
+        if error is None:
+            db.query(PendingWebhook).filter(PendingWebhook.id == webhook_id).delete()
+        elif not retryable or attempts + 1 >= N8N_OUTBOX_MAX_ATTEMPTS:
+            print(f"Webhook {webhook_id} marcado como fallido tras {attempts + 1} intento(s): {error}")
+            db.query(PendingWebhook).filter(PendingWebhook.id == webhook_id).update({
+                "attempts": attempts + 1,
+                "failed_at": now,
+                "last_error": error
+            })
+        else:
+            delay = min(N8N_OUTBOX_RETRY_SECONDS * (2 ** attempts), 3600)
+            db.query(PendingWebhook).filter(PendingWebhook.id == webhook_id).update({
+                "attempts": attempts + 1,
+                "next_attempt_at": now + delay,
+                "last_error": error
+            })
+        db.commit()
+    finally:
+        db.close()
+
+async def drain_n8n_outbox():
+    """Entregar los payloads pendientes; despierta al encolar o periódicamente"""
+    while True:
+        try:
+            delivered_any = await deliver_due_webhooks()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Un error inesperado (por ejemplo "database is locked") no debe terminar la
+            # tarea: se registra y se reintenta después de la espera normal del outbox
+            print(f"Error procesando el outbox de n8n: {e}")
+            delivered_any = False
         
-        response = requests.post(n8n_webhook_url, json=payload)
+        if delivered_any:
+            continue
         
-        if response.status_code == 200:
-            return {"success": True, "message": "Documento enviado a n8n para procesamiento"}
-        else:
-            raise HTTPException(status_code=500, detail="Error al comunicarse con n8n")
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+        n8n_outbox_event.clear()
+        try:
+            await asyncio.wait_for(n8n_outbox_event.wait(), timeout=N8N_OUTBOX_RETRY_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+async def deliver_due_webhooks() -> bool:
+    """Intentar entregar los payloads vencidos; True si había alguno"""
+    webhooks = await run_in_threadpool(fetch_due_webhooks)
+    
+    for webhook in webhooks:
+        # Las filas encoladas antes de guardar la clave usan una derivada de su id
+        idempotency_key = webhook["idempotency_key"] or f"pending-webhook-{webhook['id']}"
+        try:
+            await n8n_client.send(json.loads(webhook["payload"]), idempotency_key=idempotency_key)
+            await run_in_threadpool(finish_webhook, webhook["id"])
+        except N8NError as e:
+            print(f"Error entregando webhook {webhook['id']} a n8n: {e}")
+            await run_in_threadpool(finish_webhook, webhook["id"], str(e), webhook["attempts"], e.retryable)
+        except ValueError as e:
+            # Payload guardado que no es JSON válido: reintentar no lo arregla
+            print(f"Error entregando webhook {webhook['id']} a n8n: {e}")
+            await run_in_threadpool(finish_webhook, webhook["id"], str(e), webhook["attempts"], False)
+    
+    return bool(webhooks)
+
+@app.on_event("startup")
+async def start_n8n_client():
+    global n8n_outbox_task
+    await n8n_client.start()
+    n8n_outbox_task = asyncio.create_task(drain_n8n_outbox())
+
+@app.on_event("shutdown")
+async def stop_n8n_client():
+    if n8n_outbox_task is not None:
+        n8n_outbox_task.cancel()
+    await n8n_client.close()
 
 # === ENDPOINTS DE EXPORTACIÓN ===
 
+export_pool = ExportPool(workers=EXPORT_WORKERS, max_pending=EXPORT_MAX_PENDING)
+export_cache = ExportCache(EXPORT_CACHE_DIR, max_bytes=EXPORT_CACHE_MAX_MB * 1024 * 1024)
+
+@app.on_event("startup")
+def start_export_pool():
+    export_cache.load()
+    export_pool.start()
+
+@app.on_event("shutdown")
+def stop_export_pool():
+    export_pool.shutdown()
+
+def export_cache_key(document: dict, export_format: str, highlight: bool) -> str:
+    """Mismo código, nombre, lenguaje, formato y plantilla producen el mismo documento"""
+    variant = f"{export_format}+highlight" if highlight else export_format
+    return ExportCache.make_key(
+        document['code'], document['filename'], f"{variant}:{document['language']}", EXPORT_TEMPLATE_VERSION
+    )
+
+async def render_cached(document: dict, export_format: str, key: str, highlight: bool, is_disconnected=None) -> tuple:
+    """
+    Retorna (ruta, liberar): la ruta del documento en la caché, renderizándolo en el
+    pool si falta, y la función que quien llama debe ejecutar cuando ya no la use (la
+    entrada queda fijada en la caché hasta entonces). Si la solicitud se está perfilando,
+    el documento se renderiza en este proceso y sin pasar por la caché, para que el
+    perfil muestre la maquetación; en ese caso la ruta es un temporal y liberar lo borra.
+    """
+    if is_profiling():
+        rendered_path = (await run_in_threadpool(render_export, export_format, document, None, highlight))[0]
+        return rendered_path, lambda: os.remove(rendered_path)
+    
+    path = export_cache.get(key)
+    metrics.inc('code_doc_cache_requests_total', cache='export', result='hit' if path is not None else 'miss')
+    metrics.annotate(**{f"export_cache_{export_format}": 'hit' if path is not None else 'miss'})
+    if path is None:
+        # El renderizado corre en el pool de procesos; se cancela si el cliente se desconecta
+        rendered_path = await export_pool.run(
+            export_format, document,
+            is_disconnected=is_disconnected,
+            directory=EXPORT_CACHE_DIR,
+            highlight=highlight
+        )
+        path = export_cache.put(key, EXPORT_FORMATS[export_format][0], rendered_path)
+    return path, lambda: export_cache.release(key)
+
+def export_error(error: Exception) -> HTTPException:
+    """Traducir un error del pool de exportación a la respuesta HTTP correspondiente"""
+    if isinstance(error, ExportQueueFull):
+        return HTTPException(
+            status_code=503,
+            detail="Hay demasiadas exportaciones en curso. Intenta de nuevo en unos segundos",
+            headers={"Retry-After": "5"}
+        )
+    if isinstance(error, ExportCancelled):
+        return HTTPException(status_code=499, detail="Exportación cancelada: el cliente se desconectó")
+    return HTTPException(status_code=500, detail=f"Error al exportar: {str(error)}")
+
 @app.post("/api/export")
-async def export_document(request: ExportRequest):
+async def export_document(request: ExportRequest, http_request: Request, owner: str = Depends(get_session_owner)):
     """Exportar documento en el formato especificado"""
+    if request.format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Formato no soportado. Use: docx, pdf, markdown")
+    
+    extension, media_type = EXPORT_FORMATS[request.format]
+    filename = f"{request.filename.replace('.py', '')}_documented{extension}"
+    
+    documented_code = await resolve_code(request.documented_code, request.session_id, "documented_code", owner)
+    with metrics.stage('build_document'):
+        document = build_document(documented_code, request.filename, request.language)
+    highlight = request.highlight and request.format == 'docx'
+    key = export_cache_key(document, request.format, highlight)
+    etag = f'"{key}"'
+    
+    if_none_match = http_request.headers.get("if-none-match", "")
+    if if_none_match == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+    
     try:
-        if request.format == 'docx':
-            file_stream = create_docx(request.documented_code, request.filename, request.filename)
-            filename = f"{request.filename.replace('.py', '')}_documented.docx"
-            media_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-            
-        elif request.format == 'pdf':
-            file_stream = create_pdf_simple(request.documented_code, request.filename, request.filename)
-            filename = f"{request.filename.replace('.py', '')}_documented.pdf"
-            media_type = "application/pdf"
-            
-        elif request.format == 'markdown':
-            markdown_content = create_markdown_document(request.documented_code, request.filename, request.filename)
-            from io import BytesIO
-            file_stream = BytesIO(markdown_content.encode('utf-8'))
-            filename = f"{request.filename.replace('.py', '')}_documented.md"
-            media_type = "text/markdown"
-            
-        else:
-            raise HTTPException(status_code=400, detail="Formato no soportado. Use: docx, pdf, markdown")
-        
-        return StreamingResponse(
-            file_stream,
-            media_type=media_type,
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-        
+        path, release = await render_cached(document, request.format, key, highlight, http_request.is_disconnected)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al exportar: {str(e)}")
+        raise export_error(e)
+    
+    # Se envía directamente el archivo de la caché, sin copiarlo en memoria
+    return FileResponse(
+        path,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}", "ETag": etag},
+        background=BackgroundTask(release)
+    )
+
+def write_bundle(entries: list) -> str:
+    """Empaquetar los documentos en un ZIP temporal; los formatos ya comprimidos se guardan sin recomprimir"""
+    fd, bundle_path = tempfile.mkstemp(prefix='bundle_', suffix='.zip')
+    try:
+        with os.fdopen(fd, 'wb') as output, zipfile.ZipFile(output, 'w') as bundle:
+            for path, arcname, export_format in entries:
+                compression = zipfile.ZIP_DEFLATED if export_format == 'markdown' else zipfile.ZIP_STORED
+                bundle.write(path, arcname, compress_type=compression)
+    except Exception:
+        os.remove(bundle_path)
+        raise
+    return bundle_path
+
+@app.post("/api/export-bundle")
+async def export_bundle(request: BundleExportRequest, http_request: Request, owner: str = Depends(get_session_owner)):
+    """Exportar varios formatos en un solo ZIP, a partir de un único documento"""
+    formats = list(dict.fromkeys(request.formats))
+    invalid = [export_format for export_format in formats if export_format not in EXPORT_FORMATS]
+    if not formats or invalid:
+        raise HTTPException(status_code=400, detail="Formato no soportado. Use: docx, pdf, markdown")
+    
+    base_name = f"{request.filename.replace('.py', '')}_documented"
+    documented_code = await resolve_code(request.documented_code, request.session_id, "documented_code", owner)
+    with metrics.stage('build_document'):
+        document = build_document(documented_code, request.filename, request.language)
+    
+    # Los formatos que faltan en la caché se renderizan en paralelo en el pool. Cada documento
+    # queda fijado en la caché desde que está listo hasta que el ZIP se termina de escribir,
+    # así el renderizado de otro formato del mismo paquete no puede desalojarlo
+    acquired = []
+    
+    async def render(export_format: str) -> str:
+        highlight = request.highlight and export_format == 'docx'
+        key = export_cache_key(document, export_format, highlight)
+        path, release = await render_cached(document, export_format, key, highlight, http_request.is_disconnected)
+        acquired.append(release)
+        return path
+    
+    try:
+        results = await asyncio.gather(*(render(export_format) for export_format in formats), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise export_error(result)
+        
+        entries = [
+            (path, base_name + EXPORT_FORMATS[export_format][0], export_format)
+            for path, export_format in zip(results, formats)
+        ]
+        try:
+            bundle_path = await run_in_threadpool(write_bundle, entries)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al empaquetar: {str(e)}")
+    finally:
+        # También si la solicitud se cancela a mitad del renderizado
+        for release in acquired:
+            release()
+    
+    return FileResponse(
+        bundle_path,
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={base_name}.zip"},
+        background=BackgroundTask(os.remove, bundle_path)
+    )
+
+@app.get("/api/export/metrics", dependencies=[Depends(require_admin)])
+def export_metrics():
+    """Latencias de exportación por formato y uso de la caché (solo admin)"""
+    return {
+        "formats": export_pool.metrics.snapshot(),
+        "cache": export_cache.stats()
+    }
+
+# === PERFILES ===
+
+@app.get("/api/admin/profiles", dependencies=[Depends(require_admin)])
+def list_profiles():
+    """Perfiles guardados, del más reciente al más antiguo (solo admin)"""
+    return {"profiles": profile_store.list()}
+
+@app.get("/api/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def download_profile(profile_id: str):
+    """Descargar un perfil en formato collapsed (flamegraph.pl, inferno, speedscope)"""
+    path = profile_store.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return FileResponse(
+        path,
+        media_type="text/plain",
+        headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.collapsed"}
+    )
+
+@app.delete("/api/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def delete_profile(profile_id: str):
+    """Eliminar un perfil guardado"""
+    if not profile_store.delete(profile_id):
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return {"message": "Perfil eliminado"}
+
+# === MÉTRICAS ===
+
+def collect_queue_metrics() -> list:
+    """Estado actual de las colas y las cachés de exportación y de parsers, leído al consultar /metrics"""
+    cache = export_cache.stats()
+    return [
+        ("code_doc_model_queue_pending", "gauge", "Generaciones esperando turno en la cola del modelo", {}, model_queue.pending()),
+        ("code_doc_generations_in_flight", "gauge", "Generaciones distintas en curso", {}, generation_flights.in_flight()),
+        ("code_doc_export_pending", "gauge", "Exportaciones en curso o en cola en el pool", {}, export_pool.pending()),
+        ("code_doc_export_cache_entries", "gauge", "Documentos en la caché de exportación", {}, cache["entries"]),
+        ("code_doc_export_cache_bytes", "gauge", "Bytes ocupados por la caché de exportación", {}, cache["bytes"]),
+        ("code_doc_parse_cache_entries", "gauge", "Códigos analizados en la caché de parsers", {}, len(parse_cache)),
+        ("code_doc_parse_cache_source_bytes", "gauge", "Bytes de código fuente de los análisis en caché", {}, parse_cache.total_bytes)
+    ]
+
+metrics.registry.add_collector(collect_queue_metrics)
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
+    """Métricas en formato de texto de Prometheus"""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Métricas deshabilitadas")
+    if METRICS_TOKEN and (credentials is None or not secrets.compare_digest(credentials.credentials, METRICS_TOKEN)):
+        raise HTTPException(status_code=401, detail="No autenticado", headers={"WWW-Authenticate": "Bearer"})
+    return Response(metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,272 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Instrumentación: con METRICS_ENABLED=false los temporizadores no hacen nada
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Una línea JSON por solicitud con sus etapas (requiere METRICS_ENABLED)
+METRICS_LOG = os.getenv("METRICS_LOG", "true").lower() in ("1", "true", "yes")
+
+# Límites (en segundos) de los histogramas de latencia
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Descripción y tipo de cada métrica, para la exposición en formato Prometheus
+METRIC_HELP = {
+    'code_doc_http_requests_total': ('counter', 'Solicitudes HTTP por ruta, método y estado'),
+    'code_doc_http_request_seconds': ('histogram', 'Duración de las solicitudes HTTP'),
+    'code_doc_stage_seconds': ('histogram', 'Duración de cada etapa del procesamiento'),
+    'code_doc_model_calls_total': ('counter', 'Llamadas al modelo por operación y resultado'),
+    'code_doc_generation_requests_total': ('counter', 'Solicitudes de generación, incluidas las deduplicadas'),
+    'code_doc_model_prompt_tokens_total': ('counter', 'Tokens de entrada enviados al modelo'),
+    'code_doc_model_output_tokens_total': ('counter', 'Tokens generados por el modelo'),
+    'code_doc_model_tokens_per_second': ('histogram', 'Velocidad de generación del modelo (tokens/s)'),
+    'code_doc_cache_requests_total': ('counter', 'Consultas a las cachés por resultado (hit/miss)')
+}
+
+TOKENS_PER_SECOND_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400, 1000)
+
+logger = logging.getLogger("code_doc.metrics")
+
+# Etapas de la solicitud en curso (las propaga run_in_threadpool junto con el contexto)
+_current_trace = ContextVar('metrics_trace', default=None)
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for index, limit in enumerate(self.buckets):
+            if value <= limit:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """
+    Contadores e histogramas en memoria con etiquetas, y su exposición en el
+    formato de texto de Prometheus. Los colectores agregan valores que ya
+    mantienen otros componentes (caché de exportación, colas) al momento de consultar.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: tuple = DEFAULT_BUCKETS, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def add_collector(self, collector):
+        """collector() retorna una lista de (nombre, tipo, ayuda, etiquetas, valor)."""
+        self._collectors.append(collector)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        families = {}
+
+        def family(name: str, kind: str = None, help_text: str = None) -> dict:
+            if name not in families:
+                default_kind, default_help = METRIC_HELP.get(name, ('gauge', ''))
+                families[name] = {'kind': kind or default_kind, 'help': help_text or default_help, 'lines': []}
+            return families[name]
+
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                family(name)['lines'].append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                lines = family(name)['lines']
+                cumulative = 0
+                for limit, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, (('le', _format_value(limit)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        for collector in self._collectors:
+            for name, kind, help_text, labels, value in collector():
+                family(name, kind, help_text)['lines'].append(
+                    f"{name}{_format_labels(_labels_key(labels))} {_format_value(value)}"
+                )
+
+        output = []
+        for name, data in families.items():
+            output.append(f"# HELP {name} {data['help']}")
+            output.append(f"# TYPE {name} {data['kind']}")
+            output.extend(data['lines'])
+        return '\n'.join(output) + '\n'
+
+registry = MetricsRegistry()
+
+def inc(name: str, value: float = 1, **labels):
+    if METRICS_ENABLED:
+        registry.inc(name, value, **labels)
+
+def observe(name: str, value: float, buckets: tuple = DEFAULT_BUCKETS, **labels):
+    if METRICS_ENABLED:
+        registry.observe(name, value, buckets, **labels)
+
+# === ETAPAS ===
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    __slots__ = ('name', 'labels', 'start')
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_stage(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+def stage(name: str, **labels):
+    """
+    Temporizador de una etapa: 'with stage("prompt_build"):'.
+    Suma al histograma code_doc_stage_seconds y a la traza de la solicitud en curso.
+    """
+    if not METRICS_ENABLED:
+        return _NULL_STAGE
+    return _Stage(name, labels)
+
+def record_stage(name: str, seconds: float, **labels):
+    """Registra una etapa medida por fuera (duraciones que informa Ollama o un proceso del pool)."""
+    if not METRICS_ENABLED:
+        return
+    registry.observe('code_doc_stage_seconds', seconds, stage=name, **labels)
+    trace = _current_trace.get()
+    if trace is not None:
+        stages = trace['stages']
+        stages[name] = stages.get(name, 0.0) + seconds
+
+def annotate(**values):
+    """Agrega datos (tokens, aciertos de caché) a la línea de log de la solicitud en curso."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace['values'].update(values)
+
+@contextmanager
+def capture_stages():
+    """
+    Abre una traza propia y la entrega al terminar, para procesos del pool cuyas
+    etapas se registran luego en el proceso principal (ver export_worker).
+    """
+    trace = {'stages': {}, 'values': {}}
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+# === HTTP ===
+
+def configure_logging():
+    """Envía las líneas JSON de METRICS_LOG a stdout sin pasar por los loggers de uvicorn."""
+    if METRICS_LOG and not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+class MetricsMiddleware:
+    """
+    Mide cada solicitud HTTP por ruta (la plantilla, no la URL concreta) y estado,
+    y escribe una línea JSON con sus etapas si METRICS_LOG está activo.
+    """
+
+    def __init__(self, app, skip_paths: tuple = ('/metrics',)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if not METRICS_ENABLED or scope['type'] != 'http' or scope['path'] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        trace = {'stages': {}, 'values': {}}
+        token = _current_trace.set(trace)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_trace.reset(token)
+            duration = time.perf_counter() - start
+            route = scope.get('route')
+            path = getattr(route, 'path', 'unmatched')
+            registry.inc('code_doc_http_requests_total', method=scope['method'], route=path, status=status)
+            registry.observe('code_doc_http_request_seconds', duration, method=scope['method'], route=path)
+
+            if METRICS_LOG:
+                entry = {
+                    'event': 'request',
+                    'method': scope['method'],
+                    'route': path,
+                    'status': status,
+                    'duration_ms': round(duration * 1000, 2),
+                    'stages_ms': {name: round(seconds * 1000, 2) for name, seconds in trace['stages'].items()}
+                }
+                entry.update(trace['values'])
+                logger.info(json.dumps(entry, ensure_ascii=False))
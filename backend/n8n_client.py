@@ -0,0 +1,78 @@
+import asyncio
+import httpx
+
+class N8NError(Exception):
+    """
+    Error al entregar un payload al webhook de n8n. 'retryable' es False cuando n8n
+    rechazó el payload (4xx): volver a enviarlo más tarde no cambiaría la respuesta.
+    """
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+class N8NClient:
+    """
+    Cliente HTTP asíncrono compartido para el webhook de n8n.
+    Reutiliza conexiones entre llamadas, aplica timeouts y reintenta con backoff
+    exponencial ante respuestas 429/5xx o errores de red anteriores al envío.
+    Cada intento lleva el mismo encabezado Idempotency-Key, para que el flujo de n8n
+    pueda descartar un payload repetido.
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    # Errores en los que la solicitud no llegó a enviarse completa: reintentar no la duplica
+    UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.WriteError, httpx.WriteTimeout, httpx.PoolTimeout)
+
+    def __init__(self, url: str, timeout: float = 10.0, max_retries: int = 3,
+                 backoff: float = 0.5, max_connections: int = 10):
+        self.url = url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self._client = None
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def send(self, payload: dict, idempotency_key: str = None) -> httpx.Response:
+        """Envía el payload al webhook. Lanza N8NError si se agotan los reintentos."""
+        await self.start()
+        headers = {'Idempotency-Key': idempotency_key} if idempotency_key else None
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(self.backoff * (2 ** (attempt - 1)))
+
+            try:
+                response = await self._client.post(self.url, json=payload, headers=headers)
+            except self.UNSENT_ERRORS as e:
+                last_error = f"{type(e).__name__}: {e}"
+                continue
+            except httpx.TransportError as e:
+                # El payload pudo llegar a n8n (p. ej. ReadTimeout): no se reintenta aquí
+                raise N8NError(f"{type(e).__name__}: {e}")
+
+            if response.is_success:
+                return response
+
+            last_error = f"n8n respondió {response.status_code}"
+            if response.status_code not in self.RETRY_STATUS:
+                raise N8NError(last_error, retryable=False)
+
+        raise N8NError(last_error)
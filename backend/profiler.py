@@ -0,0 +1,243 @@
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from urllib.parse import parse_qs
+
+# Funciones en las que un hilo está esperando, no trabajando (se omiten de las muestras)
+IDLE_FUNCTIONS = {
+    'select', 'poll', 'epoll', 'kqueue', 'wait', 'get', 'accept', 'sleep',
+    '_worker', 'run_forever', '_run_once', 'recv_into', 'readinto', 'acquire'
+}
+IDLE_MODULES = (
+    'threading.py', 'selectors.py', 'queue.py', 'base_events.py', 'thread.py', 'socket.py', 'connection.py'
+)
+
+PROFILE_ID_PATTERN = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$')
+
+# Solicitud que se está perfilando en el contexto actual (ver is_profiling)
+_profiling = ContextVar('profiling', default=False)
+
+# Un solo perfil a la vez: el muestreo abarca todo el proceso
+_profile_lock = threading.Lock()
+
+def is_profiling() -> bool:
+    """True dentro de una solicitud que se está perfilando."""
+    return _profiling.get()
+
+def _frame_label(code) -> str:
+    # Agrupado por función (línea de su definición), no por la línea en ejecución
+    name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name.replace(';', ':')
+
+class SamplingProfiler:
+    """
+    Perfilador por muestreo: un hilo toma las pilas de todos los hilos del proceso
+    cada 'interval' segundos y cuenta cada pila distinta. El resultado se exporta
+    en formato "collapsed" (una pila por línea, frames separados por ';' y la
+    cantidad de muestras al final), el que leen flamegraph.pl, inferno y speedscope.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = 0
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if code.co_name in IDLE_FUNCTIONS and os.path.basename(code.co_filename) in IDLE_MODULES:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}").replace(';', ':'))
+                self._stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+class ProfileStore:
+    """
+    Perfiles guardados en disco: '<id>.collapsed' con las pilas y '<id>.json' con
+    los datos de la solicitud. Se conservan como máximo max_count perfiles y
+    ninguno más antiguo que max_age_seconds.
+    """
+
+    def __init__(self, directory: str, max_count: int = 20, max_age_seconds: float = 24 * 3600):
+        self.directory = directory
+        self.max_count = max_count
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_id() -> str:
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(4)}"
+
+    def save(self, profile_id: str, collapsed: str, info: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, profile_id + '.collapsed'), 'w', encoding='utf-8') as f:
+            f.write(collapsed)
+        with open(os.path.join(self.directory, profile_id + '.json'), 'w', encoding='utf-8') as f:
+            json.dump(dict(info, id=profile_id), f, ensure_ascii=False)
+        self.purge()
+
+    def list(self) -> list:
+        """Perfiles guardados, del más reciente al más antiguo."""
+        profiles = []
+        if not os.path.isdir(self.directory):
+            return profiles
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(profiles, key=lambda info: info.get('created_at', 0), reverse=True)
+
+    def path(self, profile_id: str):
+        """Ruta del archivo collapsed del perfil, o None si el id no es válido o no existe."""
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = os.path.join(self.directory, profile_id + '.collapsed')
+        return path if os.path.exists(path) else None
+
+    def delete(self, profile_id: str) -> bool:
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return False
+        removed = False
+        for extension in ('.collapsed', '.json'):
+            path = os.path.join(self.directory, profile_id + extension)
+            if os.path.exists(path):
+                os.remove(path)
+                removed = True
+        return removed
+
+    def purge(self):
+        """Aplica los límites de retención."""
+        with self._lock:
+            limit = time.time() - self.max_age_seconds
+            for position, info in enumerate(self.list()):
+                if position >= self.max_count or info.get('created_at', 0) < limit:
+                    self.delete(info['id'])
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin-1')
+    return ''
+
+def profile_requested(scope) -> bool:
+    """Encabezado 'X-Profile: 1' o parámetro '?profile=1'; los preflights OPTIONS nunca se perfilan."""
+    if scope.get('method') == 'OPTIONS':
+        return False
+    if _header(scope, b'x-profile').strip().lower() in ('1', 'true', 'yes'):
+        return True
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    return query.get('profile', [''])[-1].lower() in ('1', 'true', 'yes')
+
+def _bearer_token(scope) -> str:
+    # El token de administrador puede venir aparte, para perfilar una solicitud con la sesión de un usuario
+    token = _header(scope, b'x-profile-token').strip()
+    if token:
+        return token
+    authorization = _header(scope, b'authorization')
+    scheme, _, credentials = authorization.partition(' ')
+    return credentials.strip() if scheme.lower() == 'bearer' else ''
+
+class ProfilingMiddleware:
+    """
+    Perfila las solicitudes marcadas con X-Profile o ?profile=1 si traen un token de
+    administrador (en Authorization o en X-Profile-Token). El perfil se guarda en
+    'store' y su id se informa en el encabezado X-Profile-Id de la respuesta.
+    """
+
+    def __init__(self, app, store: ProfileStore, authorize, interval: float = 0.005):
+        self.app = app
+        self.store = store
+        self.authorize = authorize
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not profile_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if not self.authorize(_bearer_token(scope)):
+            body = json.dumps({'detail': 'Se requieren permisos de administrador para perfilar'}).encode('utf-8')
+            await send({
+                'type': 'http.response.start',
+                'status': 403,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+            })
+            await send({'type': 'http.response.body', 'body': body})
+            return
+
+        if not _profile_lock.acquire(blocking=False):
+            # Ya hay otra solicitud perfilándose: esta se atiende normalmente
+            async def send_busy(message):
+                if message['type'] == 'http.response.start':
+                    message = dict(message, headers=list(message.get('headers', [])) + [(b'x-profile-status', b'busy')])
+                await send(message)
+
+            await self.app(scope, receive, send_busy)
+            return
+
+        profile_id = self.store.new_id()
+        profiler = SamplingProfiler(self.interval)
+        token = _profiling.set(True)
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                message = dict(message, headers=list(message.get('headers', [])) + [(b'x-profile-id', profile_id.encode())])
+            await send(message)
+
+        started_at = time.time()
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.stop()
+            _profiling.reset(token)
+            try:
+                self.store.save(profile_id, profiler.collapsed(), {
+                    'created_at': started_at,
+                    'method': scope['method'],
+                    'path': scope['path'],
+                    'status': status,
+                    'duration_seconds': round(time.perf_counter() - start, 4),
+                    'samples': profiler.samples,
+                    'interval_seconds': self.interval
+                })
+            finally:
+                _profile_lock.release()
@@ -0,0 +1,18 @@
+import time
+
+class AnalysisBudget:
+    """
+    Tiempo máximo para analizar un código. Al agotarse, los recorridos se
+    detienen y el análisis se informa como parcial en lugar de seguir
+    consumiendo CPU con entradas patológicas.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds
+        self.exhausted = False
+
+    def expired(self) -> bool:
+        if not self.exhausted and time.monotonic() > self.deadline:
+            self.exhausted = True
+        return self.exhausted
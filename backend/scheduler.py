@@ -0,0 +1,167 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager
+
+class TokenBucket:
+    """
+    Cubeta de tokens: permite ráfagas de hasta 'capacity' solicitudes
+    y se recarga a 'refill_rate' tokens por segundo.
+    """
+
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+        self.updated_at = now
+
+    def take(self) -> float:
+        """Consume un token. Retorna 0 si se permitió o los segundos a esperar si no."""
+        now = time.monotonic()
+        self._refill(now)
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+
+        return (1 - self.tokens) / self.refill_rate
+
+    def is_full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+class RateLimiter:
+    """Limitador de tasa con una cubeta de tokens por cliente (usuario o IP)."""
+
+    def __init__(self, capacity: float, per_minute: float, max_clients: int = 10000):
+        self.capacity = capacity
+        self.refill_rate = per_minute / 60.0
+        self.max_clients = max_clients
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def check(self, client_id: str) -> float:
+        """Retorna 0 si el cliente puede continuar, o los segundos hasta su próximo token."""
+        with self._lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None:
+                if len(self._buckets) >= self.max_clients:
+                    self._evict_idle()
+                bucket = TokenBucket(self.capacity, self.refill_rate)
+                self._buckets[client_id] = bucket
+
+            return bucket.take()
+
+    def _evict_idle(self):
+        # Una cubeta llena equivale a un cliente nuevo, se puede olvidar sin efecto
+        idle = [client_id for client_id, bucket in self._buckets.items() if bucket.is_full()]
+        for client_id in idle:
+            del self._buckets[client_id]
+
+class FairQueue:
+    """
+    Cola de equidad ponderada (weighted fair queuing) delante de un recurso
+    con 'concurrency' lugares, como el servidor de Ollama.
+
+    Cada solicitud recibe una etiqueta de fin virtual: inicio + costo / peso,
+    donde el inicio es el máximo entre el tiempo virtual global y el fin de la
+    solicitud anterior del mismo cliente. Se atiende siempre la etiqueta menor,
+    así un cliente con muchas solicitudes encoladas no retrasa a los demás.
+
+    Se usa solo desde el event loop: cada solicitud en espera es un future, no un
+    hilo bloqueado, así las generaciones encoladas no agotan el pool de hilos.
+    """
+
+    def __init__(self, concurrency: int = 1):
+        self.concurrency = concurrency
+        self._active = 0
+        self._virtual_time = 0.0
+        self._last_finish = {}
+        self._heap = []
+        self._counter = itertools.count()
+
+    @asynccontextmanager
+    async def slot(self, client_id: str, cost: float = 1.0, weight: float = 1.0):
+        """Espera hasta que sea el turno del cliente y ocupa un lugar mientras dure el bloque."""
+        start = max(self._virtual_time, self._last_finish.get(client_id, 0.0))
+        finish = start + cost / weight
+        self._last_finish[client_id] = finish
+
+        turn = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (finish, next(self._counter), start, turn))
+        self._dispatch()
+
+        try:
+            await turn
+        except asyncio.CancelledError:
+            # Si el turno ya se había dado, el lugar pasa al siguiente; si no, _dispatch lo salta
+            if not turn.cancelled():
+                self._release()
+            raise
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _dispatch(self):
+        # Se atienden las etiquetas menores mientras haya lugares libres
+        while self._active < self.concurrency and self._heap:
+            _, _, start, turn = heapq.heappop(self._heap)
+            if turn.done():
+                continue
+            self._active += 1
+            self._virtual_time = max(self._virtual_time, start)
+            turn.set_result(None)
+        self._forget_idle_clients()
+
+    def _release(self):
+        self._active -= 1
+        self._dispatch()
+
+    def _forget_idle_clients(self):
+        # Un cliente cuyo último fin ya quedó atrás empezaría igual desde el tiempo virtual
+        idle = [client_id for client_id, finish in self._last_finish.items() if finish <= self._virtual_time]
+        for client_id in idle:
+            del self._last_finish[client_id]
+
+    def pending(self) -> int:
+        return sum(1 for entry in self._heap if not entry[3].done())
+
+class SingleFlight:
+    """
+    Deduplicación de llamadas en curso: mientras una llamada con cierta clave
+    se está ejecutando, las demás con la misma clave esperan su resultado en el
+    event loop, sin ocupar un hilo cada una. Se usa solo desde el event loop.
+    """
+
+    def __init__(self):
+        self._flights = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        """
+        Ejecuta await fn(*args, **kwargs) una sola vez por clave entre llamadas concurrentes.
+        La ejecución es una tarea compartida: si quien la inició se cancela (por ejemplo,
+        porque su cliente se desconectó), sigue corriendo para las demás.
+        """
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        # Las llamadas que lleguen desde ahora inician una ejecución nueva
+        if self._flights.get(key) is task:
+            del self._flights[key]
+
+    def in_flight(self) -> int:
+        return len(self._flights)
@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import OrderedDict
+
+class TokenCache:
+    """
+    Caché LRU acotada de token JWT -> claims ya verificados.
+    Cada entrada expira junto con el 'exp' del propio token.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        """Retorna los claims del token si están en caché y no expiraron, si no None."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+
+            expires_at, claims = entry
+            if time.time() >= expires_at:
+                del self._entries[token]
+                return None
+
+            self._entries.move_to_end(token)
+            return claims
+
+    def put(self, token: str, claims: dict):
+        """Guarda los claims de un token recién verificado."""
+        expires_at = claims.get('exp')
+        if expires_at is None:
+            return
+
+        with self._lock:
+            self._entries[token] = (expires_at, claims)
+            self._entries.move_to_end(token)
+
+            # Desalojar los menos usados recientemente
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class RevocationList:
+    """
+    Conjunto en memoria de identificadores (jti) de tokens revocados.
+    Guarda la expiración de cada token para poder olvidarlo cuando ya no es válido.
+    """
+
+    def __init__(self):
+        self._revoked = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, jti) -> bool:
+        return jti in self._revoked
+
+    def add(self, jti: str, expires_at: float):
+        with self._lock:
+            self._revoked[jti] = expires_at
+            self._purge_expired()
+
+    def load(self, entries):
+        """Carga pares (jti, expires_at) persistidos, descartando los ya expirados."""
+        now = time.time()
+        with self._lock:
+            for jti, expires_at in entries:
+                if expires_at > now:
+                    self._revoked[jti] = expires_at
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [jti for jti, expires_at in self._revoked.items() if expires_at <= now]
+        for jti in expired:
+            del self._revoked[jti]
@@ -0,0 +1,52 @@
+// Cuerpos JSON grandes: se envían comprimidos con gzip (el servidor los descomprime)
+const COMPRESS_MIN_BYTES = 64 * 1024;
+
+export const jsonRequest = async (payload, headers = {}) => {
+  const json = JSON.stringify(payload);
+  const baseHeaders = { 'Content-Type': 'application/json', ...headers };
+
+  if (json.length < COMPRESS_MIN_BYTES || typeof CompressionStream === 'undefined') {
+    return { headers: baseHeaders, body: json };
+  }
+
+  const stream = new Blob([json]).stream().pipeThrough(new CompressionStream('gzip'));
+  const body = await new Response(stream).blob();
+  return { headers: { ...baseHeaders, 'Content-Encoding': 'gzip' }, body };
+};
+
+// Con sesión iniciada, las sesiones de documento quedan ligadas al usuario del token
+export const authHeaders = () => {
+  const token = localStorage.getItem('token');
+  return token ? { Authorization: `Bearer ${token}` } : {};
+};
+
+// Toma el código de la sesión del servidor; si la sesión expiró, lo reenvía completo
+export const postWithSession = async (url, payload, field, content, sessionId, extraHeaders = {}) => {
+  const headers = { ...authHeaders(), ...extraHeaders };
+  if (sessionId) {
+    const response = await fetch(url, {
+      method: 'POST',
+      ...(await jsonRequest({ ...payload, session_id: sessionId }, headers))
+    });
+    if (response.status !== 404) {
+      return response;
+    }
+  }
+
+  return fetch(url, {
+    method: 'POST',
+    ...(await jsonRequest({ ...payload, [field]: content }, headers))
+  });
+};
+
+// Guarda en la sesión el código documentado editado; false si la sesión expiró
+export const saveSessionCode = async (sessionId, documentedCode) => {
+  if (!sessionId) {
+    return false;
+  }
+  const response = await fetch(`http://localhost:8000/api/sessions/${sessionId}`, {
+    method: 'PUT',
+    ...(await jsonRequest({ documented_code: documentedCode }, authHeaders()))
+  });
+  return response.ok;
+};
@@ -1,9 +1,11 @@
 import React, { useState, useEffect } from 'react';
 import { Sparkles, RefreshCw, CheckCircle, Code, FileText, Loader } from 'lucide-react';
+import { postWithSession } from '../api';
 
 const AIModelView = () => {
   const [originalCode, setOriginalCode] = useState('');
   const [documentedCode, setDocumentedCode] = useState('');
+  const [sessionId, setSessionId] = useState(null);
   const [filename, setFilename] = useState('');
   const [language, setLanguage] = useState('python');
   const [statistics, setStatistics] = useState(null);
@@ -16,28 +18,31 @@ const AIModelView = () => {
     const storedCode = localStorage.getItem('uploaded_code');
     const storedFilename = localStorage.getItem('uploaded_filename');
     const storedLanguage = localStorage.getItem('detected_language') || 'python';
+    const storedSessionId = localStorage.getItem('session_id');
     
     if (storedCode && storedFilename) {
       setOriginalCode(storedCode);
       setFilename(storedFilename);
       setLanguage(storedLanguage);
-      generateDocumentation(storedCode, storedFilename, storedLanguage);
+      setSessionId(storedSessionId);
+      generateDocumentation(storedCode, storedFilename, storedLanguage, storedSessionId);
     } else {
       setError('No hay código para documentar. Por favor sube un archivo primero.');
     }
   }, []);
 
-  const generateDocumentation = async (code, fname, lang) => {
+  const generateDocumentation = async (code, fname, lang, sid) => {
     setLoading(true);
     setError('');
     setStep('generating');
 
     try {
-      const response = await fetch('http://localhost:8000/api/generate-documentation', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ code, filename: fname, language: lang })
-      });
+      // El código ya está en la sesión creada por el análisis: se envía solo su id
+      const response = await postWithSession(
+        'http://localhost:8000/api/generate-documentation',
+        { filename: fname, language: lang },
+        'code', code, sid
+      );
 
       const data = await response.json();
 
@@ -46,6 +51,8 @@ const AIModelView = () => {
       }
 
       setDocumentedCode(data.documented_code);
+      setSessionId(data.session_id);
+      localStorage.setItem('session_id', data.session_id);
       setStatistics(data.statistics);
       setStep('showing');
 
@@ -62,15 +69,14 @@ const AIModelView = () => {
     setError('');
 
     try {
-      const response = await fetch('http://localhost:8000/api/regenerate-documentation', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ 
-          code: originalCode,
+      const response = await postWithSession(
+        'http://localhost:8000/api/regenerate-documentation',
+        {
           language: language,
           feedback: 'Genera una versión diferente y más detallada'
-        })
-      });
+        },
+        'code', originalCode, sessionId
+      );
 
       const data = await response.json();
 
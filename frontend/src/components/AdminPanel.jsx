@@ -1,10 +1,19 @@
 import React, { useState, useEffect } from 'react';
-import { Trash2, Users, LogOut, Shield } from 'lucide-react';
+import { Trash2, Users, LogOut, Shield, Search } from 'lucide-react';
+
+const PAGE_SIZE = 50;
+
+const authHeaders = () => ({
+  Authorization: `Bearer ${localStorage.getItem('admin_token')}`
+});
 
 const AdminPanel = () => {
   const [isAuthenticated, setIsAuthenticated] = useState(false);
   const [password, setPassword] = useState('');
   const [users, setUsers] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [totalEstimate, setTotalEstimate] = useState(0);
+  const [search, setSearch] = useState('');
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
@@ -13,10 +22,16 @@ const AdminPanel = () => {
     const token = localStorage.getItem('admin_token');
     if (token) {
       setIsAuthenticated(true);
-      fetchUsers();
     }
   }, []);
 
+  // Recargar desde la primera página al autenticarse o al cambiar la búsqueda
+  useEffect(() => {
+    if (!isAuthenticated) return;
+    const timeout = setTimeout(() => fetchUsers(), 300);
+    return () => clearTimeout(timeout);
+  }, [isAuthenticated, search]);
+
   const handleLogin = async () => {
     setLoading(true);
     setError('');
@@ -36,7 +51,6 @@ const AdminPanel = () => {
 
       localStorage.setItem('admin_token', data.access_token);
       setIsAuthenticated(true);
-      fetchUsers();
       
     } catch (err) {
       setError(err.message);
@@ -45,17 +59,32 @@ const AdminPanel = () => {
     }
   };
 
-  const fetchUsers = async () => {
+  const fetchUsers = async (afterId = null) => {
     setLoading(true);
     try {
-      const response = await fetch('http://localhost:8000/api/admin/users');
+      const params = new URLSearchParams({ limit: PAGE_SIZE });
+      if (afterId !== null) params.set('after_id', afterId);
+      if (search) params.set('search', search);
+
+      const response = await fetch(`http://localhost:8000/api/admin/users?${params}`, {
+        headers: authHeaders()
+      });
       const data = await response.json();
       
+      if (response.status === 401 || response.status === 403) {
+        // Token expirado o revocado: volver al login de administrador
+        handleLogout();
+        throw new Error('Sesión de administrador expirada');
+      }
+
       if (!response.ok) {
         throw new Error('Error al cargar usuarios');
       }
       
-      setUsers(data);
+      // Con cursor se agrega la página siguiente, sin cursor se reemplaza la lista
+      setUsers((prev) => (afterId !== null ? [...prev, ...data.users] : data.users));
+      setNextCursor(data.next_cursor);
+      setTotalEstimate(data.total_estimate);
     } catch (err) {
       setError(err.message);
     } finally {
@@ -74,7 +103,8 @@ const AdminPanel = () => {
 
     try {
       const response = await fetch(`http://localhost:8000/api/admin/users/${userId}`, {
-        method: 'DELETE'
+        method: 'DELETE',
+        headers: authHeaders()
       });
 
       const data = await response.json();
@@ -84,7 +114,7 @@ const AdminPanel = () => {
       }
 
       setSuccess(`Usuario "${username}" eliminado exitosamente`);
-      fetchUsers();
+      setUsers((prev) => prev.filter((user) => user.id !== userId));
       
       setTimeout(() => setSuccess(''), 3000);
       
@@ -96,10 +126,20 @@ const AdminPanel = () => {
   };
 
   const handleLogout = () => {
+    const token = localStorage.getItem('admin_token');
+    if (token) {
+      // Revocar el token en el servidor; el resultado no bloquea el cierre de sesión
+      fetch('http://localhost:8000/api/logout', {
+        method: 'POST',
+        headers: { Authorization: `Bearer ${token}` }
+      }).catch(() => {});
+    }
     localStorage.removeItem('admin_token');
     setIsAuthenticated(false);
     setPassword('');
     setUsers([]);
+    setNextCursor(null);
+    setSearch('');
   };
 
   const handleBackToLogin = () => {
@@ -206,6 +246,17 @@ const AdminPanel = () => {
           </div>
         )}
 
+        <div className="mb-6 relative">
+          <Search className="w-5 h-5 text-gray-500 absolute left-4 top-1/2 -translate-y-1/2" />
+          <input
+            type="text"
+            value={search}
+            onChange={(e) => setSearch(e.target.value)}
+            className="w-full bg-gray-900/80 border-2 border-gray-700 focus:border-red-600 rounded-lg pl-12 pr-4 py-3 text-white placeholder-gray-600 transition-all outline-none"
+            placeholder="Buscar por inicio de usuario o email..."
+          />
+        </div>
+
         <div className="bg-black/60 backdrop-blur-sm border-2 border-red-900/50 rounded-lg overflow-hidden shadow-2xl shadow-red-900/20">
           <div className="overflow-x-auto">
             <table className="w-full">
@@ -247,9 +298,22 @@ const AdminPanel = () => {
             </table>
           </div>
 
+          {nextCursor !== null && (
+            <div className="px-6 py-4 border-t border-gray-800 text-center">
+              <button
+                onClick={() => fetchUsers(nextCursor)}
+                disabled={loading}
+                className="bg-gray-800 hover:bg-gray-700 text-white px-6 py-3 rounded-lg font-bold transition-all disabled:opacity-50 disabled:cursor-not-allowed"
+              >
+                {loading ? 'CARGANDO...' : 'CARGAR MÁS'}
+              </button>
+            </div>
+          )}
+
           <div className="bg-gray-900/50 px-6 py-4 border-t border-gray-800">
             <p className="text-gray-500 text-sm text-center">
-              Total de usuarios registrados: <span className="text-red-500 font-bold">{users.length}</span>
+              Mostrando <span className="text-red-500 font-bold">{users.length}</span> de aproximadamente{' '}
+              <span className="text-red-500 font-bold">{totalEstimate}</span> usuarios registrados
             </p>
           </div>
         </div>
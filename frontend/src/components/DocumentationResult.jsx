@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { FileText, Edit3, Save, Download, CheckCircle, AlertCircle } from 'lucide-react';
+import { postWithSession, saveSessionCode } from '../api';
 
 const DocumentationResult = () => {
   const [documentedCode, setDocumentedCode] = useState('');
@@ -17,30 +18,27 @@ const DocumentationResult = () => {
     const storedCode = localStorage.getItem('documented_code');
     const storedFilename = localStorage.getItem('final_filename');
     const storedLanguage = localStorage.getItem('final_language') || 'python';
+    const storedSessionId = localStorage.getItem('session_id');
     
     if (storedCode && storedFilename) {
       setDocumentedCode(storedCode);
       setEditedCode(storedCode);
       setFilename(storedFilename);
       setLanguage(storedLanguage);
-      generatePreview(storedCode, storedFilename, storedLanguage);
+      generatePreview(storedCode, storedFilename, storedLanguage, storedSessionId);
     } else {
       setError('No hay documentación para mostrar. Por favor completa el proceso anterior.');
     }
   }, []);
 
-  const generatePreview = async (code, fname, lang) => {
+  const generatePreview = async (code, fname, lang, sid) => {
     setLoading(true);
     try {
-      const response = await fetch('http://localhost:8000/api/accept-documentation', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ 
-          documented_code: code,
-          filename: fname,
-          language: lang
-        })
-      });
+      const response = await postWithSession(
+        'http://localhost:8000/api/accept-documentation',
+        { filename: fname, language: lang },
+        'documented_code', code, sid
+      );
 
       const data = await response.json();
 
@@ -57,11 +55,16 @@ const DocumentationResult = () => {
     }
   };
 
-  const handleSaveEdit = () => {
+  const handleSaveEdit = async () => {
     setDocumentedCode(editedCode);
     setIsEditing(false);
     setSuccess('Cambios guardados exitosamente');
-    generatePreview(editedCode, filename, language);
+    
+    // El código editado se sube una vez a la sesión; la vista previa y la exportación la reutilizan
+    const sessionId = localStorage.getItem('session_id');
+    const saved = await saveSessionCode(sessionId, editedCode);
+    localStorage.setItem('documented_code', editedCode);
+    generatePreview(editedCode, filename, language, saved ? sessionId : null);
     
     setTimeout(() => setSuccess(''), 3000);
   };
@@ -1,12 +1,16 @@
 import React, { useState, useEffect } from 'react';
 import { FileText, Download, CheckCircle, AlertCircle, Loader } from 'lucide-react';
+import { postWithSession } from '../api';
 
 const ExportPage = () => {
   const [documentedCode, setDocumentedCode] = useState('');
   const [filename, setFilename] = useState('');
+  const [language, setLanguage] = useState('');
+  const [sessionId, setSessionId] = useState('');
   const [selectedFormat, setSelectedFormat] = useState('docx');
   const [exportMethod, setExportMethod] = useState('direct'); // 'direct' o 'n8n'
   const [userEmail, setUserEmail] = useState('');
+  const [highlight, setHighlight] = useState(false);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
@@ -18,6 +22,8 @@ const ExportPage = () => {
     if (storedCode && storedFilename) {
       setDocumentedCode(storedCode);
       setFilename(storedFilename);
+      setLanguage(localStorage.getItem('final_language') || '');
+      setSessionId(localStorage.getItem('session_id') || '');
     } else {
       setError('No hay documentación para exportar. Por favor completa el proceso anterior.');
     }
@@ -28,6 +34,12 @@ const ExportPage = () => {
     setError('');
     setSuccess('');
 
+    if (exportMethod === 'n8n' && selectedFormat === 'bundle') {
+      setError('El paquete ZIP solo está disponible en descarga directa');
+      setLoading(false);
+      return;
+    }
+
     if (exportMethod === 'n8n' && !userEmail) {
       setError('Por favor ingresa tu email para recibir el documento');
       setLoading(false);
@@ -36,16 +48,18 @@ const ExportPage = () => {
 
     try {
       if (exportMethod === 'direct') {
-        // Descarga directa (como antes)
-        const response = await fetch('http://localhost:8000/api/export', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({
-            documented_code: documentedCode,
+        // Descarga directa; el paquete trae todos los formatos en un solo ZIP
+        const isBundle = selectedFormat === 'bundle';
+        const response = await postWithSession(
+          `http://localhost:8000/api/${isBundle ? 'export-bundle' : 'export'}`,
+          {
             filename: filename,
-            format: selectedFormat
-          })
-        });
+            language: language || undefined,
+            ...(isBundle ? { formats: ['markdown', 'docx', 'pdf'] } : { format: selectedFormat }),
+            highlight: (selectedFormat === 'docx' || isBundle) && highlight
+          },
+          'documented_code', documentedCode, sessionId
+        );
 
         if (!response.ok) {
           const data = await response.json();
@@ -57,7 +71,7 @@ const ExportPage = () => {
         const a = document.createElement('a');
         a.href = url;
         
-        const extension = selectedFormat === 'docx' ? '.docx' : selectedFormat === 'pdf' ? '.pdf' : '.md';
+        const extension = { docx: '.docx', pdf: '.pdf', markdown: '.md', bundle: '.zip' }[selectedFormat];
         a.download = `${filename.replace('.py', '').replace('.js', '').replace('.php', '').replace('.go', '')}_documented${extension}`;
         
         document.body.appendChild(a);
@@ -115,6 +129,13 @@ const ExportPage = () => {
       description: 'Formato de texto plano compatible con GitHub, GitLab, etc.',
       icon: '📝',
       color: 'from-gray-600 to-gray-700'
+    },
+    {
+      id: 'bundle',
+      name: 'Paquete ZIP (todos)',
+      description: 'DOCX, PDF y Markdown en un solo archivo comprimido',
+      icon: '🗜️',
+      color: 'from-orange-600 to-orange-700'
     }
   ];
 
@@ -194,6 +215,19 @@ const ExportPage = () => {
               </div>
             </button>
           ))}
+
+          {(selectedFormat === 'docx' || selectedFormat === 'bundle') && (
+            <label className="flex items-center gap-3 text-gray-400 text-sm px-2 cursor-pointer">
+              <input
+                type="checkbox"
+                checked={highlight}
+                onChange={(e) => setHighlight(e.target.checked)}
+                disabled={loading}
+                className="w-4 h-4 accent-red-600"
+              />
+              Resaltar comentarios y docstrings en el documento Word
+            </label>
+          )}
         </div>
 
         {/* Export Method Selection */}
@@ -314,6 +348,7 @@ const ExportPage = () => {
             <li>• <strong>DOCX:</strong> Ideal para editar y personalizar el documento</li>
             <li>• <strong>PDF:</strong> Perfecto para compartir y presentar sin modificaciones</li>
             <li>• <strong>Markdown:</strong> Compatible con GitHub, GitLab y editores de código</li>
+            <li>• <strong>ZIP:</strong> Los tres formatos juntos, generados a partir de una sola lectura del código</li>
           </ul>
         </div>
 
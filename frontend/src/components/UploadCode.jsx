@@ -1,5 +1,6 @@
 import React, { useState } from 'react';
 import { Upload, FileCode, CheckCircle, XCircle, BarChart3, LogOut } from 'lucide-react';
+import { authHeaders } from '../api';
 
 const UploadCode = () => {
   const [file, setFile] = useState(null);
@@ -12,6 +13,14 @@ const UploadCode = () => {
   const username = localStorage.getItem('username') || 'Usuario';
 
   const handleLogout = () => {
+    const token = localStorage.getItem('token');
+    if (token) {
+      // Revocar el token en el servidor; el resultado no bloquea el cierre de sesión
+      fetch('http://localhost:8000/api/logout', {
+        method: 'POST',
+        headers: { Authorization: `Bearer ${token}` }
+      }).catch(() => {});
+    }
     localStorage.removeItem('token');
     localStorage.removeItem('username');
     window.location.href = '/';
@@ -64,6 +73,7 @@ const UploadCode = () => {
 
       const response = await fetch('http://localhost:8000/api/analyze-code', {
         method: 'POST',
+        headers: authHeaders(),
         body: formData
       });
 
@@ -83,6 +93,7 @@ const UploadCode = () => {
         localStorage.setItem('uploaded_code', code);
         localStorage.setItem('uploaded_filename', file.name);
         localStorage.setItem('detected_language', data.language);
+        localStorage.setItem('session_id', data.session_id);
       };
       reader.readAsText(file);
       
@@ -282,6 +293,12 @@ const UploadCode = () => {
                   NIVEL: {getDocumentationLevel(analysis.documentation_percentage).text}
                 </p>
               </div>
+
+              {analysis.partial && (
+                <p className="mt-4 text-center text-sm font-bold text-yellow-500">
+                  El archivo es demasiado grande o complejo: el análisis se detuvo antes de terminar y los valores son parciales.
+                </p>
+              )}
             </div>
 
             {/* Code Preview Section */}
@@ -2,8 +2,13 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext
 from ollama import chat
 import os
+import re
+import textwrap
+from itertools import accumulate
 from docx import Document
 from fpdf import FPDF
+from sesiones import cargar_sesion, guardar_sesion, restaurar, insertar_en_orden
+from trabajo import TrabajoEnSegundoPlano
 
 # Importar markdown con fallback
 try:
@@ -30,6 +35,12 @@ except Exception:
             return s
     markdown = _MarkdownFallback()
 
+# Cada cuántos milisegundos la interfaz revisa los resultados del hilo de trabajo
+INTERVALO_COLA_MS = 100
+
+# Funciones por bloque al llenar la vista previa; los documentos largos se insertan por partes
+SECCIONES_POR_BLOQUE = 50
+
 class DocumentacionApp:
     def __init__(self, root):
         self.root = root
@@ -43,6 +54,11 @@ class DocumentacionApp:
         self.sugerencias_aceptadas = {}
         self.indice_actual = 0
         
+        # Las llamadas al modelo corren en un hilo de trabajo que entrega sus resultados por una cola
+        self.trabajo = TrabajoEnSegundoPlano()
+        # True mientras los fragmentos de la respuesta en streaming se escriben en el editor
+        self.stream_en_editor = False
+        
         self._configurar_ui()
         
     def _configurar_ui(self):
@@ -68,6 +84,12 @@ class DocumentacionApp:
         # Botones principales
         self._crear_boton(top_frame, "Abrir Archivo", self.abrir_archivo).pack(side=tk.LEFT, padx=5)
         self._crear_boton(top_frame, "Nueva Sugerencia", self.regenerar_sugerencia).pack(side=tk.LEFT, padx=5)
+        self._crear_boton(top_frame, "Cancelar ⏹", self.cancelar_trabajo).pack(side=tk.LEFT, padx=5)
+        
+        # Progreso de la generación en curso
+        self.estado = tk.StringVar(value="")
+        tk.Label(top_frame, textvariable=self.estado, font=self.estilo['font'],
+                fg=self.estilo['fg'], bg=self.estilo['bg']).pack(side=tk.LEFT, padx=10)
         
         # Área de edición
         self.editor = scrolledtext.ScrolledText(
@@ -97,6 +119,8 @@ class DocumentacionApp:
 
     def abrir_archivo(self):
         """Abre un archivo de código y lo analiza."""
+        if self._avisar_trabajo_en_curso():
+            return
         ruta = filedialog.askopenfilename(
             filetypes=[("Archivos de código", "*.py;*.js;*.java;*.cpp;*.php")]
         )
@@ -119,16 +143,19 @@ class DocumentacionApp:
             arbol = ast.parse(self.codigo)
             funciones = []
             
+            # Índice de líneas calculado una sola vez: cada función se recorta del
+            # código con un único slice en lugar de volver a dividir el archivo
+            inicios = self._indice_lineas()
+            
             for nodo in ast.walk(arbol):
                 if isinstance(nodo, ast.FunctionDef):
-                    inicio = nodo.lineno - 1
-                    fin = nodo.end_lineno
-                    lineas_funcion = self.codigo.split('\n')[inicio:fin]
-                    codigo_funcion = '\n'.join(lineas_funcion)
+                    codigo_funcion = self.codigo[inicios[nodo.lineno - 1]:inicios[nodo.end_lineno] - 1]
                     
                     funciones.append({
                         'nombre': nodo.name,
                         'codigo': codigo_funcion,
+                        # Primera línea (def ...), la que muestran la vista previa y los exportadores
+                        'firma': codigo_funcion.split('\n', 1)[0],
                         'tiene_doc': ast.get_docstring(nodo) is not None
                     })
             
@@ -138,19 +165,57 @@ class DocumentacionApp:
                 return
             
             print(f"Funciones encontradas con ast: {len(funciones)}")
-            self._analizar_funciones_con_ia(funciones)
+            
+            # Solo van al modelo las funciones sin una sugerencia guardada para su código actual
+            pendientes = self._restaurar_sesion(funciones)
+            if pendientes:
+                self._analizar_funciones_con_ia(pendientes)
             
         except Exception as e:
             print(f"Error en análisis ast: {str(e)}")
             messagebox.showerror("Error", f"Error al analizar el código: {str(e)}")
 
-    def _analizar_funciones_con_ia(self, funciones):
-        """Analiza las funciones encontradas usando el modelo de IA."""
-        self.sugerencias = []
+    def _indice_lineas(self):
+        """
+        Desplazamiento de inicio de cada línea de self.codigo, más uno final.
+        Las líneas de la 'a' a la 'b' (1-indexadas) son self.codigo[inicios[a - 1]:inicios[b] - 1].
+        """
+        return [0, *accumulate(len(linea) + 1 for linea in self.codigo.split('\n'))]
+
+    def _restaurar_sesion(self, funciones):
+        """
+        Recupera las sugerencias y aceptaciones guardadas del archivo cuyo código no
+        cambió, las muestra de inmediato y retorna las funciones que hay que generar.
+        """
+        self.sugerencias, self.sugerencias_aceptadas, pendientes = restaurar(
+            cargar_sesion(self.archivo_actual), funciones, self.codigo
+        )
+        self.indice_actual = 0
         
-        for funcion in funciones:
+        if self.sugerencias:
+            print(f"Sesión restaurada: {len(self.sugerencias)} sugerencias, {len(pendientes)} por generar")
+            self.estado.set(f"♻️ Sesión restaurada: {len(self.sugerencias)} sugerencias, "
+                            f"{len(self.sugerencias_aceptadas)} aceptadas, {len(pendientes)} por generar")
+            self.mostrar_sugerencia_actual()
+        return pendientes
+
+    def _guardar_sesion(self):
+        if self.archivo_actual:
+            guardar_sesion(self.archivo_actual, self.codigo, self.sugerencias, self.sugerencias_aceptadas)
+
+    def _analizar_funciones_con_ia(self, funciones):
+        """Inicia la generación de docstrings en un hilo de trabajo; los resultados llegan por la cola."""
+        self._iniciar_trabajo('analisis', self._trabajador_analisis, funciones)
+
+    def _trabajador_analisis(self, funciones):
+        """Hilo de trabajo: llama al modelo por cada función. No toca la interfaz, solo la cola."""
+        total = len(funciones)
+        for posicion, funcion in enumerate(funciones, 1):
+            if self.trabajo.cancelado():
+                break
             codigo = funcion['codigo']
             nombre = funcion['nombre']
+            self.trabajo.publicar('progreso', (posicion, total, nombre))
             
             # Prompt mejorado para generar SIEMPRE en formato docstring
             prompt = f"""Eres un asistente experto en documentación de código. Tu tarea es generar ÚNICAMENTE un docstring en formato Python para la siguiente función.
@@ -182,16 +247,20 @@ Responde SOLO con el contenido del docstring, sin formato extra."""
 
             try:
                 print(f"\nAnalizando función: {nombre}")
-                respuesta = chat(model="code-doc:latest", messages=[{"role": "user", "content": prompt}])
-                contenido = respuesta["message"]["content"].strip()
+                contenido = self._chat_en_streaming(prompt)
+                if contenido is None:
+                    break
+                contenido = contenido.strip()
                 
                 # Limpiar la respuesta de cualquier formato markdown o extra
                 contenido = self._limpiar_docstring(contenido)
                 
-                self.sugerencias.append({
+                self.trabajo.publicar('sugerencia', {
                     'funcion': nombre,
                     'docstring': contenido,
                     'codigo': codigo,
+                    'firma': funcion['firma'],
+                    'orden': funcion['orden'],
                     'estado': 'sin_documentar' if not funcion['tiene_doc'] else 'documentada'
                 })
                 print(f"Docstring generado para: {nombre}")
@@ -199,13 +268,6 @@ Responde SOLO con el contenido del docstring, sin formato extra."""
             except Exception as e:
                 print(f"Error analizando función {nombre}: {str(e)}")
                 continue
-        
-        if self.sugerencias:
-            self.indice_actual = 0
-            self.mostrar_sugerencia_actual()
-        else:
-            self.editor.delete('1.0', tk.END)
-            self.editor.insert(tk.END, "❌ No se pudieron generar docstrings para las funciones.")
 
     def _limpiar_docstring(self, texto):
         """Limpia el texto del docstring removiendo formato markdown y extras."""
@@ -232,44 +294,67 @@ Responde SOLO con el contenido del docstring, sin formato extra."""
             return
         
         sugerencia = self.sugerencias[self.indice_actual]
+        primera_linea = sugerencia['firma']
+        separador = "=" * 60
+        
+        # El texto se arma completo y se inserta de una vez: cada insert redibuja el editor
+        partes = [
+            # Información de la función
+            f"🔧 Función: {sugerencia['funcion']}",
+            f"📊 Estado: {sugerencia['estado']}",
+            "",
+            # Código original de la función
+            "📝 Código original:",
+            separador,
+            primera_linea,
+            separador,
+            "",
+            # Docstring sugerido en formato completo
+            "💡 Documentación sugerida (formato docstring):",
+            "",
+            self._bloque_docstring(primera_linea, sugerencia['docstring']),
+            "",
+            # Contador
+            separador,
+            f"[📍 Función {self.indice_actual + 1} de {len(self.sugerencias)}]"
+        ]
         self.editor.delete('1.0', tk.END)
-        
-        # Mostrar información de la función
-        self.editor.insert(tk.END, f"🔧 Función: {sugerencia['funcion']}\n")
-        self.editor.insert(tk.END, f"📊 Estado: {sugerencia['estado']}\n\n")
-        
-        # Mostrar el código original de la función
-        self.editor.insert(tk.END, "📝 Código original:\n")
-        self.editor.insert(tk.END, "=" * 60 + "\n")
-        lineas_codigo = sugerencia['codigo'].split('\n')
-        primera_linea = lineas_codigo[0] if lineas_codigo else ""
-        self.editor.insert(tk.END, f"{primera_linea}\n")
-        self.editor.insert(tk.END, "=" * 60 + "\n\n")
-        
-        # Mostrar el docstring sugerido en formato completo
-        self.editor.insert(tk.END, "💡 Documentación sugerida (formato docstring):\n\n")
-        self.editor.insert(tk.END, f'{primera_linea}\n')
-        self.editor.insert(tk.END, '    """\n')
-        
-        # Indentar cada línea del docstring
-        for linea in sugerencia['docstring'].split('\n'):
-            if linea.strip():
-                self.editor.insert(tk.END, f'    {linea}\n')
-            else:
-                self.editor.insert(tk.END, '\n')
-        
-        self.editor.insert(tk.END, '    """\n')
-        
-        # Mostrar contador
-        total = len(self.sugerencias)
-        self.editor.insert(tk.END, f"\n{'=' * 60}\n")
-        self.editor.insert(tk.END, f"[📍 Función {self.indice_actual + 1} de {total}]")
+        self.editor.insert(tk.END, '\n'.join(partes))
+
+    def _bloque_docstring(self, firma, docstring):
+        """Firma y docstring indentado entre triples comillas, como quedaría en el código."""
+        lineas = '\n'.join(f'    {linea}' if linea.strip() else '' for linea in docstring.split('\n'))
+        return f'{firma}\n    """\n{lineas}\n    """'
+
+    def _aplicar_ediciones(self, texto):
+        """
+        Lleva a sugerencias_aceptadas la firma y el docstring editados en la vista previa.
+        Cada sección empieza con '## 🔧 Función: <nombre>' y su bloque de código tiene el
+        formato de _bloque_docstring; las secciones que no se reconocen quedan como estaban.
+        """
+        for seccion in re.split(r'^## 🔧 Función: ', texto, flags=re.M)[1:]:
+            nombre, _, resto = seccion.partition('\n')
+            nombre = nombre.strip()
+            bloque = re.search(r'```python\n(.*?)\n```', resto, re.S)
+            if nombre not in self.sugerencias_aceptadas or not bloque:
+                continue
+            firma, comillas, docstring = bloque.group(1).partition('"""')
+            if not comillas:
+                continue
+            docstring = docstring.rsplit('"""', 1)[0]
+            self.sugerencias_aceptadas[nombre] = dict(
+                self.sugerencias_aceptadas[nombre],
+                firma=firma.rstrip(),
+                docstring=textwrap.dedent(docstring).strip('\n')
+            )
 
     def regenerar_sugerencia(self):
         """Regenera una nueva sugerencia SIEMPRE en formato docstring."""
         if not self.sugerencias or self.indice_actual >= len(self.sugerencias):
             messagebox.showwarning("⚠️ Advertencia", "No hay función seleccionada para regenerar.")
             return
+        if self._avisar_trabajo_en_curso():
+            return
         
         sugerencia_actual = self.sugerencias[self.indice_actual]
         funcion_actual = sugerencia_actual["funcion"]
@@ -303,29 +388,164 @@ Returns:
 
 Responde SOLO con el contenido del docstring mejorado."""
 
+        self.editor.delete('1.0', tk.END)
+        self.editor.insert(tk.END, f"🔄 Regenerando docstring para {funcion_actual}...\n")
+        self.stream_en_editor = True
+        self._iniciar_trabajo('regeneracion', self._trabajador_regeneracion, self.indice_actual, funcion_actual, prompt)
+
+    def _trabajador_regeneracion(self, indice, funcion_actual, prompt):
+        """Hilo de trabajo: genera la nueva versión del docstring de la función 'indice'."""
         try:
-            self.editor.delete('1.0', tk.END)
-            self.editor.insert(tk.END, f"🔄 Regenerando docstring para {funcion_actual}...\n")
-            self.root.update()
-            
-            respuesta = chat(model="code-doc:latest", messages=[{"role": "user", "content": prompt}])
-            nuevo_docstring = respuesta["message"]["content"].strip()
+            nuevo_docstring = self._chat_en_streaming(prompt)
+            if nuevo_docstring is None:
+                return
+            nuevo_docstring = nuevo_docstring.strip()
             
             # Limpiar el nuevo docstring
             nuevo_docstring = self._limpiar_docstring(nuevo_docstring)
+            self.trabajo.publicar('regenerada', (indice, funcion_actual, nuevo_docstring))
             
-            # Actualizar la sugerencia
-            self.sugerencias[self.indice_actual]["docstring"] = nuevo_docstring
-            
-            # Mostrar el resultado
-            self.mostrar_sugerencia_actual()
+        except Exception as e:
+            self.trabajo.publicar('error', f"Error al regenerar docstring: {str(e)}")
+
+    # === TRABAJO EN SEGUNDO PLANO ===
+
+    def _iniciar_trabajo(self, tipo, objetivo, *args):
+        """
+        Ejecuta objetivo(*args) en un hilo para que la ventana siga respondiendo durante
+        las llamadas al modelo. El hilo deja sus resultados en la cola de self.trabajo y el
+        hilo de Tk los aplica con _procesar_cola, que se reprograma con root.after.
+        """
+        id_trabajo = self.trabajo.iniciar(tipo, objetivo, *args)
+        self.root.after(INTERVALO_COLA_MS, self._procesar_cola, id_trabajo)
+
+    def _chat_en_streaming(self, prompt):
+        """
+        Hilo de trabajo: pide la respuesta al modelo en streaming y reenvía cada fragmento
+        a la cola, así el texto empieza a verse con el primer token. Retorna la respuesta
+        completa, o None si se canceló a mitad de la generación.
+        """
+        partes = []
+        for trozo in chat(model="code-doc:latest", messages=[{"role": "user", "content": prompt}], stream=True):
+            if self.trabajo.cancelado():
+                return None
+            texto = trozo["message"]["content"]
+            if texto:
+                partes.append(texto)
+                self.trabajo.publicar('fragmento', texto)
+        return ''.join(partes)
+
+    def _insertar_fragmentos(self, fragmentos):
+        """Un solo insert por revisión de la cola: insertar token a token redibuja el editor cada vez."""
+        if fragmentos and self.stream_en_editor:
+            self.editor.insert(tk.END, ''.join(fragmentos))
+            self.editor.see(tk.END)
+
+    def _trabajo_en_curso(self):
+        return self.trabajo.en_curso()
+
+    def _avisar_trabajo_en_curso(self):
+        """True (y un aviso) si hay una generación en curso."""
+        if self._trabajo_en_curso():
+            messagebox.showwarning("⚠️ Advertencia", "Hay una generación en curso. Espera a que termine o cancélala.")
+            return True
+        return False
+
+    def cancelar_trabajo(self):
+        """Pide al hilo de trabajo que se detenga; la respuesta en streaming se corta en el siguiente fragmento."""
+        if self._trabajo_en_curso():
+            self.trabajo.cancelar()
+            self.estado.set("⏹ Cancelando...")
+
+    def _procesar_cola(self, id_trabajo):
+        """Aplica en el hilo de Tk los mensajes que dejó el hilo de trabajo 'id_trabajo'."""
+        if not self.trabajo.vigente(id_trabajo):
+            # Ya empezó otro trabajo, que revisa la cola por su cuenta
+            return
+        fragmentos = []
+        hay_sugerencias_nuevas = False
+        for tipo, datos in self.trabajo.mensajes():
+            if tipo == 'fragmento':
+                fragmentos.append(datos)
+                continue
             
-            print(f"Nueva versión de docstring generada para {funcion_actual}")
-            messagebox.showinfo("✅ Éxito", f"Nueva documentación generada para {funcion_actual}")
+            # Lo recibido en streaming se escribe antes de aplicar el siguiente mensaje
+            self._insertar_fragmentos(fragmentos)
+            fragmentos.clear()
             
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al regenerar docstring: {str(e)}")
+            if tipo == 'progreso':
+                posicion, total, nombre = datos
+                self.estado.set(f"⏳ Generando {posicion} de {total}: {nombre}")
+                # Mientras no haya ninguna sugerencia en pantalla, la respuesta se ve llegar en el editor
+                self.stream_en_editor = not self.sugerencias
+                if self.stream_en_editor:
+                    self.editor.delete('1.0', tk.END)
+                    self.editor.insert(tk.END, f"✍️ Generando docstring para {nombre}...\n\n")
+            elif tipo == 'sugerencia':
+                self.stream_en_editor = False
+                # Las restauradas ya están en la lista: la nueva va en el lugar de su función
+                posicion = insertar_en_orden(self.sugerencias, datos)
+                hay_sugerencias_nuevas = True
+                # La primera sugerencia se muestra apenas llega; el resto se suma a la lista
+                if len(self.sugerencias) == 1:
+                    self.mostrar_sugerencia_actual()
+                elif posicion <= self.indice_actual:
+                    # Sigue a la vista la misma sugerencia que antes
+                    self.indice_actual += 1
+            elif tipo == 'regenerada':
+                self.stream_en_editor = False
+                self._aplicar_regeneracion(*datos)
+            elif tipo == 'error':
+                self.stream_en_editor = False
+                messagebox.showerror("Error", datos)
+                self.mostrar_sugerencia_actual()
+            elif tipo == 'fin':
+                self._finalizar_trabajo(datos)
+                return
+        self._insertar_fragmentos(fragmentos)
+        # Una escritura de la sesión por revisión de la cola, no una por sugerencia
+        if hay_sugerencias_nuevas:
+            self._guardar_sesion()
+        self.root.after(INTERVALO_COLA_MS, self._procesar_cola, id_trabajo)
+
+    def _aplicar_regeneracion(self, indice, funcion_actual, nuevo_docstring):
+        if self.trabajo.cancelado():
             self.mostrar_sugerencia_actual()
+            return
+        
+        # Actualizar la sugerencia
+        self.sugerencias[indice]["docstring"] = nuevo_docstring
+        self._guardar_sesion()
+        
+        # Mostrar el resultado
+        self.mostrar_sugerencia_actual()
+        
+        print(f"Nueva versión de docstring generada para {funcion_actual}")
+        messagebox.showinfo("✅ Éxito", f"Nueva documentación generada para {funcion_actual}")
+
+    def _finalizar_trabajo(self, cancelado):
+        self.trabajo.terminar()
+        self.stream_en_editor = False
+        self._guardar_sesion()
+        if self.trabajo.tipo == 'regeneracion':
+            self.estado.set("⏹ Regeneración cancelada" if cancelado else "")
+            if cancelado:
+                # Reemplaza la respuesta a medias por la sugerencia que se tenía
+                self.mostrar_sugerencia_actual()
+            return
+        
+        if self.sugerencias:
+            total = len(self.sugerencias)
+            self.estado.set(f"⏹ Cancelado: {total} docstrings generados" if cancelado else f"✅ {total} docstrings generados")
+            # Actualiza el contador de la sugerencia en pantalla
+            self.mostrar_sugerencia_actual()
+        else:
+            self.estado.set("")
+            self.editor.delete('1.0', tk.END)
+            if cancelado:
+                self.editor.insert(tk.END, "⏹ Generación cancelada.")
+            else:
+                self.editor.insert(tk.END, "❌ No se pudieron generar docstrings para las funciones.")
 
     def anterior_sugerencia(self):
         """Muestra la sugerencia anterior."""
@@ -354,10 +574,15 @@ Responde SOLO con el contenido del docstring mejorado."""
         # Guardar el docstring aceptado
         self.sugerencias_aceptadas[funcion_actual] = {
             'docstring': sugerencia_actual['docstring'],
-            'codigo': sugerencia_actual['codigo']
+            'codigo': sugerencia_actual['codigo'],
+            'firma': sugerencia_actual['firma']
         }
+        self._guardar_sesion()
         
-        if self.indice_actual == len(self.sugerencias) - 1:
+        if self.indice_actual == len(self.sugerencias) - 1 and self._trabajo_en_curso():
+            # Todavía llegan sugerencias: la vista previa se abre al aceptar la última
+            messagebox.showinfo("✅ Aceptado", f"Docstring aceptado para {funcion_actual}\nAún se están generando más funciones.")
+        elif self.indice_actual == len(self.sugerencias) - 1:
             # Si es la última sugerencia, mostrar vista previa
             messagebox.showinfo("✅ Completado", "¡Todas las funciones documentadas!\nGenerando vista previa...")
             self.mostrar_vista_previa()
@@ -394,40 +619,41 @@ Responde SOLO con el contenido del docstring mejorado."""
         )
         preview_text.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
         
-        # Generar contenido en formato docstring
-        contenido = f"# 📚 Documentación Generada - {os.path.basename(self.archivo_actual)}\n\n"
-        contenido += "=" * 80 + "\n\n"
+        # Una cadena por función, armada con join en lugar de concatenar en el ciclo
+        encabezado = f"# 📚 Documentación Generada - {os.path.basename(self.archivo_actual)}\n\n{'=' * 80}\n\n"
+        secciones = [
+            f"## 🔧 Función: {funcion}\n\n```python\n{self._bloque_docstring(datos['firma'], datos['docstring'])}\n```\n\n{'-' * 80}\n\n"
+            for funcion, datos in self.sugerencias_aceptadas.items()
+        ]
+        bloques = [
+            ''.join(secciones[inicio:inicio + SECCIONES_POR_BLOQUE])
+            for inicio in range(0, len(secciones), SECCIONES_POR_BLOQUE)
+        ]
+        
+        # El primer bloque aparece al abrir la ventana; los siguientes se agregan de a uno
+        # con root.after para que un documento de cientos de funciones no congele la interfaz
+        preview_text.insert('1.0', encabezado + (bloques[0] if bloques else ''))
+        preview_text.focus_set()
+        pendientes = iter(bloques[1:])
         
-        for funcion, datos in self.sugerencias_aceptadas.items():
-            contenido += f"## 🔧 Función: {funcion}\n\n"
-            
-            # Obtener la primera línea del código (def ...)
-            primera_linea = datos['codigo'].split('\n')[0]
-            
-            contenido += "```python\n"
-            contenido += f'{primera_linea}\n'
-            contenido += '    """\n'
-            
-            # Agregar el docstring con indentación
-            for linea in datos['docstring'].split('\n'):
-                if linea.strip():
-                    contenido += f'    {linea}\n'
-                else:
-                    contenido += '\n'
-            
-            contenido += '    """\n'
-            contenido += "```\n\n"
-            contenido += "-" * 80 + "\n\n"
+        def insertar_siguiente_bloque():
+            bloque = next(pendientes, None)
+            if bloque is not None and preview_text.winfo_exists():
+                preview_text.insert(tk.END, bloque)
+                self.root.after(1, insertar_siguiente_bloque)
         
-        preview_text.insert('1.0', contenido)
-        preview_text.focus_set()
+        self.root.after(1, insertar_siguiente_bloque)
         
         # Frame para botones
         btn_frame = tk.Frame(preview_window, bg="#1c1c1c")
         btn_frame.pack(fill=tk.X, padx=10, pady=10)
         
         def guardar_cambios():
-            nuevo_contenido = preview_text.get('1.0', tk.END)
+            # Completar los bloques que aún no se insertaron antes de leer el contenido
+            for bloque in pendientes:
+                preview_text.insert(tk.END, bloque)
+            self._aplicar_ediciones(preview_text.get('1.0', tk.END))
+            self._guardar_sesion()
             messagebox.showinfo("✅ Éxito", "Cambios guardados. Ahora puedes exportar la documentación.")
             preview_window.destroy()
             self.mostrar_opciones_exportacion()
@@ -467,59 +693,95 @@ Responde SOLO con el contenido del docstring mejorado."""
             messagebox.showwarning("⚠️ Advertencia", "No hay documentación para exportar.")
             return
         
-        # Preparar contenido
-        contenido = f"# Documentación de {os.path.basename(self.archivo_actual)}\n\n"
-        
-        for funcion, datos in self.sugerencias_aceptadas.items():
-            primera_linea = datos['codigo'].split('\n')[0]
-            contenido += f"## {funcion}\n\n"
-            contenido += f"```python\n{primera_linea}\n"
-            contenido += '    """\n'
-            contenido += f"    {datos['docstring']}\n"
-            contenido += '    """\n```\n\n'
+        # La estructura se arma una sola vez y la consumen todos los exportadores
+        documento = self._construir_documento()
         
         try:
             if formato == 'pdf':
-                self._exportar_pdf(contenido)
+                self._exportar_pdf(documento)
             elif formato == 'docx':
-                self._exportar_docx(contenido)
+                self._exportar_docx(documento)
             elif formato == 'md':
-                self._exportar_markdown(contenido)
+                self._exportar_markdown(documento)
             
             messagebox.showinfo("✅ Éxito", f"Documentación exportada en formato {formato.upper()}")
         except Exception as e:
             messagebox.showerror("Error", f"Error al exportar: {str(e)}")
 
-    def _exportar_pdf(self, contenido):
-        """Exporta el contenido a PDF."""
+    def _construir_documento(self):
+        """Arma el documento: archivo y una sección por función (firma y docstring)."""
+        secciones = []
+        for funcion, datos in self.sugerencias_aceptadas.items():
+            secciones.append({
+                'nombre': funcion,
+                'firma': datos['firma'].strip(),
+                'docstring': datos['docstring'].strip()
+            })
+        return {
+            'archivo': os.path.basename(self.archivo_actual),
+            'secciones': secciones
+        }
+
+    def _exportar_pdf(self, documento):
+        """Exporta el documento a PDF."""
         ruta = filedialog.asksaveasfilename(defaultextension=".pdf")
         if ruta:
             pdf = FPDF()
             pdf.add_page()
-            pdf.set_font("Arial", size=12)
-            texto = contenido.replace("#", "").replace("```python", "").replace("```", "")
-            pdf.multi_cell(0, 10, txt=texto)
+            pdf.set_font("Arial", "B", 16)
+            pdf.multi_cell(0, 10, txt=f"Documentación de {documento['archivo']}")
+            
+            # Índice
+            pdf.set_font("Arial", "B", 13)
+            pdf.multi_cell(0, 10, txt="Índice")
+            pdf.set_font("Arial", size=11)
+            for seccion in documento['secciones']:
+                pdf.multi_cell(0, 7, txt=f"- {seccion['nombre']}")
+            
+            for seccion in documento['secciones']:
+                pdf.ln(4)
+                pdf.set_font("Arial", "B", 13)
+                pdf.multi_cell(0, 10, txt=seccion['nombre'])
+                pdf.set_font("Courier", size=10)
+                pdf.multi_cell(0, 6, txt=seccion['firma'])
+                pdf.set_font("Arial", size=11)
+                pdf.multi_cell(0, 7, txt=seccion['docstring'])
             pdf.output(ruta)
 
-    def _exportar_docx(self, contenido):
-        """Exporta el contenido a DOCX."""
+    def _exportar_docx(self, documento):
+        """Exporta el documento a DOCX."""
         ruta = filedialog.asksaveasfilename(defaultextension=".docx")
         if ruta:
             doc = Document()
             doc.add_heading('Documentación Generada', 0)
-            for linea in contenido.split('\n'):
-                if linea.startswith('##'):
-                    doc.add_heading(linea.replace('##', '').strip(), level=2)
-                else:
-                    doc.add_paragraph(linea)
+            doc.add_paragraph(documento['archivo'])
+            
+            # Índice
+            doc.add_heading('Índice', level=1)
+            for seccion in documento['secciones']:
+                doc.add_paragraph(seccion['nombre'], style='List Bullet')
+            
+            for seccion in documento['secciones']:
+                doc.add_heading(seccion['nombre'], level=2)
+                firma = doc.add_paragraph().add_run(seccion['firma'])
+                firma.font.name = 'Courier New'
+                doc.add_paragraph(seccion['docstring'])
             doc.save(ruta)
 
-    def _exportar_markdown(self, contenido):
-        """Exporta el contenido a Markdown."""
+    def _exportar_markdown(self, documento):
+        """Exporta el documento a Markdown."""
         ruta = filedialog.asksaveasfilename(defaultextension=".md")
         if ruta:
+            partes = [f"# Documentación de {documento['archivo']}\n", "## Índice\n"]
+            partes.extend(f"- [{s['nombre']}](#{s['nombre'].lower()})" for s in documento['secciones'])
+            partes.append('')
+            
+            for seccion in documento['secciones']:
+                partes.append(f"## {seccion['nombre']}\n")
+                partes.append(f'```python\n{self._bloque_docstring(seccion["firma"], seccion["docstring"])}\n```\n')
+            
             with open(ruta, 'w', encoding='utf-8') as f:
-                f.write(contenido)
+                f.write('\n'.join(partes))
 
 if __name__ == "__main__":
     root = tk.Tk()
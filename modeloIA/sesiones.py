@@ -0,0 +1,104 @@
+import bisect
+import hashlib
+import json
+import os
+
+# Carpeta donde se guarda el avance de cada archivo documentado
+SESIONES_DIR = os.getenv("CODE_DOC_SESIONES", os.path.join(os.path.expanduser("~"), ".code-doc", "sesiones"))
+
+# Cambia si cambia el formato del archivo de sesión; las sesiones de otra versión se ignoran
+VERSION_SESION = 2
+
+def hash_contenido(texto):
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+def _ruta_sesion(ruta_archivo):
+    """Un archivo de sesión por ruta absoluta del código."""
+    return os.path.join(SESIONES_DIR, f"{hash_contenido(os.path.abspath(ruta_archivo))}.json")
+
+def cargar_sesion(ruta_archivo):
+    """Retorna la sesión guardada del archivo, o None si no hay una o no se puede leer."""
+    try:
+        with open(_ruta_sesion(ruta_archivo), 'r', encoding='utf-8') as f:
+            sesion = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if sesion.get('version') != VERSION_SESION or sesion.get('ruta') != os.path.abspath(ruta_archivo):
+        return None
+    return sesion
+
+def guardar_sesion(ruta_archivo, codigo, sugerencias, sugerencias_aceptadas):
+    """
+    Guarda las sugerencias y las aceptadas del archivo junto al hash de su contenido
+    y el del código de cada función. Se escribe en un temporal que luego reemplaza
+    al anterior, así cerrar la ventana a mitad de escritura no deja la sesión corrupta.
+    """
+    ruta = _ruta_sesion(ruta_archivo)
+    sesion = {
+        'version': VERSION_SESION,
+        'ruta': os.path.abspath(ruta_archivo),
+        'hash': hash_contenido(codigo),
+        'sugerencias': [dict(sugerencia, hash=hash_contenido(sugerencia['codigo'])) for sugerencia in sugerencias],
+        'aceptadas': {
+            nombre: dict(datos, hash=hash_contenido(datos['codigo']))
+            for nombre, datos in sugerencias_aceptadas.items()
+        }
+    }
+    try:
+        os.makedirs(SESIONES_DIR, exist_ok=True)
+        temporal = ruta + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(sesion, f, ensure_ascii=False)
+        os.replace(temporal, ruta)
+    except OSError as e:
+        print(f"No se pudo guardar la sesión: {str(e)}")
+
+def restaurar(sesion, funciones, codigo):
+    """
+    Cruza la sesión guardada con las funciones encontradas en el archivo y retorna
+    (sugerencias, aceptadas, pendientes). Una sugerencia o aceptación se conserva si
+    la función tiene el mismo nombre y el mismo código que cuando se generó; las
+    funciones sin sugerencia vigente quedan en pendientes para enviarlas al modelo.
+    Sugerencias y pendientes llevan en 'orden' la posición de su función en el archivo,
+    para intercalar en su lugar las que se generen después (ver insertar_en_orden).
+    Si el archivo no cambió desde que se guardó la sesión, se restaura completa sin
+    calcular el hash de cada función.
+    """
+    funciones = [dict(funcion, orden=posicion) for posicion, funcion in enumerate(funciones)]
+    if not sesion:
+        return [], {}, funciones
+
+    def sin_hash(datos):
+        return {clave: valor for clave, valor in datos.items() if clave != 'hash'}
+
+    if sesion.get('hash') == hash_contenido(codigo):
+        # Mismo archivo: las posiciones guardadas siguen siendo las de sus funciones
+        sugerencias = sorted((sin_hash(s) for s in sesion.get('sugerencias', [])), key=lambda s: s['orden'])
+        generadas = {s['orden'] for s in sugerencias}
+        aceptadas = {nombre: sin_hash(datos) for nombre, datos in sesion.get('aceptadas', {}).items()}
+        return sugerencias, aceptadas, [f for f in funciones if f['orden'] not in generadas]
+
+    guardadas = {(s['funcion'], s['hash']): s for s in sesion.get('sugerencias', [])}
+    vigentes = set()
+    sugerencias = []
+    pendientes = []
+    for funcion in funciones:
+        clave = (funcion['nombre'], hash_contenido(funcion['codigo']))
+        if clave in guardadas:
+            vigentes.add(clave)
+            sugerencias.append(dict(sin_hash(guardadas[clave]), orden=funcion['orden']))
+        else:
+            pendientes.append(funcion)
+
+    aceptadas = {
+        nombre: sin_hash(datos)
+        for nombre, datos in sesion.get('aceptadas', {}).items()
+        if (nombre, datos['hash']) in vigentes
+    }
+    return sugerencias, aceptadas, pendientes
+
+def insertar_en_orden(sugerencias, sugerencia):
+    """Inserta la sugerencia según su 'orden' en la lista ya ordenada y retorna su posición."""
+    posicion = bisect.bisect([s['orden'] for s in sugerencias], sugerencia['orden'])
+    sugerencias.insert(posicion, sugerencia)
+    return posicion
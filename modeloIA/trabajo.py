@@ -0,0 +1,67 @@
+import queue
+import threading
+
+class TrabajoEnSegundoPlano:
+    """
+    Un hilo de trabajo a la vez y la cola por la que entrega sus mensajes al hilo de Tk.
+    Cada trabajo recibe un id y sus mensajes se etiquetan con él: lo que deja un trabajo
+    anterior (por ejemplo, el 'fin' tardío de uno cancelado) se descarta en lugar de
+    aplicarse al trabajo que ya lo reemplazó.
+    """
+
+    def __init__(self):
+        self.cola = queue.Queue()
+        self.cancelar_evento = threading.Event()
+        self.tipo = None
+        self._hilo = None
+        self._id = 0
+        self._local = threading.local()
+
+    def iniciar(self, tipo, objetivo, *args):
+        """Ejecuta objetivo(*args) en un hilo nuevo y retorna el id del trabajo."""
+        self._id += 1
+        self.tipo = tipo
+        # Cada trabajo tiene su propio evento: uno anterior que siga vivo no se reanuda
+        self.cancelar_evento = threading.Event()
+        self._hilo = threading.Thread(target=self._ejecutar, args=(self._id, self.cancelar_evento, objetivo, args), daemon=True)
+        self._hilo.start()
+        return self._id
+
+    def _ejecutar(self, id_trabajo, cancelar_evento, objetivo, args):
+        self._local.id_trabajo = id_trabajo
+        self._local.cancelar_evento = cancelar_evento
+        try:
+            objetivo(*args)
+        finally:
+            self.publicar('fin', cancelar_evento.is_set())
+
+    def publicar(self, tipo, datos):
+        """Desde el hilo de trabajo: deja un mensaje para el hilo de Tk."""
+        self.cola.put((self._local.id_trabajo, tipo, datos))
+
+    def mensajes(self):
+        """Mensajes pendientes del trabajo actual, sin esperar; los de trabajos anteriores se descartan."""
+        while True:
+            try:
+                id_trabajo, tipo, datos = self.cola.get_nowait()
+            except queue.Empty:
+                return
+            if id_trabajo == self._id:
+                yield tipo, datos
+
+    def vigente(self, id_trabajo):
+        return id_trabajo == self._id
+
+    def en_curso(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def cancelar(self):
+        self.cancelar_evento.set()
+
+    def cancelado(self):
+        """En el hilo de trabajo, si se canceló ese trabajo; en el de Tk, si se canceló el actual."""
+        return getattr(self._local, 'cancelar_evento', self.cancelar_evento).is_set()
+
+    def terminar(self):
+        """Desde el hilo de Tk, al recibir el 'fin' del trabajo actual."""
+        self._hilo = None